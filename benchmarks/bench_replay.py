@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Replay recorded gateway traffic through the full FreedomPay API.
+
+Runs ``create_payment``, ``check_payment_status`` and ``create_payout`` end to
+end (payload schemas, signing, routing, result parsing, ledger writes) against
+a cassette instead of the network, and reports per-call latency. Everything
+written to the database is rolled back. Run from the bench directory:
+
+    python apps/freedompay_integration/benchmarks/bench_replay.py --site test.local
+    python apps/freedompay_integration/benchmarks/bench_replay.py --site test.local --speed 0
+
+``--record`` refreshes the cassette from the local gateway stand-in (or from
+the configured gateway with ``--live``). Live recording sends real payouts, so
+it leaves them out unless ``--live-payouts`` is given; a cassette without
+payouts replays payments only. ``--speed 1`` replays at the
+recorded pace, ``--speed 0`` as fast as possible, ``--latency`` with a fixed
+delay per call.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frappe  # noqa: E402
+
+from benchmarks.gateway_standin import StandInGateway  # noqa: E402
+from freedompay_integration.cassette import RecordingTransport, ReplayTransport  # noqa: E402
+from freedompay_integration.signature import script_name_from_url  # noqa: E402
+from freedompay_integration.transport import RequestsTransport  # noqa: E402
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes", "gateway.json")
+
+PAYMENT = {
+    "amount": "150000.00",
+    "currency": "UZS",
+    "description": "Benchmark payment",
+    "order_id": "BENCH-0001",
+    "email": "customer@example.com",
+    "phone": "+998901234567",
+    "result_url": "https://erp.example.com/api/method/freedompay_integration.callbacks.result",
+}
+PAYOUT = {"amount": "50000.00", "currency": "UZS", "card_number": "8600123412341234", "order_id": "BENCH-P-0001"}
+
+
+class StandInTransport:
+    """Sends every call to the stand-in, whatever host the URL names"""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.transport = RequestsTransport()
+
+    def post(self, url, **kwargs):
+        return self.transport.post(f"{self.gateway.url}/{script_name_from_url(url)}", **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.transport.get(f"{self.gateway.url}/{script_name_from_url(url)}", **kwargs)
+
+    def head(self, url, timeout=30):
+        return self.transport.head(self.gateway.url, timeout=timeout)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(api, iterations, payouts=True):
+    timings = {"create_payment": [], "check_payment_status": []}
+    if payouts:
+        timings["create_payout"] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        code, payment, feedback = api.create_payment(dict(PAYMENT))
+        timings["create_payment"].append(time.perf_counter() - start)
+        if code != "SUCCESS":
+            raise SystemExit(f"create_payment failed: {feedback.error}")
+
+        start = time.perf_counter()
+        api.check_payment_status(payment.get("pg_payment_id"))
+        timings["check_payment_status"].append(time.perf_counter() - start)
+        if not payouts:
+            continue
+
+        start = time.perf_counter()
+        api.create_payout(dict(PAYOUT))
+        timings["create_payout"].append(time.perf_counter() - start)
+    return timings
+
+
+def record(api_class, path, live, iterations, live_payouts=False):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if live:
+        recorder = RecordingTransport(path)
+        run(api_class(transport=recorder), iterations, payouts=live_payouts)
+    else:
+        with StandInGateway(latency=0.02) as gateway:
+            recorder = RecordingTransport(path, StandInTransport(gateway))
+            run(api_class(transport=recorder), iterations)
+    recorder.save()
+    print(f"Recorded {len(recorder.exchanges)} exchanges to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--site", required=True)
+    parser.add_argument("--sites-path", default="sites")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--speed", type=float, default=0, help="1 = recorded pace, 0 = no waiting")
+    parser.add_argument("--latency", type=float, default=None, help="fixed delay per call, seconds")
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--live", action="store_true", help="record from the configured gateway")
+    parser.add_argument(
+        "--live-payouts", action="store_true", help="also send real payouts when recording with --live"
+    )
+    args = parser.parse_args(argv)
+
+    frappe.init(site=args.site, sites_path=args.sites_path)
+    frappe.connect()
+    try:
+        from freedompay_integration.freedompay_api import FreedomPayAPI
+
+        if args.record or not os.path.exists(args.cassette):
+            record(FreedomPayAPI, args.cassette, args.live, 3, args.live_payouts)
+
+        transport = ReplayTransport(args.cassette, speed=args.speed, latency=args.latency)
+        payouts = any(exchange["script"] == "init_payout.php" for exchange in transport.exchanges)
+        timings = run(FreedomPayAPI(transport=transport), args.iterations, payouts)
+    finally:
+        frappe.db.rollback()
+        frappe.destroy()
+
+    print(f"{'call':<22} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in timings.items():
+        print(
+            f"{name:<22} {len(values):>6} {percentile(values, 0.5) * 1000:>8.2f} "
+            f"{percentile(values, 0.99) * 1000:>8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
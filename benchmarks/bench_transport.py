@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare the requests and HTTP/2 transports against a local gateway stand-in.
+
+Runs the same mix of concurrent payment, status and payout calls through each
+transport and reports throughput, latency percentiles and how many TCP
+connections the stand-in had to accept. Run from the bench environment:
+
+    python benchmarks/bench_transport.py --concurrency 32 --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.gateway_standin import H2StandInGateway, StandInGateway  # noqa: E402
+from freedompay_integration.transport import (  # noqa: E402
+    HTTP2Transport,
+    RequestsTransport,
+    http2_available,
+)
+
+SCRIPTS = ("init_payment.php", "get_status.php", "init_payout.php")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(transport, gateway, total, concurrency):
+    form = {"pg_merchant_id": "1", "pg_amount": "100", "pg_currency": "UZS", "pg_sig": "0" * 32}
+
+    def call(index):
+        url = f"{gateway.url}/{SCRIPTS[index % len(SCRIPTS)]}"
+        start = time.perf_counter()
+        response = transport.post(url, data=form, timeout=30)
+        response.json()
+        return time.perf_counter() - start
+
+    # One round to open connections, so both transports are measured warm
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(concurrency)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "throughput": total / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "connections": gateway.connections,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in delay, seconds")
+    args = parser.parse_args(argv)
+
+    cases = [("requests", RequestsTransport, StandInGateway)]
+    if http2_available():
+        cases.append(("HTTP/2", lambda: HTTP2Transport(prior_knowledge=True), H2StandInGateway))
+    else:
+        print("httpx[http2] is not installed, skipping the HTTP/2 transport")
+
+    print(f"{'transport':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'conns':>6}")
+    for name, make_transport, make_gateway in cases:
+        transport = make_transport()
+        with make_gateway(latency=args.latency) as gateway:
+            result = run(transport, gateway, args.requests, args.concurrency)
+        transport.close()
+        print(
+            f"{name:<10} {result['throughput']:>8.0f} {result['p50'] * 1000:>8.1f} "
+            f"{result['p99'] * 1000:>8.1f} {result['connections']:>6}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compare a benchmark run with a stored baseline.
+
+Fails (exit status 1) when a case lost more than ``--throughput`` of its
+throughput or its p99 latency grew by more than ``--p99``, both as fractions
+of the baseline:
+
+    python benchmarks/compare.py benchmarks/baselines/local.json /tmp/current.json --p99 0.25
+
+Cases present in only one of the files are reported and do not fail the
+comparison; files written by a different suite version are refused.
+"""
+
+import argparse
+import json
+import sys
+
+DEFAULT_THROUGHPUT_THRESHOLD = 0.10
+DEFAULT_P99_THRESHOLD = 0.20
+
+
+def load(path):
+    with open(path) as results:
+        return json.load(results)
+
+
+def compare(baseline, current, throughput_threshold, p99_threshold):
+    """Return (rows, regressions); a row is (case, metric, baseline, current, change, regressed)"""
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline["results"]) & set(current["results"])):
+        before = baseline["results"][name]
+        after = current["results"][name]
+
+        change = after["throughput"] / before["throughput"] - 1 if before["throughput"] else 0
+        regressed = change < -throughput_threshold
+        rows.append((name, "throughput", before["throughput"], after["throughput"], change, regressed))
+        if regressed:
+            regressions.append(name)
+
+        change = after["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0
+        regressed = change > p99_threshold
+        rows.append((name, "p99_ms", before["p99_ms"], after["p99_ms"], change, regressed))
+        if regressed and name not in regressions:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--throughput", type=float, default=DEFAULT_THROUGHPUT_THRESHOLD,
+                        help="allowed throughput loss, fraction")
+    parser.add_argument("--p99", type=float, default=DEFAULT_P99_THRESHOLD,
+                        help="allowed p99 latency growth, fraction")
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline)
+    current = load(args.current)
+    if baseline.get("version") != current.get("version"):
+        print(f"Suite versions differ: baseline {baseline.get('version')}, current {current.get('version')}")
+        return 2
+
+    rows, regressions = compare(baseline, current, args.throughput, args.p99)
+    print(f"{'case':<18} {'metric':<11} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<18} {metric:<11} {before:>12.4f} {after:>12.4f} {change:>+8.1%}{flag}")
+
+    for name in sorted(set(baseline["results"]) - set(current["results"])):
+        print(f"{name:<18} missing from the current run")
+    for name in sorted(set(current["results"]) - set(baseline["results"])):
+        print(f"{name:<18} not in the baseline")
+
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Local stand-in for the FreedomPay gateway.
+
+Answers ``init_payment.php``, ``get_status.php`` and ``init_payout.php`` with
+canned JSON after a fixed delay, and counts the TCP connections it accepts.
+Two flavours are available:
+
+- ``StandInGateway``: HTTP/1.1, for the ``requests`` transport.
+- ``H2StandInGateway``: HTTP/2 with prior knowledge over plain TCP, for the
+  ``HTTP/2`` transport. Needs the ``h2`` package.
+
+    with StandInGateway(latency=0.02) as gateway:
+        requests.post(gateway.url + "/get_status.php", data={...})
+"""
+
+import json
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+def gateway_response(path: str, form: dict) -> dict:
+    """Canned gateway answer for an endpoint"""
+    script = path.split("?")[0].rstrip("/").split("/")[-1]
+    payment_id = form.get("pg_payment_id") or uuid.uuid4().hex[:12]
+
+    if script == "init_payment.php":
+        return {
+            "pg_status": "ok",
+            "pg_payment_id": payment_id,
+            "pg_redirect_url": f"https://customer.freedompay.uz/pay.html?customer={payment_id}",
+            "pg_redirect_url_type": "need data",
+        }
+    if script == "get_status.php":
+        return {
+            "pg_status": "ok",
+            "pg_payment_id": payment_id,
+            "pg_transaction_status": "ok",
+            "pg_amount": form.get("pg_amount", "100"),
+            "pg_currency": form.get("pg_currency", "UZS"),
+        }
+    if script == "init_payout.php":
+        return {"pg_status": "ok", "pg_payment_id": payment_id}
+    return {"pg_status": "error", "pg_error_code": "404", "pg_error_description": "Unknown script"}
+
+
+class _StandIn:
+    scheme = "http"
+
+    def __init__(self, latency: float = 0.02, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.requests = 0
+        self._counter_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"{self.scheme}://{self.host}:{self.port}"
+
+    def _count(self, connections=0, requests=0):
+        with self._counter_lock:
+            self.connections += connections
+            self.requests += requests
+
+    def respond(self, path: str, body: bytes) -> bytes:
+        self._count(requests=1)
+        form = dict(parse_qsl(body.decode("utf-8"))) if body else {}
+        return json.dumps(gateway_response(path, form)).encode("utf-8")
+
+    def _make_server(self):
+        raise NotImplementedError
+
+    def start(self):
+        self._server = self._make_server()
+        self.port = self._server.server_address[1]
+        # Short poll interval: stop() waits for it
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StandInGateway(_StandIn):
+    """HTTP/1.1 keep-alive stand-in"""
+
+    def _make_server(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately: without this, delayed ACKs add 40 ms per call
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                standin._count(connections=1)
+                super().setup()
+
+            def _answer(self, body=b""):
+                time.sleep(standin.latency)
+                payload = standin.respond(self.path, body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._answer(self.rfile.read(length))
+
+            def do_GET(self):
+                self._answer()
+
+            def do_HEAD(self):
+                self._answer()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((self.host, self.port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+class H2StandInGateway(_StandIn):
+    """HTTP/2 (prior knowledge) stand-in; concurrent streams are answered independently"""
+
+    def _make_server(self):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        standin = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                standin._count(connections=1)
+                sock = self.request
+                conn = h2.connection.H2Connection(
+                    config=h2.config.H2Configuration(client_side=False)
+                )
+                lock = threading.Lock()
+                streams = {}
+
+                def send_pending():
+                    data = conn.data_to_send()
+                    if data:
+                        sock.sendall(data)
+
+                def answer(stream_id):
+                    time.sleep(standin.latency)
+                    request = streams.pop(stream_id)
+                    payload = standin.respond(request["path"], request["body"])
+                    with lock:
+                        try:
+                            conn.send_headers(stream_id, [
+                                (":status", "200"),
+                                ("content-type", "application/json"),
+                                ("content-length", str(len(payload))),
+                            ])
+                            conn.send_data(stream_id, payload, end_stream=True)
+                            send_pending()
+                        except Exception:
+                            pass
+
+                with lock:
+                    conn.initiate_connection()
+                    send_pending()
+
+                while True:
+                    try:
+                        data = sock.recv(65535)
+                    except OSError:
+                        break
+                    if not data:
+                        break
+                    with lock:
+                        events = conn.receive_data(data)
+                        for event in events:
+                            if isinstance(event, h2.events.RequestReceived):
+                                headers = dict(event.headers)
+                                streams[event.stream_id] = {
+                                    "path": (headers.get(b":path") or b"/").decode(),
+                                    "body": b"",
+                                }
+                            elif isinstance(event, h2.events.DataReceived):
+                                streams[event.stream_id]["body"] += event.data
+                                conn.acknowledge_received_data(
+                                    event.flow_controlled_length, event.stream_id
+                                )
+                            elif isinstance(event, h2.events.StreamEnded):
+                                threading.Thread(
+                                    target=answer, args=(event.stream_id,), daemon=True
+                                ).start()
+                            elif isinstance(event, h2.events.ConnectionTerminated):
+                                return
+                        send_pending()
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        return Server((self.host, self.port), Handler)
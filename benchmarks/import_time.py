@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Import-time report for the modules a worker loads through the app hooks.
+
+Every module named in ``hooks.py`` (request and job hooks, doc events,
+scheduler events) plus the payment gateway controller is imported in a fresh
+interpreter with ``-X importtime``, after ``frappe`` itself, so only the cost
+this app adds is counted. For each module the report shows the median import
+time over ``--repeat`` runs, how many modules it loads and the slowest of
+them:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --output /tmp/imports.json --baseline benchmarks/baselines/imports.json
+
+``--check`` fails (exit status 1) when a measured module loads one of
+``HEAVY_MODULES``: these are only needed once a payment is actually made and
+must be imported on first use. With ``--baseline`` a module whose import got
+slower than ``--threshold`` (a fraction) fails too. Outside a bench the
+in-memory Frappe stand-in (``freedompay_integration.fake_frappe``) is used.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_ROOT)
+
+# Format of the report files; bump when the measurement changes meaning
+REPORT_VERSION = 1
+
+# Loaded on first use only
+HEAVY_MODULES = ("requests", "urllib3", "h2", "werkzeug", "payments")
+# Entry points not named in hooks.py
+EXTRA_MODULES = ("freedompay_integration.payment_gateway",)
+DEFAULT_THRESHOLD = 0.25
+MARKER = "freedompay-import-time"
+
+PRELUDE = f"""
+import sys
+sys.path.insert(0, {APP_ROOT!r})
+try:
+    import frappe
+except ImportError:
+    from freedompay_integration import fake_frappe
+    fake_frappe.install()
+before = set(sys.modules)
+sys.stderr.write({MARKER!r} + "\\n")
+"""
+
+
+def _hook_paths(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _hook_paths(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _hook_paths(item)
+
+
+def hook_modules():
+    """Modules of the app named in hooks.py"""
+    from freedompay_integration import hooks
+
+    modules = []
+    for name in dir(hooks):
+        if name.startswith("_"):
+            continue
+        for path in _hook_paths(getattr(hooks, name)):
+            module = path.rsplit(".", 1)[0]
+            if path.startswith("freedompay_integration.") and module != "freedompay_integration" \
+                    and module not in modules:
+                modules.append(module)
+    return modules
+
+
+def _run(modules, importtime):
+    code = PRELUDE + "".join(f"import {module}\n" for module in modules) + (
+        "import json\nprint(json.dumps(sorted(set(sys.modules) - before)))\n"
+    )
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", code]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=APP_ROOT, check=False)
+    if result.returncode:
+        raise RuntimeError(f"importing {', '.join(modules)} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout), result.stderr
+
+
+def loaded_modules(modules) -> list[str]:
+    """Modules newly loaded, after frappe, by importing ``modules`` in a fresh interpreter"""
+    return _run(modules, importtime=False)[0]
+
+
+def _heavy(loaded):
+    return sorted({
+        heavy for heavy in HEAVY_MODULES for name in loaded if name == heavy or name.startswith(heavy + ".")
+    })
+
+
+def heavy_imports(modules) -> list[str]:
+    """Of ``HEAVY_MODULES``, those that importing ``modules`` loads"""
+    return _heavy(loaded_modules(modules))
+
+
+def parse_importtime(stderr):
+    """(total_us, [(module, self_us)]) of the imports made after the marker"""
+    lines = stderr.split(MARKER + "\n", 1)[-1].splitlines()
+    total = 0
+    modules = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # The header line
+            continue
+        modules.append((name.strip(), int(self_us)))
+        # Top-level imports are not indented; their cumulative times add up to the total
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us)
+    return total, modules
+
+
+def measure(module, repeat):
+    totals = []
+    slowest = {}
+    loaded = []
+    for _ in range(repeat):
+        loaded, stderr = _run([module], importtime=True)
+        total, modules = parse_importtime(stderr)
+        totals.append(total)
+        for name, self_us in modules:
+            slowest.setdefault(name, []).append(self_us)
+    top = sorted(((name, statistics.median(values)) for name, values in slowest.items()), key=lambda item: -item[1])
+    return {
+        "import_ms": round(statistics.median(totals) / 1000, 3),
+        "modules": len(loaded),
+        "heavy": _heavy(loaded),
+        "slowest": [[name, round(self_us / 1000, 3)] for name, self_us in top[:5]],
+    }
+
+
+def regressions(baseline, results, threshold):
+    slower = []
+    for module, result in results.items():
+        before = baseline.get("results", {}).get(module)
+        if before and before["import_ms"] and result["import_ms"] / before["import_ms"] - 1 > threshold:
+            slower.append(module)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="modules to measure (default: hook modules and the gateway)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="fail when a module imports slower than in this report")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed import time growth, fraction")
+    parser.add_argument("--check", action="store_true", help="fail when a module loads a heavy module")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or [*hook_modules(), *EXTRA_MODULES]
+    results = {}
+    print(f"{'module':<70} {'ms':>8} {'modules':>8}  heavy")
+    for module in modules:
+        results[module] = result = measure(module, max(args.repeat, 1))
+        print(f"{module:<70} {result['import_ms']:>8.2f} {result['modules']:>8}  {', '.join(result['heavy'])}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump({
+                "version": REPORT_VERSION,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}",
+                "results": results,
+            }, output, indent=1, sort_keys=True)
+            output.write("\n")
+
+    failed = False
+    if args.check:
+        offenders = [module for module in modules if results[module]["heavy"]]
+        for module in offenders:
+            print(f"{module} loads {', '.join(results[module]['heavy'])} at import")
+        failed = bool(offenders)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("version") != REPORT_VERSION:
+            print(f"Report versions differ: baseline {baseline.get('version')}, current {REPORT_VERSION}")
+            return 2
+        slower = regressions(baseline, results, args.threshold)
+        if slower:
+            print(f"Slower to import: {', '.join(slower)}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the FreedomPay hot paths.
+
+Each case times one operation many times and reports throughput and latency
+percentiles:
+
+- ``signature``: salting and signing an ``init_payment.php`` payload;
+- ``parse_json`` / ``parse_form``: parsing gateway response bodies;
+- ``payment_result``: building a typed result from a response;
+- ``payload_payment`` / ``payload_payout``: schema mapping and validation;
+- ``settings_cached`` / ``settings_cold``: FreedomPay Settings and secret
+  loading, from the worker cache and after clearing it (needs ``--site``);
+- ``create_request``: ``FreedomPaySettings.create_request`` end to end against
+  the local gateway stand-in (needs ``--site``). It commits, as in production,
+  but queues no background jobs and skips on_payment_authorized; afterwards the
+  Integration Requests, ledger rows and order records it created are deleted
+  and the day's aggregates are rebuilt from the ledger.
+
+Results are written as a versioned JSON baseline that ``compare.py`` checks
+later runs against:
+
+    python benchmarks/suite.py --output benchmarks/baselines/local.json
+    python benchmarks/suite.py --site test.local --output /tmp/current.json
+    python benchmarks/compare.py benchmarks/baselines/local.json /tmp/current.json
+
+Run from the bench environment so that ``frappe`` can be imported; cases that
+need a site are skipped without ``--site``. Outside a bench the in-memory Frappe
+stand-in (``freedompay_integration.fake_frappe``) is used for the other cases.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Format of the baseline files; bump when cases change meaning
+SUITE_VERSION = 1
+
+CASES = {}
+
+
+class SkipCase(Exception):
+    """Raised by a case setup that cannot run here"""
+
+
+PAYMENT_DATA = {
+    "merchant_id": "545000",
+    "amount": "150000",
+    "currency": "UZS",
+    "description": "Invoice SINV-00042",
+    "order_id": "SINV-00042",
+    "result_url": "https://erp.example.com/api/method/freedompay_integration.callbacks.result",
+    "success_url": "https://erp.example.com/payment-success",
+    "email": "customer@example.com",
+    "phone": "+998 90 123-45-67",
+}
+PAYOUT_DATA = {
+    "merchant_id": "545000",
+    "amount": "50000",
+    "currency": "UZS",
+    "card_number": "8600 1234 1234 1234",
+    "order_id": "PAYOUT-00042",
+}
+JSON_BODY = json.dumps({
+    "pg_status": "ok",
+    "pg_payment_id": "123456789",
+    "pg_redirect_url": "https://customer.freedompay.uz/pay.html?customer=123456789",
+    "pg_redirect_url_type": "need data",
+    "pg_salt": "a" * 16,
+    "pg_sig": "0" * 32,
+}).encode()
+FORM_BODY = b"pg_status=ok&pg_payment_id=123456789&pg_transaction_status=ok&pg_amount=150000&pg_currency=UZS"
+
+
+def case(name, needs_site=False):
+    """Register a case: a function returning the callable to time"""
+    def register(setup):
+        CASES[name] = (setup, needs_site)
+        return setup
+    return register
+
+
+@case("signature")
+def _signature():
+    from freedompay_integration.schemas import PAYMENT
+    from freedompay_integration.signature import sign
+
+    payload = PAYMENT.build(PAYMENT_DATA)
+    return lambda: sign("init_payment.php", dict(payload), "secret-key")
+
+
+@case("parse_json")
+def _parse_json():
+    from freedompay_integration.response_feedback import parse_body
+
+    return lambda: parse_body(JSON_BODY)
+
+
+@case("parse_form")
+def _parse_form():
+    from freedompay_integration.response_feedback import parse_body
+
+    return lambda: parse_body(FORM_BODY)
+
+
+@case("payment_result")
+def _payment_result():
+    from freedompay_integration.response_feedback import ResponseFeedBack
+    from freedompay_integration.results import PaymentResult
+
+    return lambda: PaymentResult.from_feedback(ResponseFeedBack(body=JSON_BODY, status_code=200), keep_raw=False)
+
+
+@case("payload_payment")
+def _payload_payment():
+    from freedompay_integration.schemas import PAYMENT
+
+    return lambda: PAYMENT.build(PAYMENT_DATA)
+
+
+@case("payload_payout")
+def _payload_payout():
+    from freedompay_integration.schemas import PAYOUT
+
+    return lambda: PAYOUT.build(PAYOUT_DATA)
+
+
+@case("settings_cached", needs_site=True)
+def _settings_cached():
+    from freedompay_integration.settings_cache import get_secret, get_settings
+
+    def load():
+        get_secret(get_settings(), "secret_key")
+
+    return load
+
+
+@case("settings_cold", needs_site=True)
+def _settings_cold():
+    import frappe
+
+    from freedompay_integration.settings_cache import clear_cache, get_secret, get_settings
+
+    def load():
+        clear_cache()
+        frappe.clear_document_cache("FreedomPay Settings", "FreedomPay Settings")
+        get_secret(get_settings(), "secret_key")
+
+    return load
+
+
+@case("create_request", needs_site=True)
+def _create_request():
+    from unittest import mock
+
+    import frappe
+
+    from benchmarks.gateway_standin import StandInGateway
+    from freedompay_integration.doctype.freedompay_settings import freedompay_settings
+    from freedompay_integration.settings_cache import get_secret, get_settings
+
+    gateway = StandInGateway(latency=0).start()
+    settings = get_settings()
+    if not settings.merchant_id or not get_secret(settings, "secret_key"):
+        gateway.stop()
+        raise SkipCase("FreedomPay Settings need a Merchant ID and Secret Key")
+    # Changed on the cached document only, for this process
+    settings.base_url = gateway.url
+    settings.fallback_urls = None
+    settings.async_checkout = 0
+    settings.poll_pending_payments = 0
+    # Nothing may outlive the case: no background jobs (aggregate deltas, drains) and no
+    # on_payment_authorized for Payment Requests that do not exist
+    patches = [
+        mock.patch.object(frappe, "enqueue", lambda *args, **kwargs: None),
+        mock.patch.object(freedompay_settings, "authorize", lambda *args, **kwargs: None),
+    ]
+    for patch in patches:
+        patch.start()
+
+    controller = frappe.get_doc("FreedomPay Settings")
+    prefix = f"BENCH-{frappe.generate_hash(length=8)}"
+    orders = []
+
+    def create():
+        orders.append(f"{prefix}-{len(orders)}")
+        result = controller.create_request({
+            "amount": 150000,
+            "currency": "UZS",
+            "title": "Benchmark",
+            "description": "Benchmark payment",
+            "reference_doctype": "Payment Request",
+            "reference_docname": orders[-1],
+            "payer_email": "customer@example.com",
+            "payer_name": "Customer",
+        })
+        if result.get("status") != "Completed":
+            raise RuntimeError(f"create_request failed: {result}")
+
+    def cleanup():
+        gateway.stop()
+        for patch in patches:
+            patch.stop()
+        _delete_orders(orders)
+
+    create.cleanup = cleanup
+    return create
+
+
+def _delete_orders(order_ids, chunk_size=500):
+    """Remove what create_request committed for these orders"""
+    import frappe
+    from frappe.utils import getdate
+
+    from freedompay_integration import aggregates, ledger
+    from freedompay_integration.order_index import forget_order
+
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start:start + chunk_size]
+        frappe.db.delete("Integration Request", {
+            "integration_request_service": "FreedomPay", "reference_docname": ["in", chunk],
+        })
+        frappe.db.delete(ledger.DOCTYPE, {"order_id": ["in", chunk]})
+        for order_id in chunk:
+            forget_order(order_id)
+        frappe.db.commit()
+    # No delta job was queued for the ledger inserts, so a rebuild now is final
+    aggregates.rebuild(from_date=getdate(), to_date=getdate())
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(fn, iterations, min_time, warmup):
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    clock = time.perf_counter
+    started = clock()
+    while len(timings) < iterations or clock() - started < min_time:
+        start = clock()
+        fn()
+        timings.append(clock() - start)
+    elapsed = clock() - started
+
+    return {
+        "iterations": len(timings),
+        "throughput": round(len(timings) / elapsed, 2),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 5),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 5),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 5),
+    }
+
+
+def run_suite(names, site=False, iterations=2000, min_time=1.0, warmup=100):
+    results = {}
+    skipped = {}
+    for name in names:
+        setup, needs_site = CASES[name]
+        if needs_site and not site:
+            skipped[name] = "needs --site"
+            continue
+        try:
+            fn = setup()
+        except SkipCase as e:
+            skipped[name] = str(e)
+            continue
+        # Cases touching the database or the network are far slower than the rest
+        count = max(iterations // 20, 50) if needs_site else iterations
+        try:
+            results[name] = measure(fn, count, min_time, min(warmup, count))
+        finally:
+            cleanup = getattr(fn, "cleanup", None)
+            if cleanup:
+                cleanup()
+        print(
+            f"{name:<18} {results[name]['throughput']:>12.0f}/s "
+            f"p50 {results[name]['p50_ms']:>9.4f} ms  p99 {results[name]['p99_ms']:>9.4f} ms"
+        )
+    for name, reason in skipped.items():
+        print(f"{name:<18} skipped: {reason}")
+    return results, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--site")
+    parser.add_argument("--sites-path", default="sites")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="run these cases only")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per case, at least")
+    parser.add_argument("--output", help="write the results as a JSON baseline")
+    args = parser.parse_args(argv)
+
+    try:
+        import frappe
+    except ImportError:
+        if args.site:
+            parser.error("--site needs the bench environment: frappe cannot be imported")
+        from freedompay_integration import fake_frappe
+
+        frappe = fake_frappe.install()
+
+    if args.site:
+        frappe.init(site=args.site, sites_path=args.sites_path)
+        frappe.connect()
+    try:
+        results, skipped = run_suite(args.only or list(CASES), bool(args.site), args.iterations, args.min_time)
+    finally:
+        if args.site:
+            frappe.db.rollback()
+            frappe.destroy()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump({
+                "version": SUITE_VERSION,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}",
+                "results": results,
+                "skipped": skipped,
+            }, output, indent=1, sort_keys=True)
+            output.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
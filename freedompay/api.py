@@ -3,17 +3,23 @@
 # For license information, please see license.txt
 
 import frappe
-import requests
+from frappe import _
 import hashlib
 import random
 import string
 from urllib.parse import urlencode
 from typing import Dict, Any, Optional
 
+from freedompay_integration.endpoints import DEFAULT_BASE_URL, get_router
+from freedompay_integration.gateway_errors import log_gateway_error
+from freedompay_integration.schemas import PAYMENT, PAYOUT, STATUS
+from freedompay_integration.slow_calls import track
+
 class FreedomPayAPI:
     """FreedomPay API Client for payment processing"""
 
-    def __init__(self, merchant_id: str, secret_key: str, base_url: str = "https://api.freedompay.uz"):
+    def __init__(self, merchant_id: str, secret_key: str, base_url: str = DEFAULT_BASE_URL, transport=None,
+                 fallback_urls: Optional[list] = None):
         """
         Initialize FreedomPay API client
 
@@ -21,11 +27,16 @@ class FreedomPayAPI:
             merchant_id (str): FreedomPay merchant ID
             secret_key (str): FreedomPay secret key
             base_url (str): FreedomPay API base URL
+            transport: HTTP transport, defaults to the one selected in FreedomPay Settings
+            fallback_urls (list): Other FreedomPay API hosts to route to and fail over to
         """
         self.merchant_id = merchant_id
         self.secret_key = secret_key
         self.base_url = base_url
         self.timeout = 30
+        # Resolved on the first call: the transports pull in the HTTP stack
+        self.transport = transport
+        self.router = get_router(base_urls=(base_url, *(fallback_urls or ())))
 
     def create_payment(self, amount: str, currency: str, order_id: str, description: str, **kwargs) -> Dict[str, Any]:
         """
@@ -42,30 +53,27 @@ class FreedomPayAPI:
             Dict[str, Any]: Payment response data
 
         Raises:
-            frappe.ValidationError: If payment creation fails
+            frappe.ValidationError: If the payment data is invalid or payment creation fails
         """
-        data = {
-            'pg_merchant_id': self.merchant_id,
-            'pg_amount': amount,
-            'pg_currency': currency,
-            'pg_order_id': order_id,
-            'pg_description': description,
-            **kwargs
-        }
+        data = PAYMENT.build({
+            **kwargs,
+            'merchant_id': self.merchant_id,
+            'amount': amount,
+            'currency': currency,
+            'order_id': order_id,
+            'description': description,
+        })
 
         # Generate signature
         signature = self._generate_signature(data, "init_payment.php")
         data['pg_sig'] = signature
 
+        from freedompay_integration.transport import RequestException
+
         try:
-            response = requests.post(
-                f"{self.base_url}/init_payment.php",
-                data=data,
-                timeout=self.timeout
-            )
-            return self._handle_response(response)
-        except requests.exceptions.RequestException as e:
-            frappe.log_error(f"FreedomPay API request failed: {str(e)}")
+            return self._post(f"{self.base_url}/init_payment.php", data)
+        except RequestException as e:
+            log_gateway_error(f"FreedomPay API request failed: {str(e)}", "init_payment.php", e)
             frappe.throw(_("FreedomPay API connection error"))
 
     def check_payment_status(self, payment_id: str) -> Dict[str, Any]:
@@ -78,23 +86,20 @@ class FreedomPayAPI:
         Returns:
             Dict[str, Any]: Payment status data
         """
-        data = {
-            'pg_merchant_id': self.merchant_id,
-            'pg_payment_id': payment_id,
-        }
+        data = STATUS.build({
+            'merchant_id': self.merchant_id,
+            'payment_id': payment_id,
+        })
 
         signature = self._generate_signature(data, "get_status.php")
         data['pg_sig'] = signature
 
+        from freedompay_integration.transport import RequestException
+
         try:
-            response = requests.post(
-                f"{self.base_url}/get_status.php",
-                data=data,
-                timeout=self.timeout
-            )
-            return self._handle_response(response)
-        except requests.exceptions.RequestException as e:
-            frappe.log_error(f"FreedomPay status check failed: {str(e)}")
+            return self._post(f"{self.base_url}/get_status.php", data)
+        except RequestException as e:
+            log_gateway_error(f"FreedomPay status check failed: {str(e)}", "get_status.php", e)
             frappe.throw(_("FreedomPay status check failed"))
 
     def create_payout(self, amount: str, currency: str, card_number: str, **kwargs) -> Dict[str, Any]:
@@ -110,28 +115,42 @@ class FreedomPayAPI:
         Returns:
             Dict[str, Any]: Payout response data
         """
-        data = {
-            'pg_merchant_id': self.merchant_id,
-            'pg_amount': amount,
-            'pg_currency': currency,
-            'pg_card_number': card_number,
-            **kwargs
-        }
+        data = PAYOUT.build({
+            **kwargs,
+            'merchant_id': self.merchant_id,
+            'amount': amount,
+            'currency': currency,
+            'card_number': card_number,
+        })
 
         signature = self._generate_signature(data, "init_payout.php")
         data['pg_sig'] = signature
 
+        from freedompay_integration.transport import RequestException
+
         try:
-            response = requests.post(
-                f"{self.base_url}/init_payout.php",
-                data=data,
-                timeout=self.timeout
-            )
-            return self._handle_response(response)
-        except requests.exceptions.RequestException as e:
-            frappe.log_error(f"FreedomPay payout failed: {str(e)}")
+            return self._post(f"{self.base_url}/init_payout.php", data)
+        except RequestException as e:
+            log_gateway_error(f"FreedomPay payout failed: {str(e)}", "init_payout.php", e)
             frappe.throw(_("FreedomPay payout failed"))
 
+    def _post(self, url: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a signed request through the transport
+
+        Raises:
+            freedompay_integration.transport.RequestException: On network errors
+        """
+        if self.transport is None:
+            from freedompay_integration.transport import get_transport
+
+            self.transport = get_transport()
+        with track(url, data):
+            response = self.router.send(
+                url, lambda target: self.transport.post(target, data=data, timeout=self.timeout)
+            )
+        return self._handle_response(response)
+
     def _generate_signature(self, data: Dict[str, Any], script_name: str) -> str:
         """
         Generate MD5 signature for FreedomPay API
@@ -157,12 +176,12 @@ class FreedomPayAPI:
 
         return hashlib.md5(signature_string.encode('utf-8')).hexdigest()
 
-    def _handle_response(self, response: requests.Response) -> Dict[str, Any]:
+    def _handle_response(self, response) -> Dict[str, Any]:
         """
         Handle API response
 
         Args:
-            response (requests.Response): API response
+            response: Transport response (``status_code``, ``text``, ``json()``)
 
         Returns:
             Dict[str, Any]: Parsed response data
@@ -183,5 +202,9 @@ class FreedomPayAPI:
                 return form_data
         else:
             error_msg = response.text or _("Unknown error")
-            frappe.log_error(f"FreedomPay API error: {response.status_code} - {error_msg}")
+            log_gateway_error(
+                f"FreedomPay API error: {response.status_code} - {error_msg}",
+                str(getattr(response, "url", "") or ""),
+                f"HTTP {response.status_code}",
+            )
             frappe.throw(_("FreedomPay API error: {0}").format(error_msg))
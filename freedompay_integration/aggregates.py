@@ -0,0 +1,214 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Daily FreedomPay aggregates for finance dashboards.
+
+One FreedomPay Daily Aggregate row per day, merchant, currency and transaction
+type holds counts, sums and time-to-payment buckets of the FreedomPay
+Transaction ledger, so a dashboard reads a few hundred rows instead of
+scanning the ledger or Integration Requests.
+
+Transactions are counted on the day they were created, by their current
+status. The ledger calls ``add`` for new transactions and ``change`` when a
+status changes. Both queue the difference for a job that runs once the caller
+commits and applies it to the row with one update, so a checkout never waits
+for, or holds, the lock on a busy aggregate row. A job that is lost leaves the
+counters short; rebuild from the ledger (also after a backfill) with:
+
+    bench --site <site> execute freedompay_integration.aggregates.rebuild --kwargs "{'from_date': '2026-01-01'}"
+"""
+
+from collections import defaultdict
+
+import frappe
+from frappe.utils import add_days, flt, get_datetime, getdate, now_datetime
+
+DOCTYPE = "FreedomPay Daily Aggregate"
+LEDGER = "FreedomPay Transaction"
+
+# Upper bound in seconds of each time-to-payment bucket
+LATENCY_BUCKETS = (
+    ("latency_1m", 60),
+    ("latency_5m", 5 * 60),
+    ("latency_15m", 15 * 60),
+    ("latency_1h", 60 * 60),
+    ("latency_over_1h", None),
+)
+
+COUNTERS = (
+    "created_count", "created_amount",
+    "paid_count", "paid_amount",
+    "failed_count",
+    "refunded_count", "refunded_amount",
+    "latency_total",
+) + tuple(field for field, _ in LATENCY_BUCKETS)
+
+# A refunded transaction was paid first
+PAID_STATES = ("Paid", "Refunded")
+FAILED_STATES = ("Failed", "Revoked")
+
+
+def contribution(status, amount, creation=None, paid_at=None) -> dict:
+    """Counters one transaction adds to its day"""
+    amount = flt(amount)
+    values = {"created_count": 1, "created_amount": amount}
+    if status in PAID_STATES:
+        values["paid_count"] = 1
+        values["paid_amount"] = amount
+        if creation and paid_at:
+            latency = max((get_datetime(paid_at) - get_datetime(creation)).total_seconds(), 0)
+            values["latency_total"] = latency
+            values[_bucket(latency)] = 1
+    if status == "Refunded":
+        values["refunded_count"] = 1
+        values["refunded_amount"] = amount
+    if status in FAILED_STATES:
+        values["failed_count"] = 1
+    return values
+
+
+def _bucket(latency):
+    for field, limit in LATENCY_BUCKETS:
+        if limit is None or latency < limit:
+            return field
+
+
+def key_of(transaction) -> tuple:
+    """(date, merchant_id, currency, transaction_type) of a ledger row"""
+    return (
+        getdate(transaction.get("creation") or now_datetime()),
+        transaction.get("merchant_id") or "",
+        transaction.get("currency") or "",
+        transaction.get("transaction_type") or "Payment",
+    )
+
+
+def add(transactions):
+    """Count new ledger rows"""
+    deltas = defaultdict(lambda: defaultdict(float))
+    for transaction in transactions:
+        values = contribution(transaction.get("status"), transaction.get("amount"))
+        for field, value in values.items():
+            deltas[key_of(transaction)][field] += value
+    _apply_after_commit(deltas)
+
+
+def change(transaction, status, paid_at=None):
+    """Move a ledger row from its current status to ``status``"""
+    old = contribution(transaction.status, transaction.amount, transaction.creation, transaction.paid_at)
+    new = contribution(status, transaction.amount, transaction.creation, transaction.paid_at or paid_at)
+    values = {field: new.get(field, 0) - old.get(field, 0) for field in set(old) | set(new)}
+    _apply_after_commit({key_of(transaction): values})
+
+
+def _apply_after_commit(deltas):
+    deltas = [
+        ((str(key[0]), *key[1:]), {field: value for field, value in values.items() if value})
+        for key, values in deltas.items()
+    ]
+    deltas = [(key, values) for key, values in deltas if values]
+    if deltas:
+        frappe.enqueue(
+            "freedompay_integration.aggregates.apply_deltas",
+            queue="short",
+            enqueue_after_commit=True,
+            deltas=deltas,
+        )
+
+
+def apply_deltas(deltas):
+    """Background job: apply [(key, values)] queued by ``add`` and ``change``"""
+    for key, values in deltas:
+        apply(tuple(key), values)
+
+
+def apply(key, values):
+    """Add ``values`` to the counters of the aggregate row of ``key``"""
+    values = {field: value for field, value in values.items() if value}
+    if not values:
+        return
+
+    name = _name(key)
+    if not frappe.db.exists(DOCTYPE, name):
+        _insert(name, key)
+
+    assignments = ", ".join(f"`{field}` = `{field}` + %({field})s" for field in values)
+    frappe.db.sql(
+        f"update `tab{DOCTYPE}` set {assignments}, modified = %(modified)s where name = %(name)s",
+        {**values, "modified": now_datetime(), "name": name},
+    )
+
+
+def _name(key):
+    date, merchant_id, currency, transaction_type = key
+    return f"{date}-{merchant_id}-{currency}-{transaction_type}"
+
+
+def _insert(name, key, values=None):
+    date, merchant_id, currency, transaction_type = key
+    doc = frappe.get_doc({
+        "doctype": DOCTYPE,
+        "date": date,
+        "merchant_id": merchant_id,
+        "currency": currency,
+        "transaction_type": transaction_type,
+        **(values or {}),
+    })
+    doc.name = name
+    frappe.db.savepoint("freedompay_aggregate")
+    try:
+        doc.db_insert()
+    except frappe.DuplicateEntryError:
+        # Inserted by a concurrent worker
+        frappe.db.rollback(save_point="freedompay_aggregate")
+
+
+def rebuild(from_date=None, to_date=None):
+    """Recompute the aggregates of [from_date, to_date] from the ledger, one day at a time"""
+    bounds = frappe.db.sql(f"select min(creation), max(creation) from `tab{LEDGER}`")[0]
+    if not bounds[0]:
+        return 0
+
+    date = getdate(from_date or bounds[0])
+    to_date = getdate(to_date or bounds[1])
+    rows = 0
+    while date <= to_date:
+        rows += _rebuild_day(date)
+        frappe.db.commit()
+        date = add_days(date, 1)
+    return rows
+
+
+def _rebuild_day(date):
+    frappe.db.delete(DOCTYPE, {"date": date})
+
+    totals = defaultdict(lambda: defaultdict(float))
+    transactions = frappe.db.sql(
+        f"""select transaction_type, status, merchant_id, currency, amount, creation, paid_at
+        from `tab{LEDGER}` where creation >= %s and creation < %s""",
+        (date, add_days(date, 1)),
+        as_dict=True,
+    )
+    for transaction in transactions:
+        values = contribution(transaction.status, transaction.amount, transaction.creation, transaction.paid_at)
+        for field, value in values.items():
+            totals[key_of(transaction)][field] += value
+
+    for key, values in totals.items():
+        _insert(_name(key), key, values)
+    return len(totals)
+
+
+def get_daily(from_date, to_date, merchant_id=None, currency=None):
+    """Aggregate rows for a dashboard, with success rate and average time to payment"""
+    filters = {"date": ("between", (from_date, to_date))}
+    if merchant_id:
+        filters["merchant_id"] = merchant_id
+    if currency:
+        filters["currency"] = currency
+
+    rows = frappe.get_all(DOCTYPE, filters=filters, fields=["*"], order_by="date asc")
+    for row in rows:
+        row.success_rate = row.paid_count / row.created_count if row.created_count else 0
+        row.average_latency = row.latency_total / row.paid_count if row.paid_count else 0
+    return rows
@@ -0,0 +1,221 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Cold archive of finished FreedomPay Integration Requests.
+
+With **Archive Requests After (Days)** set, a daily job moves FreedomPay
+Integration Requests that are Completed, Failed or Cancelled and were not
+modified for that many days out of the database into segment files under
+``private/freedompay_archive`` of the site:
+
+- ``<segment>.jsonl.gz``: the rows as JSON lines, gzip-compressed in blocks of
+  ``BLOCK_SIZE`` rows. Each block is a gzip member of its own, so the file is
+  an ordinary gzip file and a single block can be read without the rest;
+- ``<segment>.idx``: the byte range of every block and, for every request
+  name, order id and payment id, the blocks holding it.
+
+Segments are written once and never changed. A segment is complete only once
+its index exists: both files are written under temporary names, synced and
+renamed, and the rows are deleted after that, so an interrupted run loses
+nothing. Rows archived again after a crash before the delete are told apart
+by name in ``find``. Files attached to an archived request (profiles) are
+deleted with it.
+
+FreedomPay Transaction rows keep the name of their request in a Data field,
+not a Link, so deleting an archived request leaves no broken link; the name
+still finds the request with ``get_archived_request``.
+"""
+
+import gzip
+import json
+import os
+import time
+import zlib
+from functools import lru_cache
+
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+from .settings_cache import get_settings
+
+DOCTYPE = "Integration Request"
+SERVICE = "FreedomPay"
+FINISHED = ("Completed", "Failed", "Cancelled")
+FIELDS = (
+    "name", "creation", "modified", "owner", "status", "integration_type", "request_id",
+    "reference_doctype", "reference_docname", "data", "output", "error",
+)
+# Keys of the payload and gateway answer that are indexed besides the name
+ID_KEYS = ("order_id", "pg_order_id", "payment_id", "pg_payment_id")
+
+ARCHIVE_FOLDER = "freedompay_archive"
+SEGMENT_SIZE = 10000
+BLOCK_SIZE = 200
+RUN_BUDGET = 30 * 60
+
+LOCK_KEY = "freedompay_archive"
+LOCK_TTL = RUN_BUDGET + 5 * 60
+
+
+def archive_dir() -> str:
+    return frappe.get_site_path("private", ARCHIVE_FOLDER)
+
+
+def archive_integration_requests(days: int | None = None, budget: float = RUN_BUDGET) -> int:
+    """Scheduler entry point: archive old finished requests. Returns the number of rows archived"""
+    days = cint(days if days is not None else get_settings().get("archive_after_days"))
+    if days <= 0:
+        return 0
+
+    cache = frappe.cache()
+    lock_key = cache.make_key(LOCK_KEY)
+    if not cache.set(lock_key, 1, nx=True, ex=LOCK_TTL):
+        return 0
+
+    try:
+        cutoff = add_days(now_datetime(), -days)
+        deadline = time.monotonic() + budget
+        archived = 0
+        while time.monotonic() < deadline:
+            rows = frappe.get_all(
+                DOCTYPE,
+                filters={
+                    "integration_request_service": SERVICE,
+                    "status": ["in", FINISHED],
+                    "modified": ["<", cutoff],
+                },
+                fields=list(FIELDS),
+                order_by="creation asc",
+                limit=SEGMENT_SIZE,
+            )
+            if not rows:
+                break
+            write_segment(rows)
+            names = [row.name for row in rows]
+            _delete_attachments(names)
+            frappe.db.delete(DOCTYPE, {"name": ["in", names]})
+            frappe.db.commit()
+            archived += len(rows)
+        return archived
+    finally:
+        cache.delete(lock_key)
+
+
+def _delete_attachments(names):
+    """Delete the files attached to these requests, such as profiles (see ``profiler``)"""
+    files = frappe.get_all(
+        "File",
+        filters={"attached_to_doctype": DOCTYPE, "attached_to_name": ["in", names]},
+        pluck="name",
+    )
+    for name in files:
+        # Through the document, so the file on disk goes too
+        frappe.delete_doc("File", name, ignore_permissions=True, force=True)
+
+
+def write_segment(rows, directory=None) -> str:
+    """Write rows as a new segment with its index. Returns the segment path"""
+    directory = directory or archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{now_datetime():%Y%m%d%H%M%S}-{frappe.generate_hash(length=6)}")
+    path = f"{base}.jsonl.gz"
+
+    blocks = []
+    keys = {}
+    offset = 0
+    with open(f"{path}.tmp", "wb") as segment:
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block = rows[start:start + BLOCK_SIZE]
+            lines = "".join(json.dumps(row, default=str, separators=(",", ":")) + "\n" for row in block)
+            member = gzip.compress(lines.encode(), compresslevel=6)
+            segment.write(member)
+            number = len(blocks)
+            blocks.append((offset, len(member)))
+            offset += len(member)
+            for row in block:
+                for key in _keys(row):
+                    numbers = keys.setdefault(key, [])
+                    if not numbers or numbers[-1] != number:
+                        numbers.append(number)
+        _sync(segment)
+
+    index = json.dumps({"rows": len(rows), "blocks": blocks, "keys": keys}, separators=(",", ":"))
+    with open(f"{base}.idx.tmp", "wb") as index_file:
+        index_file.write(gzip.compress(index.encode()))
+        _sync(index_file)
+
+    os.replace(f"{path}.tmp", path)
+    # The index is renamed last: a segment without one is ignored
+    os.replace(f"{base}.idx.tmp", f"{base}.idx")
+    return path
+
+
+def _sync(file):
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _keys(row):
+    keys = {row["name"]}
+    if row.get("reference_docname"):
+        keys.add(str(row["reference_docname"]))
+    for field in ("data", "output"):
+        try:
+            values = json.loads(row.get(field) or "{}")
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(values, dict):
+            continue
+        for key in ID_KEYS:
+            if values.get(key):
+                keys.add(str(values[key]))
+    return keys
+
+
+def _segments(directory):
+    if not os.path.isdir(directory):
+        return []
+    # Newest first: a recent request is the likelier one to be looked up
+    return sorted(
+        (filename[:-len(".idx")] for filename in os.listdir(directory) if filename.endswith(".idx")),
+        reverse=True,
+    )
+
+
+@lru_cache(maxsize=64)
+def _read_index(path):
+    # Segments never change, so their indexes can be kept
+    with open(path, "rb") as index_file:
+        return json.loads(gzip.decompress(index_file.read()))
+
+
+def _read_block(segment_file, offset, length):
+    segment_file.seek(offset)
+    lines = zlib.decompress(segment_file.read(length), wbits=31).decode()
+    return [json.loads(line) for line in lines.splitlines() if line]
+
+
+def find(key, directory=None) -> list[dict]:
+    """Archived requests with this name, order id or payment id, newest segment first"""
+    directory = directory or archive_dir()
+    key = str(key)
+    found = {}
+    for segment in _segments(directory):
+        index = _read_index(os.path.join(directory, f"{segment}.idx"))
+        numbers = index["keys"].get(key)
+        if not numbers:
+            continue
+        with open(os.path.join(directory, f"{segment}.jsonl.gz"), "rb") as segment_file:
+            for number in numbers:
+                for row in _read_block(segment_file, *index["blocks"][number]):
+                    if row["name"] not in found and key in _keys(row):
+                        found[row["name"]] = row
+    return list(found.values())
+
+
+def get_archived_request(name, directory=None) -> dict | None:
+    """An archived Integration Request by name"""
+    for row in find(name, directory):
+        if row["name"] == name:
+            return row
+    return None
@@ -0,0 +1,169 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Outbox for ``on_payment_authorized`` side effects.
+
+With **Defer Payment Authorized** on, an authorised payment only inserts a
+FreedomPay Authorization Outbox row in the current transaction and the
+customer is redirected right away. Background workers then load the reference
+document and run ``on_payment_authorized`` (Payment Entry, invoice submission,
+...) outside the customer's request.
+
+- Atomic: the row is committed or rolled back with the request that authorised
+  the payment, and each run commits or rolls back together with its row.
+- Retries: a failing run is retried with exponential backoff, up to
+  ``MAX_ATTEMPTS`` times, then marked ``Failed`` and logged.
+- Ordering: rows of one reference document run one at a time in creation
+  order, guarded by a per-document Redis lock. A row waiting for a retry holds
+  back the later rows of its document; other documents are not affected.
+"""
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from .settings_cache import get_settings
+
+DOCTYPE = "FreedomPay Authorization Outbox"
+
+QUEUED = "Queued"
+DONE = "Done"
+FAILED = "Failed"
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 8
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60
+
+LOCK_KEY = "freedompay_authorization:{}:{}"
+LOCK_TTL = 10 * 60
+DRAIN_TIMEOUT = 15 * 60
+
+
+def is_deferred() -> bool:
+    return bool(get_settings().get("defer_payment_authorized"))
+
+
+def authorize(reference_doctype, reference_name, status="Completed"):
+    """Run on_payment_authorized now, or queue it when deferral is on.
+
+    Returns what on_payment_authorized returned (a redirect), or None if queued.
+    """
+    if is_deferred():
+        enqueue_authorization(reference_doctype, reference_name, status)
+        return None
+    return frappe.get_doc(reference_doctype, reference_name).run_method("on_payment_authorized", status)
+
+
+def enqueue_authorization(reference_doctype, reference_name, status="Completed"):
+    """Queue on_payment_authorized; committed together with the caller's transaction"""
+    doc = frappe.get_doc({
+        "doctype": DOCTYPE,
+        "status": QUEUED,
+        "reference_doctype": reference_doctype,
+        "reference_name": reference_name,
+        "payment_status": status,
+        "next_attempt_at": now_datetime(),
+    })
+    doc.insert(ignore_permissions=True)
+    # Picked up as soon as the row is committed; the per-minute drainer covers lost jobs
+    frappe.enqueue(
+        "freedompay_integration.authorization_outbox.drain",
+        queue="short",
+        timeout=DRAIN_TIMEOUT,
+        enqueue_after_commit=True,
+    )
+    return doc
+
+
+def drain(batch_size: int = BATCH_SIZE) -> int:
+    """Run due rows oldest first. Returns the number of rows run"""
+    rows = frappe.get_all(
+        DOCTYPE,
+        filters={"status": QUEUED},
+        fields=["name", "reference_doctype", "reference_name", "next_attempt_at"],
+        order_by="creation asc",
+        limit=batch_size,
+    )
+
+    now = now_datetime()
+    # Documents whose earlier rows are not done: their later rows must wait
+    blocked = set()
+    handled = 0
+    for row in rows:
+        reference = (row.reference_doctype, row.reference_name)
+        if reference in blocked:
+            continue
+        if row.next_attempt_at and row.next_attempt_at > now:
+            blocked.add(reference)
+            continue
+        if not _lock(reference):
+            # Another worker is running this document
+            blocked.add(reference)
+            continue
+        try:
+            # Another worker may have run it since the list was read
+            if frappe.db.get_value(DOCTYPE, row.name, "status") != QUEUED:
+                continue
+            if not run(row.name):
+                blocked.add(reference)
+            handled += 1
+        finally:
+            _unlock(reference)
+    return handled
+
+
+def run(name) -> bool:
+    """Run one row and record the outcome. Returns True if it succeeded"""
+    doc = frappe.get_doc(DOCTYPE, name)
+    ignore_permissions = frappe.flags.ignore_permissions
+    try:
+        frappe.flags.ignore_permissions = True
+        frappe.get_doc(doc.reference_doctype, doc.reference_name).run_method(
+            "on_payment_authorized", doc.payment_status or "Completed"
+        )
+        doc.db_set({"status": DONE, "done_at": now_datetime(), "last_error": None}, update_modified=False)
+        frappe.db.commit()
+        return True
+    except Exception:
+        frappe.db.rollback()
+        _record_failure(doc, frappe.get_traceback())
+        frappe.db.commit()
+        return False
+    finally:
+        frappe.flags.ignore_permissions = ignore_permissions
+
+
+def _record_failure(doc, error):
+    attempts = (doc.attempts or 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        doc.db_set({"status": FAILED, "attempts": attempts, "last_error": error}, update_modified=False)
+        title = f"FreedomPay on_payment_authorized failed: {doc.reference_doctype} {doc.reference_name}"
+        frappe.log_error(title=title[:140], message=str(error))
+        return
+
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    doc.db_set({
+        "attempts": attempts,
+        "next_attempt_at": add_to_date(now_datetime(), seconds=delay),
+        "last_error": error,
+    }, update_modified=False)
+
+
+def _lock(reference) -> bool:
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(LOCK_KEY.format(*reference)), 1, nx=True, ex=LOCK_TTL))
+
+
+def _unlock(reference):
+    cache = frappe.cache()
+    cache.delete(cache.make_key(LOCK_KEY.format(*reference)))
+
+
+def drain_if_queued():
+    """Scheduler entry point: start as many drain jobs as configured"""
+    if not frappe.db.exists(DOCTYPE, {"status": QUEUED}):
+        return
+    for _ in range(max(cint(get_settings().get("authorization_workers")), 1)):
+        frappe.enqueue(
+            "freedompay_integration.authorization_outbox.drain", queue="short", timeout=DRAIN_TIMEOUT
+        )
@@ -0,0 +1,247 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Bulk payment-link generation for billing runs.
+
+``generate_payment_links`` takes many payment requests (the same data
+``FreedomPaySettings.create_request`` receives) and yields one result per
+request as soon as its link is ready:
+
+    for link in generate_payment_links(requests):
+        if link.status == "Completed":
+            send_invoice_email(link.reference_docname, link.redirect_to)
+
+Requests are handled in chunks of ``CHUNK_SIZE``. For each chunk the
+Integration Requests are inserted with one bulk insert, the payloads are
+validated and signed in the calling thread, and ``init_payment.php`` is called
+from a thread pool of **Bulk Concurrency** workers that together stay under
+**Bulk Rate Limit** requests per second; how many of them call at once is
+decided by the adaptive limiter of the endpoint (see ``concurrency``).
+Completed requests are marked with one update, failed ones get their error,
+the FreedomPay Transaction rows are inserted with one bulk insert, and the chunk is committed, so an interrupted
+run keeps the links it already created. The links are not polled until a payer
+opens one (see ``poller.ensure_scheduled``).
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from . import ledger
+from .concurrency import get_limiter, is_failure, max_limit
+from .connection import handle_response
+from .endpoints import get_router
+from .freedompay_api import FreedomPayAPI
+from .order_index import index_order
+from .response_codes import SUCCESS
+from .results import PaymentResult
+from .settings_cache import get_secret
+from .signature import script_name_from_url, sign
+from .transport import get_transport
+
+CHUNK_SIZE = 500
+DEFAULT_RATE_LIMIT = 20
+DEFAULT_CONCURRENCY = 8
+TIMEOUT = 30
+
+COMPLETED = "Completed"
+FAILED = "Failed"
+
+
+class RateLimiter:
+    """Spaces calls from all threads at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def generate_payment_links(requests, rate_limit=None, concurrency=None, chunk_size=CHUNK_SIZE):
+    """Create payment links for many requests; yields one result per request.
+
+    Results come in completion order, as ``frappe._dict`` with
+    ``reference_doctype``, ``reference_docname``, ``integration_request``,
+    ``status`` ("Completed" or "Failed"), ``redirect_to``, ``payment_id`` and
+    ``error``. Commits after every chunk.
+    """
+    api = FreedomPayAPI(keep_raw=False)
+    settings = api.settings
+    rate_limit = cint(rate_limit or settings.get("bulk_rate_limit")) or DEFAULT_RATE_LIMIT
+    concurrency = cint(concurrency or settings.get("bulk_concurrency")) or DEFAULT_CONCURRENCY
+
+    url = api.urls.create_payment()
+    # Resolved here too: the router and limiters are per site
+    limiter = (RateLimiter(rate_limit), get_limiter(url, limit=max_limit(settings)), get_router(settings))
+    script = script_name_from_url(url)
+    # Resolved once here: worker threads have no site context
+    secret_key = get_secret(settings, "secret_key")
+    if not secret_key:
+        frappe.throw("FreedomPay secret key is not configured. Please set it in FreedomPay Settings.")
+    transport = get_transport()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        chunk = []
+        for data in requests:
+            chunk.append(frappe._dict(data))
+            if len(chunk) >= chunk_size:
+                yield from _run_chunk(chunk, api, pool, limiter, transport, url, script, secret_key)
+                chunk = []
+        if chunk:
+            yield from _run_chunk(chunk, api, pool, limiter, transport, url, script, secret_key)
+
+
+def _run_chunk(chunk, api, pool, limiter, transport, url, script, secret_key):
+    links = []
+    payloads = {}
+    for data in chunk:
+        link = frappe._dict(
+            reference_doctype=data.reference_doctype,
+            reference_docname=data.reference_docname,
+            integration_request=frappe.generate_hash(length=10),
+            status=None,
+            redirect_to=None,
+            payment_id=None,
+            error=None,
+        )
+        links.append(link)
+        try:
+            payloads[link.integration_request] = api.payment_payload(_payment_data(data))
+        except frappe.ValidationError as e:
+            link.status = FAILED
+            link.error = str(e)
+
+    _insert_logs(chunk, links)
+
+    # Links that failed validation are never sent
+    for link in links:
+        if link.status == FAILED:
+            yield link
+
+    futures = {}
+    for link in links:
+        payload = payloads.get(link.integration_request)
+        if payload is None:
+            continue
+        if payload.get("pg_check_url") and payload.get("pg_order_id"):
+            index_order(payload["pg_order_id"], payload["pg_amount"], payload["pg_currency"], link.reference_doctype)
+        sign(script, payload, secret_key)
+        futures[pool.submit(_send, transport, limiter, url, payload)] = link
+
+    try:
+        for future in as_completed(futures):
+            link = futures[future]
+            code, payment, error = future.result()
+            if code == SUCCESS and payment.get("pg_status") != "error":
+                link.status = COMPLETED
+                link.payment_id = payment.get("pg_payment_id")
+                link.redirect_to = payment.get("pg_redirect_url") or payment.get("redirect_url")
+            else:
+                link.status = FAILED
+                link.error = error or payment.get("pg_error_description") or "Unknown error"
+            yield link
+    finally:
+        # Also runs when the caller stops reading early
+        _save_outcomes(futures.values(), payloads)
+
+
+def _payment_data(data):
+    return {
+        "amount": data.amount,
+        "currency": data.currency or "UZS",
+        "description": data.description or "",
+        "order_id": data.reference_docname,
+        "reference_doctype": data.reference_doctype,
+        "result_url": data.result_url,
+        "success_url": data.success_url,
+        "failure_url": data.failure_url,
+        "check_url": data.check_url,
+        "user_id": data.payer_email,
+        "email": data.payer_email,
+        "phone": data.payer_phone,
+    }
+
+
+def _send(transport, limiter, url, payload):
+    """Runs in a worker thread: no frappe calls here"""
+    rate_limiter, concurrency_limiter, router = limiter
+    rate_limiter.acquire()
+    try:
+        with concurrency_limiter.slot() as outcome:
+            response = router.send(url, lambda target: transport.post(target, data=payload, timeout=TIMEOUT))
+            outcome["failed"] = is_failure(None, response.status_code)
+        code, feedback = handle_response(response)
+    except Exception as e:
+        return "ERROR", {}, str(e)
+    if code != SUCCESS:
+        return code, {}, feedback.error
+    return code, PaymentResult.from_feedback(feedback, keep_raw=False), None
+
+
+def _insert_logs(chunk, links):
+    now = now_datetime()
+    user = frappe.session.user
+    values = [
+        (
+            link.integration_request, now, now, user, user,
+            "FreedomPay", "Host", FAILED if link.status == FAILED else "Queued",
+            frappe.as_json(data), link.error,
+            link.reference_doctype, link.reference_docname,
+        )
+        for data, link in zip(chunk, links)
+    ]
+    frappe.db.bulk_insert(
+        "Integration Request",
+        fields=[
+            "name", "creation", "modified", "owner", "modified_by",
+            "integration_request_service", "integration_type", "status",
+            "data", "error",
+            "reference_doctype", "reference_docname",
+        ],
+        values=values,
+    )
+
+
+def _save_outcomes(links, payloads):
+    """Record the outcome of the links that were sent"""
+    ledger.bulk_record([
+        ledger.row(
+            ledger.PAYMENT,
+            payloads[link.integration_request],
+            {"pg_status": "ok", "pg_payment_id": link.payment_id} if link.status == COMPLETED else None,
+            error=link.error,
+            reference_doctype=link.reference_doctype,
+            integration_request=link.integration_request,
+        )
+        for link in links
+        if link.status
+    ])
+
+    completed = [link.integration_request for link in links if link.status == COMPLETED]
+    if completed:
+        frappe.db.sql(
+            "update `tabIntegration Request` set status=%s, modified=%s where name in %s",
+            (COMPLETED, now_datetime(), tuple(completed)),
+        )
+
+    for link in links:
+        if link.status == FAILED:
+            frappe.db.set_value(
+                "Integration Request", link.integration_request,
+                {"status": FAILED, "error": link.error}, update_modified=False,
+            )
+
+    frappe.db.commit()
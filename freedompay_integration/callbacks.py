@@ -0,0 +1,133 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Endpoints called by FreedomPay.
+
+Check URL: /api/method/freedompay_integration.callbacks.check
+Result URL: /api/method/freedompay_integration.callbacks.result
+"""
+
+from xml.sax.saxutils import escape
+
+import frappe
+from werkzeug.wrappers import Response
+
+from . import ledger
+from .authorization_outbox import authorize
+from .order_index import check_order, get_order, index_order, load_order
+from .poller import ensure_scheduled, unschedule_payment
+from .replay import callback_nonces, nonce_key
+from .settings_cache import get_settings, get_secret
+from .signature import script_name_from_url, sign, verify
+
+
+def _callback_data():
+    return {key: value for key, value in frappe.form_dict.items() if key != "cmd"}
+
+
+def _script_name():
+    return script_name_from_url(frappe.request.path)
+
+
+def _signed_response(script_name, fields, secret_key):
+    """Signed XML answer in the format FreedomPay expects"""
+    sign(script_name, fields, secret_key)
+    body = "".join(f"<{key}>{escape(str(value))}</{key}>" for key, value in fields.items())
+    return Response(
+        f'<?xml version="1.0" encoding="utf-8"?><response>{body}</response>',
+        mimetype="application/xml",
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def check():
+    """Answer FreedomPay's pre-payment check from the order index, without the ORM"""
+    data = _callback_data()
+    script_name = _script_name()
+    settings = get_settings()
+    secret_key = get_secret(settings, "secret_key") or ""
+
+    if not verify(script_name, data, secret_key):
+        return _signed_response(
+            script_name, {"pg_status": "error", "pg_description": "Invalid signature"}, secret_key
+        )
+
+    allowed, reason = check_order(
+        data.get("pg_order_id"), data.get("pg_amount"), data.get("pg_currency")
+    )
+    if allowed:
+        # A payer is paying now; links created in bulk are polled from this point on
+        if settings.get("poll_pending_payments", 1):
+            ensure_scheduled(data.get("pg_payment_id"))
+        return _signed_response(script_name, {"pg_status": "ok"}, secret_key)
+    return _signed_response(
+        script_name, {"pg_status": "rejected", "pg_description": reason}, secret_key
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def result():
+    """Process FreedomPay's payment result notification once, acknowledging replays"""
+    data = _callback_data()
+    script_name = _script_name()
+    secret_key = get_secret(get_settings(), "secret_key") or ""
+
+    if not verify(script_name, data, secret_key):
+        return _signed_response(
+            script_name, {"pg_status": "error", "pg_description": "Invalid signature"}, secret_key
+        )
+
+    # Retries of an already processed callback are answered without touching the database
+    nonce = nonce_key(data)
+    if callback_nonces.seen(nonce):
+        return _signed_response(script_name, {"pg_status": "ok"}, secret_key)
+    # Another copy is being processed; FreedomPay retries until one of them succeeds
+    if not callback_nonces.claim(nonce):
+        return _signed_response(
+            script_name, {"pg_status": "error", "pg_description": "Processing in progress"}, secret_key
+        )
+
+    try:
+        _process_result(data)
+        # Committed here, not after the response: a retry must not be taken for a replay
+        # of a result whose transaction was lost
+        frappe.db.commit()
+    except Exception:
+        # Let FreedomPay's retry process it again
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "FreedomPay result callback failed")
+        return _signed_response(
+            script_name, {"pg_status": "error", "pg_description": "Processing failed"}, secret_key
+        )
+    else:
+        callback_nonces.mark(nonce)
+    finally:
+        callback_nonces.release(nonce)
+
+    return _signed_response(script_name, {"pg_status": "ok"}, secret_key)
+
+
+def _process_result(data):
+    order_id = data.get("pg_order_id")
+    unschedule_payment(data.get("pg_payment_id"))
+    ledger.update_status(data.get("pg_payment_id"), "ok" if str(data.get("pg_result")) == "1" else "failed")
+
+    if str(data.get("pg_result")) != "1" or not order_id:
+        return
+
+    # The order record may have been evicted from Redis; the database still knows the order
+    record = get_order(order_id) or load_order(order_id, data.get("pg_payment_id"))
+    reference_doctype = record[3] if record else None
+    if not reference_doctype:
+        # Not acknowledged, so the gateway retries the notification
+        frappe.throw(f"FreedomPay result for unknown order {order_id}", frappe.DoesNotExistError)
+
+    ignore_permissions = frappe.flags.ignore_permissions
+    frappe.flags.ignore_permissions = True
+    try:
+        authorize(reference_doctype, order_id, "Completed")
+    finally:
+        frappe.flags.ignore_permissions = ignore_permissions
+
+    amount, currency = record[0], record[1]
+    index_order(order_id, amount, currency, reference_doctype, payable=False)
@@ -0,0 +1,218 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Record and replay gateway traffic.
+
+Both classes are transports (see ``transport``) and plug in wherever one is
+accepted, e.g. ``FreedomPayAPI(transport=...)``:
+
+    recorder = RecordingTransport("payments.json")
+    FreedomPayAPI(transport=recorder).create_payment(data)
+    recorder.save()
+
+    api = FreedomPayAPI(transport=ReplayTransport("payments.json", speed=0))
+
+``RecordingTransport`` forwards calls to a real transport (or a gateway
+stand-in) and keeps each exchange: method, endpoint script, request fields,
+status code, response body and how long the call took. Signatures, salts,
+customer contacts and card data are redacted in requests and responses
+before anything is written, so cassettes can be committed.
+
+``ReplayTransport`` answers from a cassette without any network: calls are
+matched by method and endpoint script in recorded order, independent of host,
+salt and signature. Past the end of the recording it starts over, suffixing
+``pg_payment_id`` with the lap number so replayed payments stay distinct.
+``speed`` sets the pace: 1 waits as long as the recorded
+call took, 2 twice as fast, 0 not at all; ``latency`` replaces the recorded
+durations with a fixed delay.
+"""
+
+import json
+import threading
+import time
+
+from .signature import script_name_from_url
+from .slow_calls import current, redact
+
+VERSION = 1
+
+# Redacted on top of the slow-call log's fields
+REDACTED_FIELDS = ("pg_salt", "pg_sig", "pg_secret_key", "secret_key")
+MASKED_FIELDS = ("pg_card_number", "pg_card_pan", "pg_card_hash")
+
+
+class CassetteError(Exception):
+    """No recorded exchange left for a call"""
+
+
+def redact_fields(fields):
+    fields = redact(fields)
+    for key, value in fields.items():
+        if key in REDACTED_FIELDS:
+            fields[key] = "***"
+        elif key in MASKED_FIELDS and value:
+            fields[key] = "*" * max(len(str(value)) - 4, 0) + str(value)[-4:]
+    return fields
+
+
+def redact_body(body):
+    """Redact a JSON object body; other bodies are kept as they are"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict):
+        return body
+    return json.dumps(redact_fields(data), ensure_ascii=False)
+
+
+def relabel_body(body, lap):
+    """Suffix ``pg_payment_id`` in a JSON object body with ``lap``"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or not data.get("pg_payment_id"):
+        return body
+    data["pg_payment_id"] = f"{data['pg_payment_id']}-{lap}"
+    return json.dumps(data, ensure_ascii=False)
+
+
+class CassetteResponse:
+    """Replayed response with the attributes callers read from real ones"""
+
+    def __init__(self, url, status_code, body, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.text = body
+        self.content = body.encode()
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+
+class RecordingTransport:
+    """Forwards calls to ``transport`` and keeps every exchange for ``save``"""
+
+    name = "recording"
+
+    def __init__(self, path, transport=None):
+        if transport is None:
+            from .transport import get_transport
+
+            transport = get_transport()
+        self.path = path
+        self.transport = transport
+        self.exchanges = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _record(self, method, url, fields, send):
+        start = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - start
+        exchange = {
+            "method": method,
+            "script": script_name_from_url(url),
+            "request": redact_fields(fields or {}),
+            "status_code": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "body": redact_body(response.text),
+            "elapsed": round(elapsed, 6),
+            "offset": round(start - self._started, 6),
+        }
+        with self._lock:
+            self.exchanges.append(exchange)
+        return response
+
+    def post(self, url, data=None, json=None, headers=None, timeout=30):
+        return self._record(
+            "POST", url, data if data is not None else json,
+            lambda: self.transport.post(url, data=data, json=json, headers=headers, timeout=timeout),
+        )
+
+    def get(self, url, params=None, headers=None, timeout=30):
+        return self._record(
+            "GET", url, params, lambda: self.transport.get(url, params=params, headers=headers, timeout=timeout)
+        )
+
+    def head(self, url, timeout=30):
+        return self.transport.head(url, timeout=timeout)
+
+    def save(self):
+        with self._lock:
+            exchanges = sorted(self.exchanges, key=lambda exchange: exchange["offset"])
+        with open(self.path, "w") as cassette:
+            json.dump({"version": VERSION, "exchanges": exchanges}, cassette, indent=1, ensure_ascii=False)
+
+    def close(self):
+        self.save()
+
+
+class ReplayTransport:
+    """Answers calls from a cassette; ``loop`` starts over when an endpoint runs out"""
+
+    name = "replay"
+
+    def __init__(self, path, speed=1.0, latency=None, loop=True):
+        with open(path) as cassette:
+            self.exchanges = json.load(cassette)["exchanges"]
+        self.speed = speed
+        self.latency = latency
+        self.loop = loop
+        self._queues = {}
+        for exchange in self.exchanges:
+            self._queues.setdefault((exchange["method"], exchange["script"]), []).append(exchange)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def _next(self, method, url):
+        key = (method, script_name_from_url(url))
+        queue = self._queues.get(key)
+        with self._lock:
+            position = self._positions.get(key, 0)
+            if not queue or (position >= len(queue) and not self.loop):
+                raise CassetteError(f"No recorded {method} {key[1]} left in the cassette")
+            self._positions[key] = position + 1
+        return queue[position % len(queue)], position // len(queue)
+
+    def _replay(self, method, url):
+        exchange, lap = self._next(method, url)
+        if self.latency is not None:
+            delay = self.latency
+        elif self.speed:
+            delay = exchange["elapsed"] / self.speed
+        else:
+            delay = 0
+        if delay > 0:
+            time.sleep(delay)
+
+        body = relabel_body(exchange["body"], lap) if lap else exchange["body"]
+        response = CassetteResponse(
+            url, exchange["status_code"], body, {"Content-Type": exchange.get("content_type", "")}
+        )
+        call = current()
+        if call is not None:
+            call.headers_received()
+            call.response_received(response)
+        return response
+
+    def post(self, url, data=None, json=None, headers=None, timeout=30):
+        return self._replay("POST", url)
+
+    def get(self, url, params=None, headers=None, timeout=30):
+        return self._replay("GET", url)
+
+    def head(self, url, timeout=30):
+        return CassetteResponse(url, 200, "")
+
+    def rewind(self):
+        with self._lock:
+            self._positions.clear()
+
+    def close(self):
+        pass
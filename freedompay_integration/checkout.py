@@ -0,0 +1,87 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Asynchronous checkout.
+
+With **Async Checkout** on, ``FreedomPaySettings.create_request`` only inserts
+the Integration Request, enqueues ``run`` and redirects the browser to the
+``freedompay_checkout_pending`` page, so the web worker is free in
+milliseconds. The job creates the payment as the synchronous path does and
+pushes the result (``redirect_to`` and ``status``) to the page with
+``frappe.publish_realtime`` on the Integration Request's task room.
+
+The result is also kept in Redis for ``RESULT_TTL``: the page renders it
+directly if the job finished before the page loaded, and asks once through
+``get_status`` after subscribing, in case the event was sent in between.
+"""
+
+import json
+
+import frappe
+from frappe import _
+
+from .settings_cache import get_settings
+
+EVENT = "freedompay_checkout"
+RESULT_KEY = "freedompay_checkout:{0}"
+RESULT_TTL = 60 * 60
+PENDING_PAGE = "/freedompay_checkout_pending"
+JOB_TIMEOUT = 5 * 60
+
+
+def is_async() -> bool:
+    return bool(get_settings().get("async_checkout"))
+
+
+def start(integration_request) -> dict:
+    """Enqueue the payment of a logged request and return the pending page redirect"""
+    frappe.enqueue(
+        "freedompay_integration.checkout.run",
+        queue="short",
+        timeout=JOB_TIMEOUT,
+        enqueue_after_commit=True,
+        integration_request=integration_request.name,
+    )
+    return {
+        "redirect_to": f"{PENDING_PAGE}?request={integration_request.name}",
+        "status": "Queued",
+    }
+
+
+def run(integration_request):
+    """Background job: create the payment and push the result to the browser"""
+    settings = frappe.get_doc("FreedomPay Settings")
+    settings.integration_request = frappe.get_doc("Integration Request", integration_request)
+    settings.data = frappe._dict(json.loads(settings.integration_request.data or "{}"))
+
+    try:
+        result = settings.create_payment_on_freedompay()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "FreedomPay async checkout failed")
+        settings.integration_request.db_set("status", "Failed", update_modified=False)
+        result = {
+            "redirect_to": frappe.redirect_to_message(
+                _("Server Error"),
+                _("There was an issue with the FreedomPay configuration."),
+            ),
+            "status": "Failed",
+        }
+
+    publish(integration_request, result)
+    return result
+
+
+def publish(integration_request, result):
+    result = {"redirect_to": result.get("redirect_to"), "status": result.get("status")}
+    frappe.cache().set_value(RESULT_KEY.format(integration_request), result, expires_in_sec=RESULT_TTL)
+    frappe.publish_realtime(EVENT, result, task_id=integration_request, after_commit=True)
+
+
+def get_result(integration_request):
+    return frappe.cache().get_value(RESULT_KEY.format(integration_request))
+
+
+@frappe.whitelist(allow_guest=True)
+def get_status(request):
+    """Result of a checkout, or ``Queued`` while the job is still running"""
+    return get_result(request) or {"status": "Queued"}
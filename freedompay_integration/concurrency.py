@@ -0,0 +1,223 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Adaptive per-endpoint concurrency limits for gateway calls.
+
+Every call made through ``FreedomPayConnection`` (and every call of a bulk
+run) takes a slot from the ``AdaptiveLimiter`` of its endpoint
+(``init_payment.php``, ``get_status.php``, ...). The limit follows the
+gateway, AIMD style:
+
+- a call that succeeds with a latency within ``TOLERANCE`` times the
+  endpoint's baseline (the lowest recent latency) raises the limit by
+  ``1 / limit``, i.e. by about one per round of calls;
+- a failed call (network error, HTTP 429 or 5xx) or a call slower than that
+  cuts the limit by ``BACKOFF``, at most once per ``COOLDOWN`` seconds.
+
+Limits live in process memory, per site and endpoint, between
+``MIN_LIMIT`` and **Max Gateway Concurrency**. ``get_metrics`` reports them;
+each worker also publishes its figures to Redis, where ``get_all_metrics``
+collects them.
+"""
+
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint
+
+from .settings_cache import get_settings
+from .signature import script_name_from_url
+
+MIN_LIMIT = 1
+INITIAL_LIMIT = 4
+DEFAULT_MAX_LIMIT = 32
+TOLERANCE = 2.0
+BACKOFF = 0.7
+COOLDOWN = 1.0
+# Weight of a new sample in the smoothed latency
+SMOOTHING = 0.2
+# The baseline drifts up so an old, unusually fast sample does not pin it
+BASELINE_DRIFT = 1.01
+ACQUIRE_TIMEOUT = 60
+
+METRICS_CACHE_KEY = "freedompay_concurrency"
+PUBLISH_INTERVAL = 10
+# Entries not refreshed for this long belong to stopped or idle workers
+METRICS_TTL = 6 * PUBLISH_INTERVAL
+
+
+class AdaptiveLimiter:
+    """In-flight limit of one endpoint, adjusted from observed latency and errors"""
+
+    def __init__(self, max_limit=DEFAULT_MAX_LIMIT, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self.calls = 0
+        self.errors = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT) -> bool:
+        """Wait for a slot. Returns False if none was free within ``timeout``"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+            self.in_flight += 1
+            return True
+
+    def release(self, elapsed, failed=False):
+        """Give the slot back and adjust the limit from the call's outcome"""
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            if failed:
+                self.errors += 1
+                self._decrease()
+            else:
+                self._observe(elapsed)
+            self._cond.notify_all()
+
+    def _observe(self, elapsed):
+        if self.baseline is None or elapsed < self.baseline:
+            self.baseline = elapsed
+        else:
+            self.baseline *= BASELINE_DRIFT
+        self.latency = elapsed if self.latency is None else self.latency + SMOOTHING * (elapsed - self.latency)
+
+        if elapsed > self.baseline * TOLERANCE:
+            self._decrease()
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow while the limit is what holds calls back
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def _decrease(self):
+        now = time.monotonic()
+        # One slow round must not halve the limit once per call
+        if now - self._last_decrease < COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * BACKOFF, self.min_limit)
+        self.decreases += 1
+
+    @contextmanager
+    def slot(self, timeout=ACQUIRE_TIMEOUT):
+        """Hold a slot for one call; set ``outcome["failed"]`` if the call failed"""
+        if not self.acquire(timeout):
+            raise TimeoutError("No free FreedomPay connection slot")
+        outcome = {"failed": False}
+        start = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["failed"] = True
+            raise
+        finally:
+            self.release(time.perf_counter() - start, outcome["failed"])
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "baseline_ms": _ms(self.baseline),
+                "latency_ms": _ms(self.latency),
+                "calls": self.calls,
+                "errors": self.errors,
+                "decreases": self.decreases,
+            }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_last_publish = {}
+
+
+def max_limit(settings=None) -> int:
+    settings = settings or get_settings()
+    return cint(settings.get("max_gateway_concurrency")) or DEFAULT_MAX_LIMIT
+
+
+def get_limiter(url_or_endpoint, site=None, limit=None) -> AdaptiveLimiter:
+    """Limiter of an endpoint of this site, created on first use.
+
+    Worker threads without a site context pass ``site`` and ``limit``.
+    """
+    if site is None:
+        site = getattr(frappe.local, "site", None)
+    key = (site, script_name_from_url(url_or_endpoint))
+    limiter = _limiters.get(key)
+    if limiter is None:
+        if limit is None:
+            limit = max_limit()
+        with _limiters_lock:
+            limiter = _limiters.setdefault(key, AdaptiveLimiter(limit))
+    return limiter
+
+
+def is_failure(code, status_code=None) -> bool:
+    """Whether a call outcome means the gateway is struggling"""
+    if code == "ERROR":
+        return True
+    return bool(status_code) and (status_code == 429 or status_code >= 500)
+
+
+def get_metrics(site=None) -> dict:
+    """Limits and latencies of this worker's endpoints"""
+    if site is None:
+        site = getattr(frappe.local, "site", None)
+    return {
+        endpoint: limiter.metrics()
+        for (limiter_site, endpoint), limiter in list(_limiters.items())
+        if limiter_site == site
+    }
+
+
+def publish_metrics(force=False):
+    """Share this worker's metrics through Redis, at most every PUBLISH_INTERVAL seconds"""
+    site = getattr(frappe.local, "site", None)
+    now = time.monotonic()
+    if not force and now - _last_publish.get(site, 0) < PUBLISH_INTERVAL:
+        return
+    _last_publish[site] = now
+    metrics = get_metrics(site)
+    if not metrics:
+        return
+    try:
+        frappe.cache().hset(
+            METRICS_CACHE_KEY, f"{socket.gethostname()}:{os.getpid()}", {"metrics": metrics, "at": time.time()}
+        )
+    except Exception:
+        # Reporting must never break a payment
+        pass
+
+
+def get_all_metrics() -> dict:
+    """Metrics published by all workers, by worker; entries older than METRICS_TTL are dropped"""
+    cache = frappe.cache()
+    cutoff = time.time() - METRICS_TTL
+    metrics = {}
+    for worker, entry in (cache.hgetall(METRICS_CACHE_KEY) or {}).items():
+        if isinstance(entry, dict) and entry.get("at", 0) >= cutoff:
+            metrics[worker] = entry
+        else:
+            # A restarted worker publishes under a new pid and never refreshes this one
+            cache.hdel(METRICS_CACHE_KEY, worker)
+    return metrics
@@ -1,17 +1,24 @@
-import hashlib
-import random
-import string
-import json
+import time
 
 import frappe
-import requests
 
+from .concurrency import get_limiter, is_failure, max_limit
+from .endpoints import get_router
 from .response_feedback import ResponseFeedBack
+from .settings_cache import get_settings, get_secret
+from .signature import generate_salt, make_signature, script_name_from_url
+from .slow_calls import track
+from .transport import get_transport
+from .warmup import record_gateway_call
 
 
 class FreedomPayConnection:
-    def __init__(self):
-        self.settings = frappe.get_doc("FreedomPay Settings")
+    def __init__(self, secret_field="secret_key", transport=None):
+        self.settings = get_settings()
+        self.transport = transport or get_transport()
+        self.router = get_router(self.settings)
+        # Password field of FreedomPay Settings used to sign requests
+        self.secret_field = secret_field
 
     def post(self, url, data=None, use_form_data=True):
         """POST request with signature"""
@@ -25,10 +32,18 @@ class FreedomPayConnection:
                 'Content-Type': 'application/x-www-form-urlencoded' if use_form_data else 'application/json'
             }
 
-            if use_form_data:
-                response = requests.post(url, data=data, headers=headers, timeout=30)
-            else:
-                response = requests.post(url, json=data, headers=headers, timeout=30)
+            start = time.perf_counter()
+            with get_limiter(url, limit=max_limit(self.settings)).slot() as outcome, track(url, data):
+                if use_form_data:
+                    response = self.router.send(
+                        url, lambda target: self.transport.post(target, data=data, headers=headers, timeout=30)
+                    )
+                else:
+                    response = self.router.send(
+                        url, lambda target: self.transport.post(target, json=data, headers=headers, timeout=30)
+                    )
+                outcome["failed"] = is_failure(None, response.status_code)
+            record_gateway_call(url, time.perf_counter() - start)
 
             return self._handle_response(response)
         except Exception as e:
@@ -41,7 +56,13 @@ class FreedomPayConnection:
                 signature = self.generate_signature(url, params)
                 params['pg_sig'] = signature
 
-            response = requests.get(url, params=params, timeout=30)
+            start = time.perf_counter()
+            with get_limiter(url, limit=max_limit(self.settings)).slot() as outcome, track(url, params):
+                response = self.router.send(
+                    url, lambda target: self.transport.get(target, params=params, timeout=30)
+                )
+                outcome["failed"] = is_failure(None, response.status_code)
+            record_gateway_call(url, time.perf_counter() - start)
             return self._handle_response(response)
         except Exception as e:
             return "ERROR", ResponseFeedBack(error=str(e))
@@ -49,53 +70,34 @@ class FreedomPayConnection:
     def generate_signature(self, url, data):
         """Generate MD5 signature according to FreedomPay documentation"""
         # Extract script name from URL (from last / to end or ?)
-        script_name = url.split('/')[-1].split('?')[0]
+        script_name = script_name_from_url(url)
 
         # Generate random salt
-        salt = ''.join(random.choices(string.ascii_letters + string.digits, k=16))
-        data['pg_salt'] = salt
+        data['pg_salt'] = generate_salt()
 
-        # Sort fields alphabetically
-        sorted_keys = sorted(data.keys())
-
-        # Concatenate: script_name;field1=value1;field2=value2;...;pg_salt=salt_value;secret_key
-        signature_string = script_name + ';'
-        for key in sorted_keys:
-            if key != 'pg_sig':  # Don't include signature in signature calculation
-                signature_string += f"{key}={data[key]};"
-
-        # Add secret key
-        secret_key = self.settings.get_password('secret_key')
+        secret_key = get_secret(self.settings, self.secret_field)
         if not secret_key:
             frappe.throw("FreedomPay secret key is not configured. Please set it in FreedomPay Settings.")
 
-        signature_string += secret_key
-
-        # Calculate MD5
-        return hashlib.md5(signature_string.encode('utf-8')).hexdigest()
+        return make_signature(script_name, data, secret_key)
 
     def _handle_response(self, response):
         """Handle API response"""
-        try:
-            if response.status_code == 200:
-                # Try to parse as JSON first, then as form data
-                try:
-                    data = response.json()
-                    return "SUCCESS", ResponseFeedBack(data=data)
-                except json.JSONDecodeError:
-                    # Parse as form data
-                    data = {}
-                    for item in response.text.split('&'):
-                        if '=' in item:
-                            key, value = item.split('=', 1)
-                            data[key] = value
-                    return "SUCCESS", ResponseFeedBack(data=data)
-            else:
-                try:
-                    data = response.json()
-                    error_msg = data.get("pg_error_description", data.get("message", "Unknown error"))
-                except:
-                    error_msg = f"HTTP {response.status_code}: {response.text}"
-                return "FAILED", ResponseFeedBack(error=error_msg)
-        except Exception as e:
-            return "ERROR", ResponseFeedBack(error=str(e))
+        return handle_response(response)
+
+
+def handle_response(response):
+    """Turn a gateway response into (code, ResponseFeedBack)"""
+    try:
+        if response.status_code == 200:
+            # The body is parsed lazily, on first access to feedback.data
+            return "SUCCESS", ResponseFeedBack(body=response.content, status_code=200)
+        else:
+            try:
+                data = response.json()
+                error_msg = data.get("pg_error_description", data.get("message", "Unknown error"))
+            except:
+                error_msg = f"HTTP {response.status_code}: {response.text}"
+            return "FAILED", ResponseFeedBack(error=error_msg, status_code=response.status_code)
+    except Exception as e:
+        return "ERROR", ResponseFeedBack(error=str(e))
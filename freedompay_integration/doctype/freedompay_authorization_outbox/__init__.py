@@ -0,0 +1 @@
+# FreedomPay Authorization Outbox DocType
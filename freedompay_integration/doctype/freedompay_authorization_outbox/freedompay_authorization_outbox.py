@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class FreedomPayAuthorizationOutbox(Document):
+    """Deferred on_payment_authorized call, see freedompay_integration.authorization_outbox"""
+
+    pass
+
+
+def on_doctype_update():
+    # Rows of one reference document run in creation order
+    frappe.db.add_index("FreedomPay Authorization Outbox", ["reference_doctype", "reference_name"])
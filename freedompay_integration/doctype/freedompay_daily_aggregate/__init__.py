@@ -0,0 +1 @@
+# FreedomPay Daily Aggregate DocType
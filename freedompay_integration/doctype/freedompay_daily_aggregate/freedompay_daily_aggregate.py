@@ -0,0 +1,15 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class FreedomPayDailyAggregate(Document):
+    """Daily rollup of the FreedomPay Transaction ledger, see freedompay_integration.aggregates"""
+
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("FreedomPay Daily Aggregate", ["date", "merchant_id", "currency"])
@@ -0,0 +1 @@
+# FreedomPay Payout Outbox DocType
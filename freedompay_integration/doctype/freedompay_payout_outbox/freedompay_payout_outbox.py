@@ -0,0 +1,10 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class FreedomPayPayoutOutbox(Document):
+    """Payout waiting to be sent to FreedomPay, see freedompay_integration.payout_outbox"""
+
+    pass
@@ -1,10 +1,18 @@
 # Copyright (c) 2026, Viktor Krasnikov and contributors
 # For license information, please see license.txt
 
+from urllib.parse import urlencode
+
 import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from freedompay_integration import checkout
+from freedompay_integration.authorization_outbox import authorize
+from freedompay_integration.gateway_errors import log_gateway_error
+from freedompay_integration.profiler import profiled
+from freedompay_integration.schemas import SUPPORTED_CURRENCIES
+
 
 class FreedomPaySettings(Document):
     def on_update(self):
@@ -28,9 +36,7 @@ class FreedomPaySettings(Document):
 
     def validate_transaction_currency(self, currency):
         """Validate transaction currency"""
-        # FreedomPay supports UZS and other currencies
-        supported_currencies = ["UZS", "USD", "EUR", "RUB"]
-        if currency not in supported_currencies:
+        if currency not in SUPPORTED_CURRENCIES:
             frappe.throw(
                 _("FreedomPay does not support transactions in currency '{0}'").format(currency)
             )
@@ -38,18 +44,20 @@ class FreedomPaySettings(Document):
     def get_payment_url(self, **kwargs):
         """Get payment URL for checkout"""
         from frappe.utils import get_url
-        from urllib.parse import urlencode
         return get_url(f"./freedompay_checkout?{urlencode(kwargs)}")
 
+    @profiled("create_request")
     def create_request(self, data):
         """Create payment request"""
         from frappe.integrations.utils import create_request_log
-        from .freedompay_api import FreedomPayAPI
 
         self.data = frappe._dict(data)
 
         try:
             self.integration_request = create_request_log(self.data, service_name="FreedomPay")
+            # Async checkout: the gateway call runs in a job and the browser gets a pending page
+            if checkout.is_async():
+                return checkout.start(self.integration_request)
             return self.create_payment_on_freedompay()
         except Exception:
             frappe.log_error(frappe.get_traceback())
@@ -63,7 +71,7 @@ class FreedomPaySettings(Document):
 
     def create_payment_on_freedompay(self):
         """Create payment on FreedomPay"""
-        from .freedompay_api import FreedomPayAPI
+        from freedompay_integration.freedompay_api import FreedomPayAPI
 
         api = FreedomPayAPI()
 
@@ -72,6 +80,7 @@ class FreedomPaySettings(Document):
             "currency": self.data.currency or "UZS",
             "description": self.data.description or "",
             "order_id": self.data.reference_docname,
+            "reference_doctype": self.data.reference_doctype,
             "result_url": self.data.result_url,
             "success_url": self.data.success_url,
             "failure_url": self.data.failure_url,
@@ -79,6 +88,7 @@ class FreedomPaySettings(Document):
             "user_id": self.data.payer_email,
             "email": self.data.payer_email,
             "phone": self.data.payer_phone,
+            "integration_request": self.integration_request.name,
         }
 
         code, payment, feedback = api.create_payment(payment_data)
@@ -87,7 +97,7 @@ class FreedomPaySettings(Document):
             self.integration_request.db_set("status", "Completed", update_modified=False)
             self.flags.status_changed_to = "Completed"
         else:
-            frappe.log_error(f"FreedomPay Payment Failed: {feedback.error}")
+            log_gateway_error(f"FreedomPay Payment Failed: {feedback.error}", "init_payment.php", feedback.error)
             self.integration_request.db_set("status", "Failed", update_modified=False)
 
         return self.finalize_request()
@@ -102,9 +112,10 @@ class FreedomPaySettings(Document):
             if self.data.reference_doctype and self.data.reference_docname:
                 custom_redirect_to = None
                 try:
-                    custom_redirect_to = frappe.get_doc(
-                        self.data.reference_doctype, self.data.reference_docname
-                    ).run_method("on_payment_authorized", self.flags.status_changed_to)
+                    # Queued for a background worker when Defer Payment Authorized is on
+                    custom_redirect_to = authorize(
+                        self.data.reference_doctype, self.data.reference_docname, self.flags.status_changed_to
+                    )
                 except Exception:
                     frappe.log_error(frappe.get_traceback())
 
@@ -5,14 +5,17 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from payments.utils import create_payment_gateway
 from typing import Optional
 
+from freedompay_integration.schemas import SUPPORTED_CURRENCIES
+
 class FreedomPaySettings(Document):
     """FreedomPay Settings Document"""
 
     def on_update(self) -> None:
         """Create payment gateway when settings are updated"""
+        from payments.utils import create_payment_gateway
+
         try:
             create_payment_gateway(
                 "FreedomPay",
@@ -50,8 +53,7 @@ class FreedomPaySettings(Document):
 
     def validate_transaction_currency(self, currency: str) -> None:
         """Validate transaction currency"""
-        supported_currencies = ["UZS", "USD", "EUR", "RUB"]
-        if currency not in supported_currencies:
+        if currency not in SUPPORTED_CURRENCIES:
             frappe.throw(
                 _("FreedomPay does not support transactions in currency '{0}'").format(currency)
             )
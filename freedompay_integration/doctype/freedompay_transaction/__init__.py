@@ -0,0 +1 @@
+# FreedomPay Transaction DocType
@@ -0,0 +1,17 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class FreedomPayTransaction(Document):
+    """Ledger row of one FreedomPay payment or payout, see freedompay_integration.ledger"""
+
+    pass
+
+
+def on_doctype_update():
+    # Dashboards filter by status over a date range
+    frappe.db.add_index("FreedomPay Transaction", ["status", "creation"])
+    frappe.db.add_index("FreedomPay Transaction", ["reference_doctype", "reference_name"])
@@ -0,0 +1,185 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Routing of gateway calls over several FreedomPay API hosts.
+
+**Base URL** and the hosts listed in **Fallback URLs** form the endpoint list
+of a site. Gateway URLs are still built from **Base URL**; ``EndpointRouter``
+moves each call to the endpoint that currently looks best and keeps passive
+health figures from the calls themselves, without probing:
+
+- latency: an EWMA of the call durations, used to order healthy endpoints;
+  an endpoint with no calls yet is tried before measured ones, in list order;
+- health: ``FAILURE_THRESHOLD`` consecutive failures (network errors, HTTP
+  429 or 5xx) take an endpoint out of rotation for ``COOLDOWN`` seconds,
+  after which one call is let through to test it.
+
+Failover only resends what is safe to resend. Status checks
+(``IDEMPOTENT_SCRIPTS``) move on to the next endpoint after any failure.
+Payments, payouts and refunds move on only when the connection could not be
+opened at all, so the gateway never saw them; once a request may have
+reached a host its error is returned as is.
+"""
+
+import threading
+import time
+
+import frappe
+
+from .settings_cache import get_settings
+
+DEFAULT_BASE_URL = "https://api.freedompay.uz"
+IDEMPOTENT_SCRIPTS = frozenset(("get_status.php",))
+
+# Weight of a new sample in the latency average
+SMOOTHING = 0.3
+FAILURE_THRESHOLD = 3
+COOLDOWN = 30
+
+# Errors raised before anything was sent: connecting failed or timed out
+_NOT_SENT_ERRORS = ("ConnectTimeout", "ConnectError", "NewConnectionError", "NameResolutionError")
+
+
+class Endpoint:
+    __slots__ = ("base_url", "latency", "failures", "down_until", "calls", "errors")
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def is_healthy(self, now) -> bool:
+        return self.down_until <= now
+
+
+class EndpointRouter:
+    """Health and latency of the endpoints of one site"""
+
+    def __init__(self, base_urls):
+        self.endpoints = tuple(Endpoint(base_url) for base_url in base_urls)
+        self._by_url = {endpoint.base_url: endpoint for endpoint in self.endpoints}
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list:
+        """Endpoints in the order to try them: healthy ones fastest first, then the rest"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if endpoint.is_healthy(now)]
+            down = [endpoint for endpoint in self.endpoints if not endpoint.is_healthy(now)]
+        healthy.sort(key=lambda endpoint: -1 if endpoint.latency is None else endpoint.latency)
+        down.sort(key=lambda endpoint: endpoint.down_until)
+        return healthy + down
+
+    def record(self, endpoint, elapsed, failed=False):
+        with self._lock:
+            endpoint.calls += 1
+            if failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= FAILURE_THRESHOLD:
+                    endpoint.down_until = time.monotonic() + COOLDOWN
+                return
+            endpoint.failures = 0
+            endpoint.down_until = 0.0
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += SMOOTHING * (elapsed - endpoint.latency)
+
+    def send(self, url, send):
+        """Call ``send(url)`` on the best endpoint, failing over where it is safe.
+
+        ``url`` is built from any configured endpoint; URLs of other hosts are
+        sent as they are.
+        """
+        base_url, _, script = url.rpartition("/")
+        if base_url.rstrip("/") not in self._by_url:
+            return send(url)
+
+        idempotent = script.split("?", 1)[0] in IDEMPOTENT_SCRIPTS
+        candidates = self.candidates()
+        for position, endpoint in enumerate(candidates):
+            last = position == len(candidates) - 1
+            start = time.perf_counter()
+            try:
+                response = send(f"{endpoint.base_url}/{script}")
+            except Exception as e:
+                self.record(endpoint, time.perf_counter() - start, failed=True)
+                if last or not (idempotent or not_sent(e)):
+                    raise
+                continue
+
+            failed = is_failure_status(response.status_code)
+            self.record(endpoint, time.perf_counter() - start, failed)
+            if failed and idempotent and not last:
+                continue
+            return response
+
+    def metrics(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "base_url": endpoint.base_url,
+                    "healthy": endpoint.is_healthy(now),
+                    "latency_ms": None if endpoint.latency is None else round(endpoint.latency * 1000, 1),
+                    "calls": endpoint.calls,
+                    "errors": endpoint.errors,
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+def is_failure_status(status_code) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def not_sent(error) -> bool:
+    """Whether a network error happened before the request left this host"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in _NOT_SENT_ERRORS:
+            return True
+        # requests keeps the urllib3 error only in the message
+        if any(name in str(error) for name in _NOT_SENT_ERRORS[2:]):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def get_base_urls(settings=None) -> tuple:
+    """Base URL followed by the Fallback URLs, without duplicates"""
+    settings = settings or get_settings()
+    urls = [settings.get("base_url") or DEFAULT_BASE_URL]
+    urls.extend((settings.get("fallback_urls") or "").split())
+    return tuple(dict.fromkeys(url.rstrip("/") for url in urls))
+
+
+_routers = {}
+_lock = threading.Lock()
+
+
+def get_router(settings=None, base_urls=None) -> EndpointRouter:
+    """Router of this site's endpoints; replaced when the list changes"""
+    if base_urls:
+        base_urls = tuple(dict.fromkeys(url.rstrip("/") for url in base_urls if url))
+    else:
+        base_urls = get_base_urls(settings)
+    key = getattr(frappe.local, "site", None)
+    router = _routers.get(key)
+    if router is None or tuple(router._by_url) != base_urls:
+        with _lock:
+            router = _routers.get(key)
+            if router is None or tuple(router._by_url) != base_urls:
+                router = _routers[key] = EndpointRouter(base_urls)
+    return router
+
+
+def get_metrics() -> list:
+    """Health and latency of this worker's endpoints for the current site"""
+    router = _routers.get(getattr(frappe.local, "site", None))
+    return router.metrics() if router else []
@@ -0,0 +1,1001 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""In-process stand-in for the parts of Frappe this app uses, for unit tests.
+
+Outside a bench ``frappe`` cannot be imported, and a site with MariaDB and
+Redis makes every test take seconds. ``install()`` registers a ``frappe``
+package that keeps documents, passwords and cache entries in memory:
+
+    from freedompay_integration import fake_frappe
+
+    frappe = fake_frappe.install()
+    frappe.get_doc({"doctype": "FreedomPay Settings", "merchant_id": "1", "secret_key": "s"}).db_insert()
+    ...
+    fake_frappe.reset()
+
+Covered: documents (``get_doc``, ``new_doc``, ``insert``, ``save``,
+``db_set``, ``get_password``, ``run_method``), ``get_all``/``get_list`` with
+the usual filter operators, ``frappe.db`` (``get_value``, ``set_value``,
+``exists``, ``delete``, ``bulk_insert``, ``count``), a Redis-like
+``frappe.cache()``, ``create_request_log``, ``throw``, ``log_error``,
+``msgprint``, ``enqueue`` and ``frappe.utils`` dates and numbers.
+
+Not covered: DocType meta and validation of field types, permissions, SQL
+(``frappe.db.sql`` understands ``update `tabX` set a=%s where name in %s`` and
+otherwise only records the query), transactions (``rollback`` keeps
+everything) and Lua scripts (register a Python version in ``cache.scripts``).
+Controllers are plain ``Document`` unless registered in ``controllers``.
+"""
+
+import datetime
+import fnmatch
+import importlib
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+from collections import OrderedDict
+
+
+class _dict(dict):
+    """dict with attribute access, as ``frappe._dict``"""
+
+    def __getattr__(self, key):
+        return self.get(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+    def __delattr__(self, key):
+        self.pop(key, None)
+
+    def copy(self):
+        return _dict(self)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        return self
+
+
+class ValidationError(Exception):
+    pass
+
+
+class DoesNotExistError(ValidationError):
+    pass
+
+
+class DuplicateEntryError(Exception):
+    pass
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+class Redirect(Exception):
+    pass
+
+
+class _Local(threading.local):
+    def __init__(self):
+        self.site = "test.local"
+        self.flags = _dict()
+        self.message_log = []
+        self.response = _dict()
+        self.request_ip = None
+
+
+local = _Local()
+flags = _dict()
+session = _dict(user="Administrator")
+form_dict = _dict()
+request = None
+
+# Doctype -> Document subclass used by get_doc
+controllers = {}
+# Doctypes with a single document named after the doctype
+singles = {"FreedomPay Settings"}
+# Calls recorded for assertions
+error_log = []
+jobs = []
+realtime = []
+
+_docs = {}
+_passwords = {}
+_lock = threading.RLock()
+
+
+# Utilities
+
+def _(message, *args, **kwargs):
+    return message
+
+
+def cstr(value, encoding="utf-8"):
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode(encoding)
+    return str(value)
+
+
+def flt(value, precision=None):
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return round(number, precision) if precision is not None else number
+
+
+def cint(value, default=0):
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return default
+
+
+def now_datetime():
+    return datetime.datetime.now()
+
+
+def now():
+    return now_datetime().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def get_datetime(value=None):
+    if value is None:
+        return now_datetime()
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def getdate(value=None):
+    if value is None:
+        return datetime.date.today()
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def add_to_date(date, years=0, months=0, weeks=0, days=0, hours=0, minutes=0, seconds=0, as_string=False, **kwargs):
+    if date is None:
+        date = now_datetime()
+    elif isinstance(date, str):
+        date = get_datetime(date)
+    total_months = date.month - 1 + months + 12 * years
+    if total_months or years:
+        year, month = date.year + total_months // 12, total_months % 12 + 1
+        date = date.replace(year=year, month=month, day=min(date.day, _month_days(year, month)))
+    result = date + datetime.timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+    return str(result) if as_string else result
+
+
+def _month_days(year, month):
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return (following - datetime.timedelta(days=1)).day
+
+
+def add_days(date, days):
+    return add_to_date(date, days=days)
+
+
+def get_url(uri=None, full_address=False):
+    return "http://" + local.site + ("/" + uri.lstrip("./") if uri else "")
+
+
+def generate_hash(txt=None, length=56):
+    return secrets.token_hex((length + 1) // 2)[:length]
+
+
+def safe_decode(value, encoding="utf-8"):
+    return value.decode(encoding) if isinstance(value, bytes) else value
+
+
+def as_json(obj, indent=1, separators=None, ensure_ascii=True):
+    return json.dumps(obj, indent=indent, default=str, sort_keys=True, separators=separators, ensure_ascii=ensure_ascii)
+
+
+def get_traceback(with_context=False):
+    return traceback.format_exc()
+
+
+def get_site_path(*path):
+    return os.path.join(tempfile.gettempdir(), "fake_frappe", local.site, *path)
+
+
+def get_attr(method_string):
+    module, attr = method_string.rsplit(".", 1)
+    return getattr(importlib.import_module(module), attr)
+
+
+def get_hooks(hook=None, default=None, app_name=None):
+    if hook:
+        return default if default is not None else []
+    return _dict()
+
+
+def get_installed_apps(*args, **kwargs):
+    return ["frappe", "freedompay_integration"]
+
+
+def logger(module=None, *args, **kwargs):
+    return logging.getLogger(module or "frappe")
+
+
+def whitelist(allow_guest=False, xss_safe=False, methods=None):
+    def decorate(fn):
+        return fn
+
+    # Used both as @frappe.whitelist and as @frappe.whitelist(...)
+    if callable(allow_guest):
+        return allow_guest
+    return decorate
+
+
+# Messages and errors
+
+def msgprint(msg, title=None, raise_exception=0, indicator=None, alert=False, **kwargs):
+    local.message_log.append(_dict(message=msg, title=title, indicator=indicator))
+    if raise_exception:
+        exc = raise_exception if isinstance(raise_exception, type) else ValidationError
+        raise exc(msg)
+
+
+def throw(msg, exc=ValidationError, title=None, is_minimizable=False, wide=False, as_list=False):
+    msgprint(msg, title=title, raise_exception=exc)
+
+
+def log_error(title=None, message=None, reference_doctype=None, reference_name=None):
+    # Older code passes the traceback first and the title second
+    if message and title and "\n" in str(title) and "\n" not in str(message):
+        title, message = message, title
+    entry = _dict(
+        doctype="Error Log", title=title, method=title, error=message or get_traceback(),
+        reference_doctype=reference_doctype, reference_name=reference_name,
+    )
+    error_log.append(entry)
+    return entry
+
+
+def redirect_to_message(title, html, http_status_code=None, context=None, indicator_color=None):
+    return f"/message?title={title}"
+
+
+def publish_realtime(event=None, message=None, room=None, user=None, doctype=None, docname=None, after_commit=False, **kwargs):
+    realtime.append(_dict(event=event, message=message, room=room, user=user, doctype=doctype, docname=docname))
+
+
+def enqueue(method, queue="default", timeout=None, event=None, is_async=True, job_name=None, now=False,
+            enqueue_after_commit=False, job_id=None, deduplicate=False, at_front=False, **kwargs):
+    """Recorded in ``jobs``; run at once with ``now=True`` or ``is_async=False``"""
+    job = _dict(method=method, queue=queue, timeout=timeout, job_id=job_id, kwargs=kwargs)
+    jobs.append(job)
+    if now or not is_async:
+        target = get_attr(method) if isinstance(method, str) else method
+        return target(**kwargs)
+    return job
+
+
+def run_jobs():
+    """Run and clear the jobs queued so far, including those they queue"""
+    count = 0
+    while jobs:
+        job = jobs.pop(0)
+        target = get_attr(job.method) if isinstance(job.method, str) else job.method
+        target(**job.kwargs)
+        count += 1
+    return count
+
+
+# Documents
+
+def _stored(doctype):
+    return _docs.setdefault(doctype, OrderedDict())
+
+
+def _fields(doc):
+    return {key: value for key, value in doc.__dict__.items() if not key.startswith("_") and key != "flags"}
+
+
+class Document:
+    """Document kept in memory; field values are plain attributes"""
+
+    def __init__(self, *args, **kwargs):
+        self.flags = _dict()
+        if args and isinstance(args[0], str):
+            doctype = args[0]
+            name = args[1] if len(args) > 1 and args[1] is not None else doctype
+            values = _stored(doctype).get(name)
+            if values is None:
+                raise DoesNotExistError(f"{doctype} {name} not found")
+            self.__dict__.update(values)
+        else:
+            values = args[0] if args else kwargs
+            self.__dict__.update(values or {})
+
+    def __getattr__(self, key):
+        # Fields that were never set read as None, like fields of the meta
+        if key.startswith("__"):
+            raise AttributeError(key)
+        return None
+
+    def get(self, key, default=None):
+        return self.__dict__.get(key, default)
+
+    def set(self, key, value):
+        setattr(self, key, value)
+
+    def update(self, values):
+        self.__dict__.update(values)
+        return self
+
+    def as_dict(self, **kwargs):
+        return _dict(_fields(self))
+
+    def is_new(self):
+        return not self.name or self.name not in _stored(self.doctype)
+
+    def run_method(self, method, *args, **kwargs):
+        fn = getattr(self, method, None)
+        if callable(fn):
+            return fn(*args, **kwargs)
+        return None
+
+    def _set_defaults(self):
+        timestamp = now_datetime()
+        if not self.name:
+            self.name = self.doctype if self.doctype in singles else generate_hash(length=10)
+        self.creation = self.creation or timestamp
+        self.modified = self.modified or timestamp
+        self.owner = self.owner or session.user
+        self.modified_by = session.user
+        self.docstatus = self.docstatus or 0
+
+    def db_insert(self, ignore_if_duplicate=False):
+        """Store the row without running controller methods"""
+        self._set_defaults()
+        with _lock:
+            rows = _stored(self.doctype)
+            if self.name in rows:
+                if ignore_if_duplicate:
+                    return
+                raise DuplicateEntryError(self.doctype, self.name)
+            rows[self.name] = _fields(self)
+
+    def db_update(self):
+        with _lock:
+            _stored(self.doctype)[self.name] = _fields(self)
+
+    def insert(self, ignore_permissions=None, ignore_links=None, ignore_if_duplicate=False,
+               ignore_mandatory=None, set_name=None, set_child_names=True):
+        if set_name:
+            self.name = set_name
+        self.flags.ignore_permissions = ignore_permissions
+        self.flags.ignore_mandatory = ignore_mandatory
+        self.run_method("before_insert")
+        self.run_method("validate")
+        self.db_insert(ignore_if_duplicate=ignore_if_duplicate)
+        self.run_method("after_insert")
+        self.run_method("on_update")
+        return self
+
+    def save(self, ignore_permissions=None, ignore_version=None):
+        if self.is_new():
+            return self.insert(ignore_permissions=ignore_permissions)
+        self.flags.ignore_permissions = ignore_permissions
+        self.run_method("validate")
+        self.modified = now_datetime()
+        self.db_update()
+        self.run_method("on_update")
+        return self
+
+    def delete(self, ignore_permissions=False, force=False, **kwargs):
+        delete_doc(self.doctype, self.name)
+
+    def reload(self):
+        self.__dict__.update(_stored(self.doctype)[self.name])
+        return self
+
+    def db_set(self, fieldname, value=None, update_modified=True, notify=False, commit=False):
+        values = fieldname if isinstance(fieldname, dict) else {fieldname: value}
+        if update_modified:
+            values = {**values, "modified": now_datetime(), "modified_by": session.user}
+        self.__dict__.update(values)
+        with _lock:
+            row = _stored(self.doctype).get(self.name)
+            if row is not None:
+                row.update(values)
+
+    def get_password(self, fieldname="password", raise_exception=True):
+        value = _passwords.get((self.doctype, self.name, fieldname)) or self.__dict__.get(fieldname)
+        if not value and raise_exception:
+            raise AuthenticationError(f"Password not found for {self.doctype} {self.name} {fieldname}")
+        return value
+
+
+def _controller(doctype):
+    return controllers.get(doctype, Document)
+
+
+def get_doc(*args, **kwargs):
+    if args and isinstance(args[0], dict):
+        return _controller(args[0].get("doctype"))(args[0])
+    if kwargs and "doctype" in kwargs and not args:
+        return _controller(kwargs["doctype"])(kwargs)
+    doctype = args[0]
+    return _controller(doctype)(*args)
+
+
+def get_cached_doc(*args, **kwargs):
+    return get_doc(*args, **kwargs)
+
+
+def new_doc(doctype, parent_doc=None, parentfield=None, as_dict=False):
+    doc = _controller(doctype)({"doctype": doctype})
+    return doc.as_dict() if as_dict else doc
+
+
+def delete_doc(doctype=None, name=None, force=0, ignore_permissions=False, **kwargs):
+    with _lock:
+        if _stored(doctype).pop(name, None) is None and not force:
+            raise DoesNotExistError(f"{doctype} {name} not found")
+
+
+def clear_document_cache(doctype=None, name=None):
+    pass
+
+
+def set_password(doctype, name, fieldname, value):
+    """Store a password field, as saved from the Password control"""
+    _passwords[(doctype, name, fieldname)] = value
+
+
+def create_request_log(data, integration_type=None, service_name=None, name=None, error=None,
+                       request_headers=None, output=None, **kwargs):
+    """``frappe.integrations.utils.create_request_log``, which commits like Frappe's"""
+    # Through the installed module, as Frappe's own helper does, so patches and counting apply
+    frappe = sys.modules.get("frappe") or sys.modules[__name__]
+    doc = frappe.get_doc({
+        "doctype": "Integration Request",
+        "integration_request_service": service_name,
+        "integration_type": integration_type,
+        "request_headers": json.dumps(request_headers, default=str) if request_headers else None,
+        "data": data if isinstance(data, str) else json.dumps(data, default=str),
+        "output": output if output is None or isinstance(output, str) else json.dumps(output, default=str),
+        "error": error if error is None or isinstance(error, str) else json.dumps(error, default=str),
+        "status": "Queued",
+        **({"name": name} if name else {}),
+        **kwargs,
+    }).insert(ignore_permissions=True)
+    frappe.db.commit()
+    return doc
+
+
+# Queries
+
+_OPERATORS = {
+    "=": lambda value, expected: value == expected,
+    "!=": lambda value, expected: value != expected,
+    "<": lambda value, expected: value is not None and value < expected,
+    "<=": lambda value, expected: value is not None and value <= expected,
+    ">": lambda value, expected: value is not None and value > expected,
+    ">=": lambda value, expected: value is not None and value >= expected,
+    "in": lambda value, expected: value in expected,
+    "not in": lambda value, expected: value not in expected,
+    "like": lambda value, expected: fnmatch.fnmatchcase(str(value or ""), expected.replace("%", "*")),
+    "not like": lambda value, expected: not fnmatch.fnmatchcase(str(value or ""), expected.replace("%", "*")),
+    "is": lambda value, expected: (value not in (None, "")) == (expected == "set"),
+}
+
+
+def _comparable(value, expected):
+    # Dates are compared as datetimes, whatever type they were given as
+    if isinstance(value, (datetime.date, str)) and isinstance(expected, (datetime.date, str)) and (
+        isinstance(value, datetime.date) or isinstance(expected, datetime.date)
+    ):
+        try:
+            return get_datetime(value), get_datetime(expected)
+        except ValueError:
+            pass
+    return value, expected
+
+
+def _conditions(filters):
+    if not filters:
+        return []
+    if isinstance(filters, str):
+        return [("name", "=", filters)]
+    if isinstance(filters, dict):
+        items = filters.items()
+    else:
+        items = [(condition[-3], (condition[-2], condition[-1])) for condition in filters]
+    conditions = []
+    for field, expected in items:
+        if isinstance(expected, (list, tuple)) and len(expected) == 2 and str(expected[0]).lower() in _OPERATORS:
+            operator, expected = str(expected[0]).lower(), expected[1]
+        else:
+            operator = "="
+        if operator in ("in", "not in") and isinstance(expected, str):
+            expected = [part.strip() for part in expected.split(",")]
+        conditions.append((field, operator, expected))
+    return conditions
+
+
+def _matches(row, conditions):
+    for field, operator, expected in conditions:
+        value = row.get(field)
+        if operator not in ("in", "not in", "is", "like", "not like"):
+            value, expected = _comparable(value, expected)
+        if not _OPERATORS[operator](value, expected):
+            return False
+    return True
+
+
+def _select(row, fields):
+    if not fields or fields == ["*"] or fields == "*":
+        return _dict(row)
+    selected = _dict()
+    for field in [fields] if isinstance(fields, str) else fields:
+        source, _as, alias = field.partition(" as ")
+        source = source.strip().strip("`")
+        if source == "*":
+            selected.update(row)
+        else:
+            selected[alias.strip() or source] = row.get(source)
+    return selected
+
+
+def _sort_key(value):
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = get_datetime(value)
+    return (value is not None, value if value is not None else 0)
+
+
+def get_all(doctype, filters=None, fields=None, order_by=None, limit=None, limit_start=0,
+            limit_page_length=None, start=0, pluck=None, or_filters=None, **kwargs):
+    with _lock:
+        rows = [row for row in _stored(doctype).values() if _matches(row, _conditions(filters))]
+    if or_filters:
+        alternatives = [[condition] for condition in _conditions(or_filters)]
+        rows = [row for row in rows if any(_matches(row, condition) for condition in alternatives)]
+
+    for clause in reversed([part.strip() for part in (order_by or "creation desc").split(",")]):
+        field, _space, direction = clause.partition(" ")
+        rows.sort(key=lambda row: _sort_key(row.get(field.strip("`"))), reverse=direction.strip().lower() == "desc")
+
+    first = start or limit_start or 0
+    count = limit or limit_page_length
+    rows = rows[first:first + count] if count else rows[first:]
+    if pluck:
+        return [row.get(pluck) for row in rows]
+    return [_select(row, fields or ["name"]) for row in rows]
+
+
+get_list = get_all
+
+
+def get_value(doctype, filters=None, fieldname="name", as_dict=False, **kwargs):
+    return db.get_value(doctype, filters, fieldname, as_dict=as_dict, **kwargs)
+
+
+_SQL_UPDATE = re.compile(
+    r"^\s*update\s+`tab(?P<doctype>[^`]+)`\s+set\s+(?P<fields>.+?)\s+where\s+name\s*(?P<op>=|in)\s*%s\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class Database:
+    """``frappe.db`` over the in-memory rows"""
+
+    def __init__(self):
+        self.queries = []
+        self.commits = 0
+
+    def _names(self, doctype, filters):
+        if filters is None:
+            return [doctype] if doctype in _stored(doctype) else list(_stored(doctype))
+        if isinstance(filters, str):
+            return [filters] if filters in _stored(doctype) else []
+        return get_all(doctype, filters=filters, pluck="name", order_by="creation asc")
+
+    def get_value(self, doctype, filters=None, fieldname="name", ignore=None, as_dict=False,
+                  order_by=None, cache=False, for_update=False, **kwargs):
+        names = self._names(doctype, filters)
+        if not names:
+            return None
+        row = _stored(doctype)[names[0]]
+        if as_dict:
+            return _select(row, fieldname if isinstance(fieldname, (list, tuple)) else [fieldname])
+        if isinstance(fieldname, (list, tuple)):
+            return tuple(row.get(field) for field in fieldname)
+        return row.get(fieldname)
+
+    def get_single_value(self, doctype, fieldname, cache=True):
+        return self.get_value(doctype, doctype, fieldname)
+
+    def set_value(self, doctype, name, fieldname, value=None, update_modified=True, **kwargs):
+        values = dict(fieldname) if isinstance(fieldname, dict) else {fieldname: value}
+        if update_modified:
+            values.update(modified=now_datetime(), modified_by=session.user)
+        with _lock:
+            for docname in self._names(doctype, name):
+                _stored(doctype)[docname].update(values)
+
+    def set_single_value(self, doctype, fieldname, value=None, **kwargs):
+        self.set_value(doctype, doctype, fieldname, value, **kwargs)
+
+    def exists(self, doctype, filters=None, cache=False):
+        if isinstance(filters, dict) and not filters:
+            filters = None
+        names = self._names(doctype, filters if filters is not None else doctype)
+        return names[0] if names else None
+
+    def count(self, doctype, filters=None, **kwargs):
+        return len(get_all(doctype, filters=filters, pluck="name"))
+
+    def delete(self, doctype, filters=None):
+        with _lock:
+            for name in self._names(doctype, filters if filters is not None else {}):
+                _stored(doctype).pop(name, None)
+
+    def bulk_insert(self, doctype, fields, values, ignore_duplicates=False, chunk_size=10000):
+        with _lock:
+            rows = _stored(doctype)
+            for value in values:
+                row = dict(zip(fields, value), doctype=doctype)
+                if row["name"] in rows:
+                    if ignore_duplicates:
+                        continue
+                    raise DuplicateEntryError(doctype, row["name"])
+                rows[row["name"]] = row
+
+    def sql(self, query, values=(), as_dict=False, as_list=False, **kwargs):
+        self.queries.append((query, values))
+        match = _SQL_UPDATE.match(query)
+        if not match:
+            return []
+        fields = [part.split("=")[0].strip().strip("`") for part in match.group("fields").split(",")]
+        changes = dict(zip(fields, values[:len(fields)]))
+        names = values[len(fields)]
+        names = [names] if match.group("op") == "=" else list(names)
+        with _lock:
+            for name in names:
+                row = _stored(match.group("doctype")).get(name)
+                if row is not None:
+                    row.update(changes)
+        return []
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self, save_point=None):
+        pass
+
+    def savepoint(self, save_point):
+        pass
+
+    def release_savepoint(self, save_point):
+        pass
+
+    def add_index(self, doctype, fields, index_name=None):
+        pass
+
+    def escape(self, value, percent=True):
+        return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+db = Database()
+
+
+# Cache
+
+class _Script:
+    def __init__(self, cache, source):
+        self.cache = cache
+        self.source = source
+
+    def __call__(self, keys=(), args=(), client=None):
+        handler = self.cache.scripts.get(self.source)
+        if handler is None:
+            raise NotImplementedError("Lua scripts are not run by the fake: register a Python version in cache.scripts")
+        return handler(self.cache, list(keys), list(args))
+
+
+class Cache:
+    """Redis-like cache; ``*_value`` and hash methods prefix keys like Frappe's wrapper"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.scripts = {}
+        self._lock = threading.RLock()
+
+    def make_key(self, key, user=None, shared=False):
+        if isinstance(key, bytes):
+            return key
+        return f"{local.site}|{key}"
+
+    def _get(self, key):
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return self.data.get(key)
+
+    def _expire(self, key, seconds):
+        if seconds:
+            self.expiry[key] = time.monotonic() + seconds
+        else:
+            self.expiry.pop(key, None)
+
+    # Frappe's wrapper
+    def set_value(self, key, val, user=None, expires_in_sec=None, shared=False):
+        with self._lock:
+            key = self.make_key(key)
+            self.data[key] = val
+            self._expire(key, expires_in_sec)
+
+    def get_value(self, key, generator=None, user=None, expires=False, shared=False):
+        with self._lock:
+            value = self._get(self.make_key(key))
+            if value is None and generator:
+                value = generator()
+                self.set_value(key, value)
+            return value
+
+    def delete_value(self, keys, user=None, make_keys=True, shared=False):
+        for key in [keys] if isinstance(keys, (str, bytes)) else keys:
+            self.delete(self.make_key(key) if make_keys else key)
+
+    def delete_key(self, key):
+        self.delete_value(key)
+
+    def hset(self, name, key, value, shared=False):
+        with self._lock:
+            self.data.setdefault(self.make_key(name), {})[key] = value
+
+    def hget(self, name, key, generator=None, shared=False):
+        with self._lock:
+            value = (self._get(self.make_key(name)) or {}).get(key)
+            if value is None and generator:
+                value = generator()
+                self.hset(name, key, value)
+            return value
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._get(self.make_key(name)) or {})
+
+    def hdel(self, name, key, shared=False):
+        with self._lock:
+            entries = self._get(self.make_key(name)) or {}
+            for field in [key] if isinstance(key, (str, bytes)) else key:
+                entries.pop(field, None)
+
+    def hkeys(self, name):
+        return list(self.hgetall(name))
+
+    # Plain Redis commands, keys used as given
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False, **kwargs):
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return None
+            if xx and self._get(name) is None:
+                return None
+            self.data[name] = value
+            self._expire(name, ex or (px / 1000 if px else None))
+            return True
+
+    def get(self, name):
+        with self._lock:
+            return self._get(name)
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                removed += self.data.pop(name, None) is not None
+                self.expiry.pop(name, None)
+            return removed
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(self._get(name) is not None for name in names)
+
+    def expire(self, name, time_seconds):
+        with self._lock:
+            self._expire(name, time_seconds)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._get(name) or 0) + amount
+            self.data[name] = value
+            return value
+
+    def zadd(self, name, mapping, nx=False, xx=False, **kwargs):
+        with self._lock:
+            scores = self.data.setdefault(name, {})
+            added = 0
+            for member, score in mapping.items():
+                if (nx and member in scores) or (xx and member not in scores):
+                    continue
+                added += member not in scores
+                scores[member] = float(score)
+            return added
+
+    def zrem(self, name, *members):
+        with self._lock:
+            scores = self._get(name) or {}
+            return sum(scores.pop(member, None) is not None for member in members)
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._get(name) or {})
+
+    def zscore(self, name, member):
+        with self._lock:
+            return (self._get(name) or {}).get(member)
+
+    def zrangebyscore(self, name, min, max, start=None, num=None, withscores=False):
+        low = float("-inf") if min == "-inf" else float(min)
+        high = float("inf") if max == "+inf" else float(max)
+        with self._lock:
+            entries = sorted(
+                ((member, score) for member, score in (self._get(name) or {}).items() if low <= score <= high),
+                key=lambda entry: (entry[1], entry[0]),
+            )
+        if start is not None:
+            entries = entries[start:start + num]
+        return entries if withscores else [member for member, _score in entries]
+
+    def lpush(self, name, *values):
+        with self._lock:
+            items = self.data.setdefault(name, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def rpush(self, name, *values):
+        with self._lock:
+            items = self.data.setdefault(name, [])
+            items.extend(values)
+            return len(items)
+
+    def lrange(self, name, start, end):
+        with self._lock:
+            items = self._get(name) or []
+            return list(items[start:None if end == -1 else end + 1])
+
+    def ltrim(self, name, start, end):
+        with self._lock:
+            self.data[name] = self.lrange(name, start, end)
+
+    def llen(self, name):
+        with self._lock:
+            return len(self._get(name) or [])
+
+    def register_script(self, script):
+        return _Script(self, script)
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def flushall(self):
+        with self._lock:
+            self.data.clear()
+            self.expiry.clear()
+
+
+class _Pipeline:
+    """Commands run one by one when ``execute`` is called"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [getattr(self.cache, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_cache = Cache()
+
+
+def cache():
+    return _cache
+
+
+# Installation
+
+FRAPPE = (
+    "_", "_dict", "ValidationError", "DoesNotExistError", "DuplicateEntryError", "AuthenticationError",
+    "Redirect", "local", "flags", "session", "form_dict", "request", "throw", "msgprint", "log_error",
+    "get_traceback", "redirect_to_message", "publish_realtime", "enqueue", "whitelist", "generate_hash",
+    "safe_decode", "as_json", "get_site_path", "get_attr", "get_hooks", "get_installed_apps", "logger",
+    "get_doc", "get_cached_doc", "new_doc", "delete_doc", "clear_document_cache", "get_all", "get_list",
+    "get_value", "db", "cache",
+)
+UTILS = (
+    "cstr", "flt", "cint", "now", "now_datetime", "get_datetime", "getdate", "add_to_date", "add_days",
+    "get_url", "generate_hash",
+)
+
+
+def _module(name, names=(), **attributes):
+    module = types.ModuleType(name)
+    current = sys.modules[__name__]
+    for attribute in names:
+        setattr(module, attribute, getattr(current, attribute))
+    for attribute, value in attributes.items():
+        setattr(module, attribute, value)
+    module.__path__ = []
+    module.__fake__ = True
+    return module
+
+
+def install():
+    """Register the fake as ``frappe`` unless it is already imported. Returns the ``frappe`` module"""
+    existing = sys.modules.get("frappe")
+    if existing is not None:
+        return existing
+
+    utils = _module("frappe.utils", UTILS)
+    document = _module("frappe.model.document", Document=Document)
+    model = _module("frappe.model", document=document)
+    integration_utils = _module("frappe.integrations.utils", create_request_log=create_request_log)
+    integrations = _module("frappe.integrations", utils=integration_utils)
+    frappe = _module("frappe", FRAPPE, utils=utils, model=model, integrations=integrations)
+    sys.modules.update({
+        "frappe": frappe,
+        "frappe.utils": utils,
+        "frappe.model": model,
+        "frappe.model.document": document,
+        "frappe.integrations": integrations,
+        "frappe.integrations.utils": integration_utils,
+    })
+    return frappe
+
+
+def is_installed() -> bool:
+    return bool(getattr(sys.modules.get("frappe"), "__fake__", False))
+
+
+def reset():
+    """Forget all documents, passwords, cache entries and recorded calls"""
+    with _lock:
+        _docs.clear()
+        _passwords.clear()
+    _cache.flushall()
+    _cache.scripts.clear()
+    db.queries.clear()
+    db.commits = 0
+    for recorded in (error_log, jobs, realtime, local.message_log):
+        recorded.clear()
+    for values in (flags, local.flags, form_dict):
+        values.clear()
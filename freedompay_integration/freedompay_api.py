@@ -6,56 +6,48 @@ from .connection import FreedomPayConnection
 from .urls import FreedomPayUrls
 from .response_codes import SUCCESS
 from .response_feedback import ResponseFeedBack
+from .results import PaymentResult, StatusResult, PayoutResult
+from .settings_cache import get_settings, get_secret
+from .order_index import index_order
+from .poller import first_check_at, schedule_payment
+from . import ledger
+from .profiler import profiled
+from .schemas import PAYMENT, PAYOUT, STATUS
 
 
 class FreedomPayAPI:
-    def __init__(self) -> None:
-        """Class for FreedomPay APIs"""
-        self.connection = FreedomPayConnection()
-        self.settings = frappe.get_doc("FreedomPay Settings")
+    def __init__(self, keep_raw: bool = True, transport=None) -> None:
+        """Class for FreedomPay APIs
+
+        :param keep_raw: keep the full response body on results and feedback.
+            Bulk jobs holding many results pass ``False`` to keep only the
+            fields declared on the result types.
+        :param transport: HTTP transport, defaults to the one selected in
+            FreedomPay Settings; a cassette transport replays recorded traffic.
+        """
+        self.keep_raw = keep_raw
+        self.transport = transport
+        self.connection = FreedomPayConnection(transport=transport)
+        self.settings = get_settings()
         self.urls = FreedomPayUrls()
 
-    def create_payment(self, data: dict) -> tuple[str, dict | None, ResponseFeedBack]:
+    @profiled("create_payment")
+    def create_payment(self, data: dict) -> tuple[str, PaymentResult | dict, ResponseFeedBack]:
         """
         Creates a FreedomPay Payment
         :param data: Dictionary containing payment details
-        :return: Tuple[str, Union[Dict, None], ResponseFeedBack]
+        :return: Tuple[str, Union[PaymentResult, Dict], ResponseFeedBack]
         """
-        # Prepare payment data according to FreedomPay API
-        payment_data = {
-            'pg_merchant_id': self.settings.merchant_id,
-            'pg_amount': data.get('amount'),
-            'pg_currency': data.get('currency', 'UZS'),
-            'pg_description': data.get('description', ''),
-        }
-
-        # Add URL fields with validation
-        result_url = self.settings.result_url or data.get('result_url')
-        success_url = self.settings.success_url or data.get('success_url')
-        failure_url = self.settings.failure_url or data.get('failure_url')
-        check_url = self.settings.check_url or data.get('check_url')
-
-        if not result_url:
-            frappe.throw("Result URL is required for FreedomPay payment. Please configure it in FreedomPay Settings or provide it in the payment data.")
-
-        payment_data['pg_result_url'] = result_url
-
-        if success_url:
-            payment_data['pg_success_url'] = success_url
-        if failure_url:
-            payment_data['pg_failure_url'] = failure_url
-        if check_url:
-            payment_data['pg_check_url'] = check_url
-
-        # Add optional fields
-        if data.get('order_id'):
-            payment_data['pg_order_id'] = data.get('order_id')
-        if data.get('user_id'):
-            payment_data['pg_user_id'] = data.get('user_id')
-        if data.get('email'):
-            payment_data['pg_user_email'] = data.get('email')
-        if data.get('phone'):
-            payment_data['pg_user_phone'] = data.get('phone')
+        payment_data = self.payment_payload(data)
+
+        # The check URL handler answers from this record instead of loading the order
+        if payment_data.get('pg_check_url') and payment_data.get('pg_order_id'):
+            index_order(
+                payment_data['pg_order_id'],
+                payment_data['pg_amount'],
+                payment_data['pg_currency'],
+                data.get('reference_doctype'),
+            )
 
         code, feedback = self.connection.post(
             url=self.urls.create_payment(), data=payment_data
@@ -64,84 +56,96 @@ class FreedomPayAPI:
         payment = frappe._dict()
 
         if code == SUCCESS:
-            payment = feedback.data
+            payment = self._result(PaymentResult, feedback)
             feedback.message = "Payment Created Successfully"
 
+        # Prefetched links are polled once a customer opens them
+        poll = code == SUCCESS and self.settings.get("poll_pending_payments", 1) and not data.get('prefetch')
+        # The ledger row keeps the polling schedule
+        ledger.record(
+            ledger.PAYMENT, payment_data, payment if code == SUCCESS else None,
+            error=None if code == SUCCESS else feedback.error,
+            reference_doctype=data.get('reference_doctype'),
+            integration_request=data.get('integration_request'),
+            next_poll_at=first_check_at() if poll else None,
+        )
+        if poll:
+            schedule_payment(payment.get("pg_payment_id"), persisted=True)
+
         return code, payment, feedback
 
-    def check_payment_status(self, payment_id: str) -> tuple[str, dict | None, ResponseFeedBack]:
+    def payment_payload(self, data: dict) -> dict:
+        """Unsigned init_payment.php payload; raises ValidationError for invalid data"""
+        # Settings take precedence over the URLs passed by the caller
+        return PAYMENT.build({
+            **data,
+            'merchant_id': self.settings.merchant_id,
+            'result_url': self.settings.result_url or data.get('result_url'),
+            'success_url': self.settings.success_url or data.get('success_url'),
+            'failure_url': self.settings.failure_url or data.get('failure_url'),
+            'check_url': self.settings.check_url or data.get('check_url'),
+        })
+
+    def check_payment_status(self, payment_id: str) -> tuple[str, StatusResult | None, ResponseFeedBack]:
         """Checks Payment Status by Payment ID
 
         Args:
             payment_id (str): FreedomPay Payment ID
 
         Returns:
-            Tuple[str, Union[Dict, None], ResponseFeedBack]
+            Tuple[str, Union[StatusResult, None], ResponseFeedBack]
         """
-        status_data = {
-            'pg_merchant_id': self.settings.merchant_id,
-            'pg_payment_id': payment_id,
-        }
+        status_data = STATUS.build({
+            'merchant_id': self.settings.merchant_id,
+            'payment_id': payment_id,
+        })
 
         code, feedback = self.connection.post(
             url=self.urls.payment_status(), data=status_data
         )
         status = None
         if code == SUCCESS:
-            status = feedback.data
+            status = self._result(StatusResult, feedback)
             feedback.message = f"Payment status for {payment_id} retrieved successfully"
+            ledger.update_status(payment_id, status.get("pg_transaction_status"), checked=True)
         return code, status, feedback
 
-    def create_payout(self, data: dict) -> tuple[str, dict | None, ResponseFeedBack]:
+    @profiled("create_payout")
+    def create_payout(self, data: dict) -> tuple[str, PayoutResult | dict, ResponseFeedBack]:
         """
         Creates a FreedomPay Payout
         :param data: Dictionary containing payout details
-        :return: Tuple[str, Union[Dict, None], ResponseFeedBack]
+        :return: Tuple[str, Union[PayoutResult, Dict], ResponseFeedBack]
         """
-        payout_data = {
-            'pg_merchant_id': self.settings.merchant_id,
-            'pg_amount': data.get('amount'),
-            'pg_currency': data.get('currency', 'UZS'),
-            'pg_card_number': data.get('card_number'),
-            'pg_cardholder_name': data.get('cardholder_name'),
-            'pg_post_link': self.settings.post_link or data.get('post_link'),
-        }
+        payout_data = PAYOUT.build({
+            **data,
+            'merchant_id': self.settings.merchant_id,
+            'post_link': self.settings.post_link or data.get('post_link'),
+        })
 
         # Use payout secret key if available
-        if self.settings.get_password('secret_key_payout'):
-            # Create a temporary settings object with payout key
-            payout_key = self.settings.get_password('secret_key_payout')
-
-            # Create a mock settings object that returns payout key for get_password('secret_key')
-            class PayoutSettings:
-                def __init__(self, original_settings, payout_key):
-                    self.original_settings = original_settings
-                    self.payout_key = payout_key
-
-                def get_password(self, field_name):
-                    if field_name == 'secret_key':
-                        return self.payout_key
-                    return self.original_settings.get_password(field_name)
-
-                def __getattr__(self, name):
-                    return getattr(self.original_settings, name)
-
-            # Create temporary connection with payout settings
-            temp_connection = FreedomPayConnection()
-            temp_connection.settings = PayoutSettings(self.settings, payout_key)
-
-            code, feedback = temp_connection.post(
-                url=self.urls.create_payout(), data=payout_data
-            )
+        if get_secret(self.settings, 'secret_key_payout'):
+            connection = FreedomPayConnection(secret_field='secret_key_payout', transport=self.transport)
         else:
-            code, feedback = self.connection.post(
-                url=self.urls.create_payout(), data=payout_data
-            )
+            connection = self.connection
+
+        code, feedback = connection.post(
+            url=self.urls.create_payout(), data=payout_data
+        )
 
         payout = frappe._dict()
 
         if code == SUCCESS:
-            payout = feedback.data
+            payout = self._result(PayoutResult, feedback)
             feedback.message = "Payout Created Successfully"
+            # Failed attempts stay in the payout outbox, which retries them
+            ledger.record(ledger.PAYOUT, payout_data, payout, reference_doctype=data.get('reference_doctype'))
 
         return code, payout, feedback
+
+    def _result(self, result_type, feedback):
+        """Wrap a successful response, dropping the raw body unless keep_raw is set"""
+        result = result_type.from_feedback(feedback, keep_raw=self.keep_raw)
+        if not self.keep_raw and hasattr(feedback, "drop_body"):
+            feedback.drop_body()
+        return result
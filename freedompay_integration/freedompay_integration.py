@@ -6,6 +6,9 @@ from frappe import _
 from frappe.integrations.utils import create_request_log
 
 from .freedompay_api import FreedomPayAPI
+from .gateway_errors import log_gateway_error
+from .payout_outbox import create_payout
+from .prefetch import take_link
 
 
 def create_freedompay_payment(gateway_controller, data):
@@ -16,11 +19,26 @@ def create_freedompay_payment(gateway_controller, data):
     settings.integration_request = create_request_log(settings.data, "Host", "FreedomPay")
 
     try:
+        # A link prefetched when the document was submitted makes checkout a cache lookup
+        redirect_url = take_link(
+            settings.data.reference_doctype,
+            settings.data.reference_docname,
+            settings.data.amount,
+            settings.data.currency,
+        )
+        if redirect_url:
+            settings.integration_request.db_set("status", "Completed", update_modified=False)
+            return {
+                "redirect_to": redirect_url,
+                "status": "Completed",
+            }
+
         payment_data = {
             "amount": settings.data.amount,
             "currency": settings.data.currency or "UZS",
             "description": settings.data.description or "",
             "order_id": settings.data.reference_docname,
+            "reference_doctype": settings.data.reference_doctype,
             "result_url": settings.data.result_url,
             "success_url": settings.data.success_url,
             "failure_url": settings.data.failure_url,
@@ -28,6 +46,7 @@ def create_freedompay_payment(gateway_controller, data):
             "user_id": settings.data.payer_email,
             "email": settings.data.payer_email,
             "phone": settings.data.payer_phone,
+            "integration_request": settings.integration_request.name,
         }
 
         code, payment, feedback = api.create_payment(payment_data)
@@ -57,7 +76,7 @@ def create_freedompay_payment(gateway_controller, data):
                 }
         else:
             settings.integration_request.db_set("status", "Failed", update_modified=False)
-            frappe.log_error(f"FreedomPay Payment Failed: {feedback.error}")
+            log_gateway_error(f"FreedomPay Payment Failed: {feedback.error}", "init_payment.php", feedback.error)
             return {
                 "redirect_to": frappe.redirect_to_message(
                     _("Payment Failed"),
@@ -68,7 +87,7 @@ def create_freedompay_payment(gateway_controller, data):
 
     except Exception as e:
         settings.integration_request.db_set("status", "Failed", update_modified=False)
-        frappe.log_error(f"FreedomPay Payment Error: {str(e)}")
+        log_gateway_error(f"FreedomPay Payment Error: {str(e)}", "init_payment.php", e)
         return {
             "redirect_to": frappe.redirect_to_message(
                 _("Server Error"),
@@ -86,17 +105,15 @@ def verify_freedompay_payment(payment_id):
     if code == "SUCCESS":
         return status
     else:
-        frappe.log_error(f"FreedomPay Status Check Failed: {feedback.error}")
+        log_gateway_error(f"FreedomPay Status Check Failed: {feedback.error}", "get_status.php", feedback.error)
         return None
 
 
 def create_freedompay_payout(data):
-    """Create payout through FreedomPay"""
-    api = FreedomPayAPI()
-    code, payout, feedback = api.create_payout(data)
+    """Create payout through FreedomPay
 
-    if code == "SUCCESS":
-        return payout
-    else:
-        frappe.log_error(f"FreedomPay Payout Failed: {feedback.error}")
-        return None
+    The payout is written to the FreedomPay Payout Outbox and sent once the
+    current transaction commits, or later if the gateway cannot be reached.
+    Returns the outbox row.
+    """
+    return create_payout(data)
@@ -0,0 +1,120 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Rate-limited, aggregated Error Log entries for gateway failures.
+
+During a FreedomPay outage every payment, status check and payout fails the
+same way. ``log_gateway_error`` fingerprints a failure by site, endpoint and
+error class and counts it in process memory:
+
+- the first failure of a fingerprint is written to the Error Log right away;
+- further failures within ``WINDOW`` seconds are only counted, keeping up to
+  ``SAMPLE_SIZE`` full examples;
+- once the window is over, one summary with the count and the samples is
+  written, on the next failure or at the end of the next request or job
+  (``flush_due``).
+
+So an incident costs two Error Log rows per fingerprint per worker per window
+instead of one per failed call.
+"""
+
+import re
+import threading
+import time
+
+import frappe
+
+from .signature import script_name_from_url
+
+WINDOW = 60
+SAMPLE_SIZE = 5
+MAX_SAMPLE_LENGTH = 2000
+
+# Ids and amounts vary between otherwise identical errors; short numbers like
+# HTTP status codes are kept
+_VARIABLE = re.compile(r"[0-9a-fA-F]{8,}|\d{4,}")
+
+
+class _Bucket:
+    __slots__ = ("title", "started", "count", "samples")
+
+    def __init__(self, title):
+        self.title = title
+        self.started = time.time()
+        self.count = 0
+        self.samples = []
+
+
+class ErrorAggregator:
+    def __init__(self, window=WINDOW, sample_size=SAMPLE_SIZE):
+        self.window = window
+        self.sample_size = sample_size
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def record(self, fingerprint, title, sample) -> bool:
+        """Count a failure. Returns True if it is the first of its window and should be written"""
+        with self._lock:
+            bucket = self._buckets.get(fingerprint)
+            if bucket is None:
+                self._buckets[fingerprint] = _Bucket(title)
+                return True
+            bucket.count += 1
+            if len(bucket.samples) < self.sample_size:
+                bucket.samples.append(sample[:MAX_SAMPLE_LENGTH])
+            return False
+
+    def due(self, site=None, now=None) -> list:
+        """Remove and return (fingerprint, bucket) pairs whose window is over"""
+        now = now or time.time()
+        with self._lock:
+            expired = [
+                fingerprint for fingerprint, bucket in self._buckets.items()
+                if now - bucket.started >= self.window and (site is None or fingerprint[0] == site)
+            ]
+            return [(fingerprint, self._buckets.pop(fingerprint)) for fingerprint in expired]
+
+
+aggregator = ErrorAggregator()
+
+
+def error_class(error) -> str:
+    """Class of an exception, or the message with numbers and ids masked"""
+    if isinstance(error, BaseException):
+        return type(error).__name__
+    return _VARIABLE.sub("#", str(error or "Unknown error"))[:100]
+
+
+def log_gateway_error(message, url_or_endpoint=None, error=None, title=None):
+    """Log a gateway failure through the aggregator.
+
+    ``error`` (an exception or error text) decides the error class; without it
+    the message is used.
+    """
+    site = getattr(frappe.local, "site", None)
+    endpoint = script_name_from_url(url_or_endpoint) if url_or_endpoint else "unknown"
+    fingerprint = (site, endpoint, error_class(error if error is not None else message))
+    title = title or f"FreedomPay {endpoint}: {fingerprint[2]}"
+
+    flush_due()
+    if aggregator.record(fingerprint, title, str(message)):
+        frappe.log_error(title=title[:140], message=str(message))
+
+
+def flush_due():
+    """Write the summaries of this site whose window is over"""
+    site = getattr(frappe.local, "site", None)
+    for fingerprint, bucket in aggregator.due(site):
+        if not bucket.count:
+            continue
+        window = time.time() - bucket.started
+        samples = "\n\n---\n\n".join(bucket.samples)
+        try:
+            frappe.log_error(
+                title=f"{bucket.title[:120]} (x{bucket.count})",
+                message=f"{bucket.count} more failures in {window:.0f} s after the first one.\n\n"
+                f"Samples ({len(bucket.samples)}):\n\n{samples}",
+            )
+        except Exception:
+            # Never let logging fail the request that happens to flush it
+            pass
@@ -63,6 +63,24 @@ after_install = "freedompay_integration.install.after_install"
 # before_uninstall = "freedompay_integration.uninstall.before_uninstall"
 # after_uninstall = "freedompay_integration.uninstall.after_uninstall"
 
+# Request / Job Hooks
+# -------------------
+
+# Preload settings, secrets and gateway connections once per worker
+before_request = ["freedompay_integration.warmup.ensure_warm"]
+before_job = ["freedompay_integration.warmup.ensure_warm"]
+
+# Write the aggregated gateway error summaries that are due and publish
+# the adaptive concurrency metrics
+after_request = [
+    "freedompay_integration.gateway_errors.flush_due",
+    "freedompay_integration.concurrency.publish_metrics",
+]
+after_job = [
+    "freedompay_integration.gateway_errors.flush_due",
+    "freedompay_integration.concurrency.publish_metrics",
+]
+
 # Desk Notifications
 # ------------------
 # See frappe.core.notifications.get_notification_config
@@ -96,29 +114,46 @@ after_install = "freedompay_integration.install.after_install"
 doc_events = {
     "FreedomPay Settings": {
         "on_update": "freedompay_integration.doctype.freedompay_settings.freedompay_settings.on_update"
-    }
+    },
+    # Keep the check URL order index in sync with the documents being paid,
+    # and prefetch payment links when Prefetch Payment Links is on
+    "Payment Request": {
+        "on_submit": "freedompay_integration.prefetch.on_submit",
+        "on_update_after_submit": "freedompay_integration.order_index.sync_reference",
+        "on_cancel": [
+            "freedompay_integration.order_index.sync_reference",
+            "freedompay_integration.prefetch.on_cancel",
+        ],
+    },
+    "Sales Invoice": {
+        "on_submit": "freedompay_integration.prefetch.on_submit",
+        "on_update_after_submit": "freedompay_integration.order_index.sync_reference",
+        "on_cancel": [
+            "freedompay_integration.order_index.sync_reference",
+            "freedompay_integration.prefetch.on_cancel",
+        ],
+    },
+    "Payment Entry": {
+        "on_submit": "freedompay_integration.order_index.sync_payment_entry",
+        "on_cancel": "freedompay_integration.order_index.sync_payment_entry",
+    },
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-#	"all": [
-#		"freedompay_integration.tasks.all"
-#	],
-#	"daily": [
-#		"freedompay_integration.tasks.daily"
-#	],
-#	"hourly": [
-#		"freedompay_integration.tasks.hourly"
-#	],
-#	"weekly": [
-#		"freedompay_integration.tasks.weekly"
-#	]
-#	"monthly": [
-#		"freedompay_integration.tasks.monthly"
-#	]
-# }
+scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            "freedompay_integration.poller.poll_pending_payments",
+            "freedompay_integration.payout_outbox.drain_if_queued",
+            "freedompay_integration.authorization_outbox.drain_if_queued",
+        ]
+    },
+    "daily_long": [
+        "freedompay_integration.archive.archive_integration_requests",
+    ],
+}
 
 # Testing
 # -------
@@ -0,0 +1,153 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""FreedomPay Transaction ledger.
+
+One narrow row per payment or payout with typed, indexed columns, so lookups by
+payment id, order id, status or date are index lookups instead of LIKE scans
+over the JSON in Integration Request. Every payment created, payout sent,
+status check and result callback writes to it, and keeps the daily
+aggregates (see ``aggregates``) up to date.
+
+Ledger writes never break a payment: failures go to the Error Log.
+"""
+
+import frappe
+from frappe.utils import now_datetime
+
+from . import aggregates
+
+DOCTYPE = "FreedomPay Transaction"
+
+PAYMENT = "Payment"
+PAYOUT = "Payout"
+
+PENDING = "Pending"
+PAID = "Paid"
+FAILED = "Failed"
+REVOKED = "Revoked"
+REFUNDED = "Refunded"
+
+# pg_transaction_status / pg_status -> ledger status
+GATEWAY_STATES = {
+    "ok": PAID,
+    "success": PAID,
+    "failed": FAILED,
+    "incomplete": FAILED,
+    "error": FAILED,
+    "revoked": REVOKED,
+    "refunded": REFUNDED,
+    "partial": PENDING,
+    "pending": PENDING,
+}
+
+FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by",
+    "transaction_type", "status", "payment_id", "order_id", "merchant_id",
+    "amount", "currency", "reference_doctype", "reference_name",
+    "integration_request", "error",
+)
+
+
+def status_for(gateway_status) -> str | None:
+    return GATEWAY_STATES.get(str(gateway_status or "").lower())
+
+
+def record(transaction_type, payload, result=None, error=None, reference_doctype=None, integration_request=None,
+           next_poll_at=None):
+    """Insert the ledger row of a payment or payout sent to the gateway.
+
+    ``payload`` is the pg_* request, ``result`` the gateway response (None if
+    the call failed), ``next_poll_at`` the first status check of a pending
+    payment (see ``poller``).
+    """
+    try:
+        values = row(transaction_type, payload, result, error, reference_doctype, integration_request)
+        if values["status"] == PENDING and next_poll_at:
+            values["next_poll_at"] = next_poll_at
+        doc = frappe.get_doc(values)
+        doc.insert(ignore_permissions=True)
+        aggregates.add([doc])
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "FreedomPay ledger write failed")
+
+
+def bulk_record(rows):
+    """Insert many ledger rows (dicts built by ``row``) with one statement"""
+    if not rows:
+        return
+    now = now_datetime()
+    user = frappe.session.user
+    values = [
+        (frappe.generate_hash(length=10), now, now, user, user, *(entry.get(field) for field in FIELDS[5:]))
+        for entry in rows
+    ]
+    try:
+        frappe.db.bulk_insert(DOCTYPE, fields=FIELDS, values=values)
+        aggregates.add(rows)
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "FreedomPay ledger write failed")
+
+
+def row(transaction_type, payload, result=None, error=None, reference_doctype=None, integration_request=None):
+    """Ledger values for a request sent to the gateway"""
+    result = result or {}
+    if result and result.get("pg_status") != "error" and not error:
+        # An accepted payout needs no further checks, a payment waits for the customer
+        status = PAID if transaction_type == PAYOUT else PENDING
+    else:
+        status = FAILED
+        error = error or result.get("pg_error_description") or "Unknown error"
+
+    order_id = payload.get("pg_order_id")
+    return {
+        "doctype": DOCTYPE,
+        "transaction_type": transaction_type,
+        "status": status,
+        "payment_id": result.get("pg_payment_id"),
+        "order_id": order_id,
+        "merchant_id": payload.get("pg_merchant_id"),
+        "amount": payload.get("pg_amount"),
+        "currency": payload.get("pg_currency"),
+        "reference_doctype": reference_doctype if order_id else None,
+        "reference_name": order_id if reference_doctype else None,
+        "integration_request": integration_request,
+        "error": error,
+    }
+
+
+def update_status(payment_id, gateway_status, checked=False):
+    """Apply a gateway status reported by a status check or a callback"""
+    status = status_for(gateway_status)
+    if not payment_id or not status:
+        return
+    values = {"status": status, "gateway_status": gateway_status}
+    if status == PAID:
+        values["paid_at"] = now_datetime()
+    if checked:
+        values["last_checked_at"] = now_datetime()
+    if status != PENDING:
+        # Final: nothing left to poll
+        values["next_poll_at"] = None
+    try:
+        current = frappe.db.get_value(
+            DOCTYPE,
+            {"payment_id": payment_id},
+            ["name", "status", "paid_at", "creation", "amount", "currency", "merchant_id", "transaction_type"],
+            as_dict=True,
+        )
+        if current:
+            # paid_at keeps the first time the payment was seen paid
+            if current.paid_at:
+                values.pop("paid_at", None)
+            frappe.db.set_value(DOCTYPE, current.name, values)
+            if current.status != status:
+                aggregates.change(current, status, values.get("paid_at"))
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "FreedomPay ledger write failed")
+
+
+def get_transaction(payment_id):
+    """Ledger row of a payment id, or None"""
+    name = frappe.db.get_value(DOCTYPE, {"payment_id": payment_id})
+    return frappe.get_doc(DOCTYPE, name) if name else None
@@ -0,0 +1,159 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Compact per-order records for answering FreedomPay check requests.
+
+FreedomPay calls ``pg_check_url`` right before charging the customer. The
+answer depends only on whether the order is still payable and on the amount and
+currency, so those are kept in Redis as a small tuple per order:
+
+    (amount, currency, payable, reference_doctype)
+
+Records are written when a payment is created and kept in sync by document
+hooks on the reference documents. The cache is not the source of truth: a
+record that expired or was evicted is rebuilt from the FreedomPay Transaction
+ledger or the Integration Request of the order, and the reference document.
+"""
+
+import json
+
+import frappe
+from frappe.utils import flt
+
+from .ledger import DOCTYPE as LEDGER
+
+CACHE_KEY = "freedompay_order:{0}"
+# Orders are checked within minutes of creation; a month covers delayed payments
+RECORD_TTL = 30 * 24 * 60 * 60
+
+# Statuses of reference documents that can no longer be paid
+CLOSED_STATUSES = ("Paid", "Cancelled", "Completed", "Credit Note Issued", "Closed")
+
+
+def index_order(order_id, amount, currency, reference_doctype=None, payable=True):
+    """Store or replace the record of an order"""
+    if not order_id:
+        return
+    record = (str(amount), currency or "UZS", bool(payable), reference_doctype)
+    frappe.cache().set_value(CACHE_KEY.format(order_id), record, expires_in_sec=RECORD_TTL)
+
+
+def get_order(order_id):
+    """Return (amount, currency, payable, reference_doctype) or None"""
+    if not order_id:
+        return None
+    return frappe.cache().get_value(CACHE_KEY.format(order_id))
+
+
+def find_order(order_id):
+    """Like ``get_order``, rebuilding a missing record from the database"""
+    record = get_order(order_id)
+    if record is None and order_id:
+        record = load_order(order_id)
+        if record:
+            index_order(order_id, *record[:2], reference_doctype=record[3], payable=record[2])
+    return record
+
+
+def load_order(order_id, payment_id=None):
+    """Record of an order from the ledger or its Integration Request, or None if neither knows it.
+
+    With ``payment_id`` the ledger row of that payment is looked up first.
+    """
+    fields = ["amount", "currency", "reference_doctype"]
+    row = None
+    if payment_id:
+        row = frappe.db.get_value(LEDGER, {"payment_id": payment_id, "order_id": order_id}, fields, as_dict=True)
+    if not row:
+        row = frappe.db.get_value(
+            LEDGER,
+            {"order_id": order_id, "transaction_type": "Payment"},
+            fields,
+            as_dict=True,
+            order_by="creation desc",
+        )
+    if not row:
+        request = frappe.db.get_value(
+            "Integration Request",
+            {"integration_request_service": "FreedomPay", "reference_docname": order_id},
+            ["reference_doctype", "data"],
+            as_dict=True,
+            order_by="creation desc",
+        )
+        if not request:
+            return None
+        try:
+            data = json.loads(request.data or "{}")
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        row = frappe._dict(
+            amount=data.get("amount"),
+            currency=data.get("currency"),
+            reference_doctype=request.reference_doctype or data.get("reference_doctype"),
+        )
+
+    payable = True
+    if row.reference_doctype and frappe.db.exists(row.reference_doctype, order_id):
+        payable = _payable(frappe.get_doc(row.reference_doctype, order_id))
+    return (str(flt(row.amount)), row.currency or "UZS", payable, row.reference_doctype)
+
+
+def forget_order(order_id):
+    frappe.cache().delete_value(CACHE_KEY.format(order_id))
+
+
+def sync_reference(doc, method=None):
+    """Document hook: update the record when its reference document changes state"""
+    record = get_order(doc.name)
+    if not record:
+        return
+
+    amount, currency, payable, reference_doctype = record
+    if reference_doctype and reference_doctype != doc.doctype:
+        return
+
+    index_order(doc.name, amount, doc.get("currency") or currency, doc.doctype, _payable(doc))
+
+
+def _payable(doc):
+    if doc.docstatus == 2 or doc.get("status") in CLOSED_STATUSES:
+        return False
+    if doc.meta.has_field("outstanding_amount"):
+        return flt(doc.outstanding_amount) > 0
+    return True
+
+
+def sync_payment_entry(doc, method=None):
+    """Document hook: payments update their references without saving them, resync those"""
+    for row in doc.get("references") or []:
+        _sync(row.reference_doctype, row.reference_name)
+        if row.get("payment_request"):
+            _sync("Payment Request", row.payment_request)
+
+
+def _sync(doctype, name):
+    # Only documents with a record are loaded
+    if name and get_order(name):
+        sync_reference(frappe.get_doc(doctype, name))
+
+
+def check_order(order_id, amount, currency):
+    """Decide whether FreedomPay may charge the order.
+
+    Returns (allowed, reason) from the indexed record, rebuilt from the
+    database if it is missing from the cache.
+    """
+    record = find_order(order_id)
+    if not record:
+        return False, "Unknown order"
+
+    expected_amount, expected_currency, payable, _ = record
+    if not payable:
+        return False, "Order can no longer be paid"
+    if currency and expected_currency and currency != expected_currency:
+        return False, "Currency mismatch"
+    if abs(flt(amount) - flt(expected_amount)) >= 0.005:
+        return False, "Amount mismatch"
+    return True, None
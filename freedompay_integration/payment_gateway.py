@@ -4,10 +4,18 @@
 
 import frappe
 from frappe import _
-from frappe.integrations.utils import create_request_log
-from freedompay.api import FreedomPayAPI
+from freedompay_integration.settings_cache import get_secret
+from freedompay_integration.order_index import index_order
+from freedompay_integration.poller import schedule_payment
+from freedompay_integration.payout_outbox import create_payout as outbox_create_payout
+from freedompay_integration.profiler import profiled
+from freedompay_integration import ledger
+from freedompay_integration.gateway_errors import log_gateway_error
+from freedompay_integration.prefetch import take_link
+from freedompay_integration.endpoints import DEFAULT_BASE_URL, get_base_urls
 from typing import Dict, Any, Optional
 
+@profiled("create_payment")
 def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create FreedomPay payment
@@ -22,6 +30,10 @@ def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, A
     Raises:
         frappe.ValidationError: If payment creation fails
     """
+    # Loaded on first use: the client pulls in requests
+    from frappe.integrations.utils import create_request_log
+    from freedompay.api import FreedomPayAPI
+
     # Get settings
     settings = frappe.get_doc("FreedomPay Settings", gateway_controller)
 
@@ -31,8 +43,9 @@ def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, A
     # Initialize API client
     api = FreedomPayAPI(
         merchant_id=settings.merchant_id,
-        secret_key=settings.get_password("secret_key"),
-        base_url=settings.base_url or "https://api.freedompay.uz"
+        secret_key=get_secret(settings, "secret_key"),
+        base_url=settings.base_url or DEFAULT_BASE_URL,
+        fallback_urls=get_base_urls(settings)[1:],
     )
 
     # Prepare payment data
@@ -62,13 +75,45 @@ def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, A
             reference_docname=data.reference_docname
         )
 
+        # A link prefetched when the document was submitted skips the gateway call
+        redirect_url = take_link(
+            data.reference_doctype, data.reference_docname, payment_data["amount"], payment_data["currency"]
+        )
+        if redirect_url:
+            settings.integration_request.db_set("status", "Completed", update_modified=False)
+            return {"redirect_to": redirect_url, "status": "Completed"}
+
+        # Keep the order record the check URL handler answers from
+        if data.get("check_url") or settings.check_url:
+            index_order(
+                data.reference_docname,
+                payment_data["amount"],
+                payment_data["currency"],
+                data.reference_doctype,
+            )
+
         # Call FreedomPay API
         response = api.create_payment(**payment_data)
 
+        ledger.record(
+            ledger.PAYMENT,
+            {
+                "pg_merchant_id": settings.merchant_id,
+                "pg_order_id": data.reference_docname,
+                "pg_amount": payment_data["amount"],
+                "pg_currency": payment_data["currency"],
+            },
+            response,
+            reference_doctype=data.reference_doctype,
+            integration_request=settings.integration_request.name,
+        )
+
         # Handle response
         if response.get("pg_status") == "success":
             # Update request log
             settings.integration_request.db_set("status", "Completed", update_modified=False)
+            if settings.get("poll_pending_payments", 1):
+                schedule_payment(response.get("pg_payment_id"))
 
             return {
                 "redirect_to": response.get("pg_redirect_url") or response.get("redirect_url"),
@@ -77,7 +122,11 @@ def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, A
         else:
             # Update request log
             settings.integration_request.db_set("status", "Failed", update_modified=False)
-            frappe.log_error(f"FreedomPay payment failed: {response.get('pg_error_description')}")
+            log_gateway_error(
+                f"FreedomPay payment failed: {response.get('pg_error_description')}",
+                "init_payment.php",
+                response.get("pg_error_code") or response.get("pg_error_description"),
+            )
 
             frappe.throw(_("Payment failed: {0}").format(response.get("pg_error_description", _("Unknown error"))))
 
@@ -86,7 +135,7 @@ def create_payment(gateway_controller: str, data: Dict[str, Any]) -> Dict[str, A
         if hasattr(settings, "integration_request"):
             settings.integration_request.db_set("status", "Failed", update_modified=False)
 
-        frappe.log_error(f"FreedomPay payment error: {str(e)}")
+        log_gateway_error(f"FreedomPay payment error: {str(e)}", "init_payment.php", e)
         frappe.throw(_("Payment processing error: {0}").format(str(e)))
 
 def verify_payment(payment_id: str) -> Optional[Dict[str, Any]]:
@@ -99,65 +148,52 @@ def verify_payment(payment_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: Payment status data or None if failed
     """
+    from freedompay.api import FreedomPayAPI
+
     # Get settings
     settings = frappe.get_doc("FreedomPay Settings", "FreedomPay Settings")
 
     try:
         api = FreedomPayAPI(
             merchant_id=settings.merchant_id,
-            secret_key=settings.get_password("secret_key")
+            secret_key=get_secret(settings, "secret_key")
         )
 
         response = api.check_payment_status(payment_id)
+        ledger.update_status(payment_id, response.get("pg_transaction_status"), checked=True)
 
         if response.get("pg_status") == "success":
             return response
         else:
-            frappe.log_error(f"FreedomPay verification failed: {response.get('pg_error_description')}")
+            log_gateway_error(
+                f"FreedomPay verification failed: {response.get('pg_error_description')}",
+                "get_status.php",
+                response.get("pg_error_code") or response.get("pg_error_description"),
+            )
             return None
 
     except Exception as e:
-        frappe.log_error(f"FreedomPay verification error: {str(e)}")
+        log_gateway_error(f"FreedomPay verification error: {str(e)}", "get_status.php", e)
         return None
 
-def create_payout(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def create_payout(data: Dict[str, Any]) -> Optional[Any]:
     """
     Create FreedomPay payout
 
+    The payout goes through the FreedomPay Payout Outbox: it is stored in the
+    caller's transaction and sent after it commits, or later if the gateway
+    is unreachable.
+
     Args:
         data (Dict[str, Any]): Payout data
 
     Returns:
-        Optional[Dict[str, Any]]: Payout result or None if failed
+        Optional[Any]: FreedomPay Payout Outbox row or None if it could not be queued
     """
-    settings = frappe.get_doc("FreedomPay Settings", "FreedomPay Settings")
-
     try:
-        api = FreedomPayAPI(
-            merchant_id=settings.merchant_id,
-            secret_key=settings.get_password("secret_key")
-        )
-
-        payout_data = {
-            "amount": str(data.amount),
-            "currency": data.currency or "UZS",
-            "card_number": data.card_number,
-            "cardholder_name": data.cardholder_name,
-        }
-
-        if data.get("post_link"):
-            payout_data["post_link"] = data.get("post_link")
-
-        response = api.create_payout(**payout_data)
-
-        if response.get("pg_status") == "success":
-            return response
-        else:
-            frappe.log_error(f"FreedomPay payout failed: {response.get('pg_error_description')}")
-            return None
-
+        return outbox_create_payout(data)
     except Exception as e:
-        frappe.log_error(f"FreedomPay payout error: {str(e)}")
+        log_gateway_error(f"FreedomPay payout error: {str(e)}", "init_payout.php", e)
         return None
 
 def _validate_settings(settings: "FreedomPaySettings") -> None:
@@ -173,7 +209,7 @@ def _validate_settings(settings: "FreedomPaySettings") -> None:
     if not settings.merchant_id:
         frappe.throw(_("FreedomPay Merchant ID is not configured"))
 
-    if not settings.get_password("secret_key"):
+    if not get_secret(settings, "secret_key"):
         frappe.throw(_("FreedomPay Secret Key is not configured"))
 
     if not settings.result_url:
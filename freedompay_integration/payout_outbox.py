@@ -0,0 +1,205 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Durable outbox for FreedomPay payouts.
+
+``create_payout`` only inserts a FreedomPay Payout Outbox row in the caller's
+transaction; nothing is sent before that transaction commits, so a rolled back
+caller never pays out and a payout survives a gateway outage. Once committed,
+a drain job sends it unless the gateway is known to be down; then it stays
+``Queued`` and the per-minute drainer sends it once the gateway answers again.
+
+Exactly once: the outbox row name is sent as ``pg_order_id``, which FreedomPay
+accepts once per merchant. A drainer marks a row ``Sending`` and commits before
+the network call; a row left in ``Sending`` by a crashed worker is resent with
+the same order id and cannot pay out twice.
+
+Ordering and backpressure: a single drainer (guarded by a Redis lock) sends
+rows oldest first, at most ``BATCH_SIZE`` per run, and stops at the first row
+that is still waiting for a retry or fails with a gateway/network error, so a
+recovering gateway is not flooded and later payouts never overtake earlier ones.
+"""
+
+import json
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from .response_codes import ERROR, FAILED, SUCCESS
+from .gateway_errors import log_gateway_error
+from .schemas import PAYOUT
+from .settings_cache import get_settings
+
+DOCTYPE = "FreedomPay Payout Outbox"
+
+QUEUED = "Queued"
+SENDING = "Sending"
+SENT = "Sent"
+FAILED_STATUS = "Failed"
+
+BATCH_SIZE = 100
+RETRY_DELAY = 60
+MAX_RETRY_DELAY = 60 * 60
+
+LOCK_KEY = "freedompay_payout_drain"
+LOCK_TTL = 15 * 60
+DRAIN_TIMEOUT = LOCK_TTL
+# Set while the gateway is unreachable: new payouts are queued without trying
+GATEWAY_DOWN_KEY = "freedompay_payout_gateway_down"
+
+
+def enqueue_payout(data):
+    """Insert a queued payout; committed together with the caller's transaction"""
+    data = frappe._dict(data)
+    # A payout the gateway would reject never enters the outbox
+    PAYOUT.validate({**data, "merchant_id": get_settings().merchant_id})
+
+    doc = frappe.get_doc({
+        "doctype": DOCTYPE,
+        "status": QUEUED,
+        "amount": data.amount,
+        "currency": data.currency or "UZS",
+        "card_number": data.card_number,
+        "cardholder_name": data.cardholder_name,
+        "post_link": data.post_link,
+        "reference_doctype": data.reference_doctype,
+        "reference_name": data.reference_name,
+        "next_attempt_at": now_datetime(),
+    })
+    doc.insert(ignore_permissions=True)
+    return doc
+
+
+def create_payout(data):
+    """Queue a payout to be sent once the caller's transaction commits.
+
+    Returns the outbox row; its status and payment id are set when it is sent.
+    """
+    doc = enqueue_payout(data)
+
+    # The per-minute drainer picks it up once the gateway is back. The drain job
+    # sends rows oldest first, so a payout never overtakes one queued before it
+    if not gateway_is_down():
+        frappe.enqueue(
+            "freedompay_integration.payout_outbox.drain",
+            queue="short",
+            timeout=DRAIN_TIMEOUT,
+            enqueue_after_commit=True,
+        )
+    return doc
+
+
+def send(doc, api=None):
+    """Send one outbox row and record the outcome on it. Returns (status, payout)"""
+    from .freedompay_api import FreedomPayAPI
+
+    api = api or FreedomPayAPI(keep_raw=False)
+    attempts = (doc.attempts or 0) + 1
+    payload = {
+        "amount": doc.amount,
+        "currency": doc.currency,
+        "card_number": doc.get_password("card_number", raise_exception=False),
+        "cardholder_name": doc.cardholder_name,
+        "post_link": doc.post_link,
+        "order_id": doc.name,
+        # The order id is the outbox row, so the ledger links back to it
+        "reference_doctype": DOCTYPE,
+    }
+
+    code, payout, feedback = api.create_payout(payload)
+
+    if code == SUCCESS and payout.get("pg_status") != "error":
+        doc.db_set({
+            "status": SENT,
+            "attempts": attempts,
+            "sent_at": now_datetime(),
+            "payment_id": payout.get("pg_payment_id"),
+            "response": json.dumps(dict(payout)),
+            "last_error": None,
+        }, update_modified=False)
+        return SENT, payout
+
+    error = feedback.error or (payout and payout.get("pg_error_description")) or "Unknown error"
+
+    if _is_transient(code, feedback):
+        mark_gateway_down()
+        delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+        doc.db_set({
+            "status": QUEUED,
+            "attempts": attempts,
+            "next_attempt_at": add_to_date(now_datetime(), seconds=delay),
+            "last_error": error,
+        }, update_modified=False)
+        return QUEUED, None
+
+    doc.db_set({
+        "status": FAILED_STATUS,
+        "attempts": attempts,
+        "last_error": error,
+        "response": json.dumps(dict(payout)) if payout else None,
+    }, update_modified=False)
+    log_gateway_error(f"FreedomPay Payout Failed: {error}", "init_payout.php", error)
+    return FAILED_STATUS, None
+
+
+def _is_transient(code, feedback):
+    if code == ERROR:
+        return True
+    status_code = getattr(feedback, "status_code", None) or 0
+    return code == FAILED and (status_code >= 500 or status_code == 429)
+
+
+def drain(batch_size: int = BATCH_SIZE) -> int:
+    """Send queued payouts oldest first. Returns the number of rows handled"""
+    cache = frappe.cache()
+    lock = cache.make_key(LOCK_KEY)
+    if not cache.set(lock, 1, nx=True, ex=LOCK_TTL):
+        return 0
+
+    handled = 0
+    try:
+        rows = frappe.get_all(
+            DOCTYPE,
+            filters={"status": ("in", (QUEUED, SENDING))},
+            fields=["name", "next_attempt_at"],
+            order_by="creation asc",
+            limit=batch_size,
+        )
+        now = now_datetime()
+        for row in rows:
+            if row.next_attempt_at and row.next_attempt_at > now:
+                break
+
+            doc = frappe.get_doc(DOCTYPE, row.name)
+            doc.db_set("status", SENDING, update_modified=False)
+            frappe.db.commit()
+
+            status, payout = send(doc)
+            frappe.db.commit()
+            if status == QUEUED:
+                break
+            handled += 1
+
+        if handled:
+            clear_gateway_down()
+    finally:
+        cache.delete(lock)
+    return handled
+
+
+def drain_if_queued():
+    """Scheduler entry point"""
+    if frappe.db.exists(DOCTYPE, {"status": ("in", (QUEUED, SENDING))}):
+        drain()
+
+
+def gateway_is_down() -> bool:
+    return bool(frappe.cache().get_value(GATEWAY_DOWN_KEY))
+
+
+def mark_gateway_down():
+    frappe.cache().set_value(GATEWAY_DOWN_KEY, 1, expires_in_sec=RETRY_DELAY)
+
+
+def clear_gateway_down():
+    frappe.cache().delete_value(GATEWAY_DOWN_KEY)
@@ -0,0 +1,238 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Adaptive polling of pending FreedomPay payments.
+
+Every pending ``pg_payment_id`` has its own next-check time. It is stored on
+the FreedomPay Transaction row (``next_poll_at``, ``poll_attempts``) and
+mirrored as the score of a Redis sorted set that workers claim from; if Redis
+loses the queue, it is reloaded from the ledger. Checks start frequent and
+back off exponentially up to once an hour, so fresh payments are picked up
+quickly while abandoned carts cost a handful of ``get_status.php`` calls a
+day.
+
+Workers claim due payments by moving their score forward by a lease period in
+one atomic step. Several workers can drain the queue at once without checking
+the same payment twice; if a worker dies, the lease runs out and the payment
+becomes due again.
+
+Once a payment reaches a terminal state it leaves the queue and the methods
+registered under the ``freedompay_payment_status`` hook are called with
+``(payment_id, state, status)``.
+"""
+
+import random
+import sys
+import time
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+from .gateway_errors import log_gateway_error
+from .ledger import DOCTYPE as LEDGER
+
+QUEUE_KEY = "freedompay_poll_queue"
+ATTEMPTS_KEY = "freedompay_poll_attempts"
+
+INITIAL_DELAY = 30
+MAX_DELAY = 60 * 60
+# Payments still pending after this long are treated as abandoned
+MAX_AGE = 48 * 60 * 60
+LEASE = 120
+
+BATCH_SIZE = 20
+# Rows reloaded into an empty Redis queue per scheduler run
+RESTORE_LIMIT = 10000
+# Drain jobs run every minute and stop before the next one starts
+DRAIN_BUDGET = 50
+
+TERMINAL_STATES = ("ok", "success", "failed", "revoked", "refunded", "incomplete")
+
+# Claim up to ARGV[2] members due by ARGV[1] and lease them until ARGV[3]
+_CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], member)
+end
+return due
+"""
+
+
+def next_delay(attempts: int) -> float:
+    """Seconds until the next check after ``attempts`` checks, with jitter"""
+    delay = min(INITIAL_DELAY * 2 ** attempts, MAX_DELAY)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _queue_key():
+    return frappe.cache().make_key(QUEUE_KEY)
+
+
+def _since(value) -> float:
+    """Epoch seconds of a datetime from the database, in this process's clock"""
+    return time.time() - (now_datetime() - get_datetime(value)).total_seconds()
+
+
+def _enqueue(payment_id, attempts, first_seen, due):
+    cache = frappe.cache()
+    cache.hset(ATTEMPTS_KEY, payment_id, (attempts, first_seen))
+    cache.zadd(_queue_key(), {payment_id: due})
+
+
+def first_check_at(delay: float = INITIAL_DELAY):
+    """``next_poll_at`` of a payment inserted into the ledger already scheduled"""
+    return add_to_date(now_datetime(), seconds=delay)
+
+
+def schedule_payment(payment_id: str, delay: float = INITIAL_DELAY, persisted: bool = False) -> None:
+    """Start polling a newly created payment; its ledger row must exist.
+
+    ``persisted``: the row was inserted with ``next_poll_at`` from ``first_check_at``.
+    """
+    if not payment_id:
+        return
+    if not persisted:
+        frappe.db.set_value(
+            LEDGER, {"payment_id": payment_id},
+            {"next_poll_at": first_check_at(delay), "poll_attempts": 0},
+            update_modified=False,
+        )
+    _enqueue(payment_id, 0, time.time(), time.time() + delay)
+
+
+def ensure_scheduled(payment_id: str) -> None:
+    """Start polling a payment a payer has just opened, unless it is polled already"""
+    if payment_id and not frappe.cache().hget(ATTEMPTS_KEY, payment_id):
+        schedule_payment(payment_id)
+
+
+def unschedule_payment(payment_id: str) -> None:
+    """Drop a payment from the Redis queue; the ledger clears it with the final status"""
+    cache = frappe.cache()
+    cache.zrem(_queue_key(), payment_id)
+    cache.hdel(ATTEMPTS_KEY, payment_id)
+
+
+def pending_count() -> int:
+    return frappe.cache().zcard(_queue_key())
+
+
+def restore_queue(limit: int = RESTORE_LIMIT) -> int:
+    """Reload the schedule kept on the ledger into Redis, e.g. after a restart or eviction"""
+    rows = frappe.get_all(
+        LEDGER,
+        filters={"next_poll_at": ["is", "set"]},
+        fields=["payment_id", "next_poll_at", "poll_attempts", "creation"],
+        order_by="next_poll_at asc",
+        limit=limit,
+    )
+    for row in rows:
+        if row.payment_id:
+            _enqueue(row.payment_id, row.poll_attempts or 0, _since(row.creation), _since(row.next_poll_at))
+    return len(rows)
+
+
+def claim(limit: int = BATCH_SIZE, lease: int = LEASE) -> list[str]:
+    """Lease up to ``limit`` due payments to the calling worker"""
+    now = time.time()
+    cache = frappe.cache()
+    script = cache.register_script(_CLAIM_SCRIPT)
+    claimed = script(keys=[_queue_key()], args=[now, limit, now + lease])
+    return [frappe.safe_decode(member) for member in claimed]
+
+
+def poll_pending_payments():
+    """Scheduler entry point: start as many drain jobs as configured"""
+    settings = frappe.get_cached_doc("FreedomPay Settings")
+    if not settings.get("poll_pending_payments", 1):
+        return
+    # An empty queue may only mean Redis lost it: the ledger has the schedule
+    if not pending_count() and not restore_queue():
+        return
+
+    for _ in range(max(settings.get("poll_workers") or 1, 1)):
+        frappe.enqueue(
+            "freedompay_integration.poller.drain", queue="short", timeout=DRAIN_BUDGET + LEASE
+        )
+
+
+def drain(budget: float = DRAIN_BUDGET, batch_size: int = BATCH_SIZE) -> int:
+    """Check due payments until none are due or the time budget is spent"""
+    from .freedompay_api import FreedomPayAPI
+
+    deadline = time.monotonic() + budget
+    api = FreedomPayAPI(keep_raw=False)
+    checked = 0
+
+    while time.monotonic() < deadline:
+        claimed = claim(batch_size)
+        if not claimed:
+            break
+        for payment_id in claimed:
+            try:
+                poll_payment(api, payment_id)
+            except Exception:
+                log_gateway_error(
+                    f"FreedomPay poll failed: {payment_id}\n\n{frappe.get_traceback()}",
+                    "get_status.php",
+                    sys.exc_info()[1],
+                )
+                _reschedule(payment_id)
+            # Releases the ledger row before the next payment
+            frappe.db.commit()
+            checked += 1
+
+    return checked
+
+
+def poll_payment(api, payment_id: str) -> str | None:
+    """Check one payment and either finish it or schedule the next check"""
+    code, status, feedback = api.check_payment_status(payment_id)
+    state = status.get("pg_transaction_status") if status else None
+
+    if state in TERMINAL_STATES:
+        _finish(payment_id, state, status)
+    else:
+        entry = _attempts(payment_id)
+        # Without a schedule anywhere the payment is not ours to poll any more
+        if entry is None or time.time() - entry[1] > MAX_AGE:
+            _finish(payment_id, "abandoned", status)
+        else:
+            _reschedule(payment_id, entry)
+    return state
+
+
+def _attempts(payment_id):
+    """(attempts, first seen) from Redis, else from the ledger; None if neither schedules it"""
+    entry = frappe.cache().hget(ATTEMPTS_KEY, payment_id)
+    if entry:
+        return entry
+    row = frappe.db.get_value(
+        LEDGER, {"payment_id": payment_id}, ["poll_attempts", "creation", "next_poll_at"], as_dict=True
+    )
+    if not row or not row.next_poll_at:
+        return None
+    return row.poll_attempts or 0, _since(row.creation)
+
+
+def _reschedule(payment_id, entry=None):
+    entry = entry or _attempts(payment_id)
+    if entry is None:
+        unschedule_payment(payment_id)
+        return
+    attempts, first_seen = entry
+    attempts += 1
+    delay = next_delay(attempts)
+    frappe.db.set_value(
+        LEDGER, {"payment_id": payment_id},
+        {"next_poll_at": add_to_date(now_datetime(), seconds=delay), "poll_attempts": attempts},
+        update_modified=False,
+    )
+    _enqueue(payment_id, attempts, first_seen, time.time() + delay)
+
+
+def _finish(payment_id, state, status):
+    unschedule_payment(payment_id)
+    frappe.db.set_value(LEDGER, {"payment_id": payment_id}, "next_poll_at", None, update_modified=False)
+    for method in frappe.get_hooks("freedompay_payment_status"):
+        frappe.get_attr(method)(payment_id, state, status)
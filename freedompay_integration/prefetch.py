@@ -0,0 +1,150 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Speculative payment initialisation.
+
+With **Prefetch Payment Links** on, submitting a Payment Request or Sales
+Invoice enqueues a job that creates the FreedomPay payment in the background
+and keeps its signed redirect URL in Redis until shortly before it expires.
+When the customer clicks Pay, checkout finds the link for the same amount and
+currency and redirects at once instead of calling ``init_payment.php``.
+
+Links are refreshed lazily: a link close to its expiry is still used but
+replaced in the background; a link for an amount that no longer matches (a
+partial payment changed the outstanding amount) is dropped, checkout creates
+the payment as before and a fresh link is prefetched.
+"""
+
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from .gateway_errors import log_gateway_error
+from .order_index import get_order
+from .poller import ensure_scheduled
+from .response_codes import SUCCESS
+from .settings_cache import get_settings
+
+CACHE_KEY = "freedompay_prefetched:{0}:{1}"
+DEFAULT_LIFETIME = 24 * 60 * 60
+# Links are not handed out this close to their expiry
+EXPIRY_MARGIN = 10 * 60
+# Links are replaced in the background once less than this is left
+REFRESH_MARGIN = 2 * 60 * 60
+
+
+def enabled() -> bool:
+    return bool(get_settings().get("prefetch_payment_links"))
+
+
+def on_submit(doc, method=None):
+    """Document hook: prefetch the payment link of a submitted document"""
+    if enabled():
+        _enqueue(doc.doctype, doc.name)
+
+
+def on_cancel(doc, method=None):
+    forget_link(doc.doctype, doc.name)
+
+
+def _enqueue(doctype, name):
+    frappe.enqueue(
+        "freedompay_integration.prefetch.prefetch_link",
+        queue="short",
+        enqueue_after_commit=True,
+        doctype=doctype,
+        name=name,
+    )
+
+
+def prefetch_link(doctype, name):
+    """Create the payment of a document and keep its redirect URL"""
+    from .freedompay_api import FreedomPayAPI
+
+    data = _payment_data(frappe.get_doc(doctype, name))
+    if not data:
+        return None
+
+    lifetime = cint(get_settings().get("prefetch_link_lifetime")) or DEFAULT_LIFETIME
+    code, payment, feedback = FreedomPayAPI(keep_raw=False).create_payment(
+        {**data, "lifetime": lifetime, "prefetch": 1}
+    )
+    if code != SUCCESS or not payment.get("pg_redirect_url"):
+        log_gateway_error(
+            f"FreedomPay prefetch failed for {doctype} {name}: {feedback.error or payment.get('pg_error_description')}",
+            "init_payment.php",
+            feedback.error or payment.get("pg_error_code"),
+        )
+        return None
+
+    link = (
+        payment.get("pg_redirect_url"),
+        payment.get("pg_payment_id"),
+        str(data["amount"]),
+        data["currency"],
+        time.time() + lifetime,
+    )
+    frappe.cache().set_value(
+        CACHE_KEY.format(doctype, name), link, expires_in_sec=max(lifetime - EXPIRY_MARGIN, 1)
+    )
+    return link
+
+
+def _payment_data(doc):
+    if doc.docstatus != 1:
+        return None
+    if doc.doctype == "Sales Invoice":
+        amount, email = doc.outstanding_amount, doc.get("contact_email")
+    else:
+        amount, email = doc.grand_total, doc.get("email_to")
+    if flt(amount) <= 0:
+        return None
+    return {
+        "amount": amount,
+        "currency": doc.currency or "UZS",
+        "description": _("Payment for {0}").format(doc.name),
+        "order_id": doc.name,
+        "reference_doctype": doc.doctype,
+        "user_id": email,
+        "email": email,
+    }
+
+
+def take_link(reference_doctype, reference_name, amount, currency=None):
+    """Redirect URL of a prefetched payment for this order and amount, or None"""
+    if not reference_doctype or not reference_name or not enabled():
+        return None
+
+    key = CACHE_KEY.format(reference_doctype, reference_name)
+    link = frappe.cache().get_value(key)
+    if not link:
+        return None
+
+    redirect_url, payment_id, link_amount, link_currency, expires_at = link
+    record = get_order(reference_name)
+    if record and not record[2]:
+        # Paid or cancelled meanwhile
+        forget_link(reference_doctype, reference_name)
+        return None
+    if abs(flt(amount) - flt(link_amount)) >= 0.005 or (currency or "UZS") != link_currency:
+        forget_link(reference_doctype, reference_name)
+        _enqueue(reference_doctype, reference_name)
+        return None
+
+    left = expires_at - time.time()
+    if left < EXPIRY_MARGIN:
+        forget_link(reference_doctype, reference_name)
+        return None
+    if left < REFRESH_MARGIN:
+        _enqueue(reference_doctype, reference_name)
+
+    # The customer is on the way to pay: start checking it, keeping the backoff of a link opened before
+    if get_settings().get("poll_pending_payments", 1):
+        ensure_scheduled(payment_id)
+    return redirect_url
+
+
+def forget_link(reference_doctype, reference_name):
+    frappe.cache().delete_value(CACHE_KEY.format(reference_doctype, reference_name))
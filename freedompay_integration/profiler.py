@@ -0,0 +1,155 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Sampling profiler for FreedomPay gateway calls.
+
+Functions decorated with ``@profiled`` are profiled for the fraction of calls
+set in **Profile Sample Rate** of FreedomPay Settings. While a call runs, a
+helper thread records the call's stack every ``INTERVAL`` seconds. The result
+is written as collapsed stacks (``frame;frame;frame count``), ready for
+``flamegraph.pl`` or speedscope, either attached to the Integration Request of
+the call or appended to a rotating file in the site's ``logs`` folder.
+
+With the rate at 0 a decorated call costs one settings lookup.
+"""
+
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+import frappe
+from frappe.utils import flt
+
+from .settings_cache import get_settings
+
+INTERVAL = 0.002
+PROFILE_FILE = "freedompay_profiles.folded"
+PROFILE_FILE_SIZE = 10 * 1024 * 1024
+PROFILE_FILE_COUNT = 5
+
+OUTPUT_INTEGRATION_REQUEST = "Integration Request"
+OUTPUT_FILE = "Local File"
+
+_active = threading.local()
+_file_loggers = {}
+
+
+class Sampler:
+    """Samples the stack of one thread from a helper thread"""
+
+    def __init__(self, thread_id, root_frame=None, interval=INTERVAL):
+        self.thread_id = thread_id
+        # Frames above this one (the web request, the job runner) are left out
+        self.root_frame = root_frame
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and not self._stop.is_set():
+                self.samples[self._collapse(frame)] += 1
+
+    def _collapse(self, frame):
+        stack = []
+        while frame is not None and frame is not self.root_frame:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+
+def profiled(label):
+    """Profile a sampled fraction of calls to the decorated function"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_active, "profiling", False) or not _should_sample():
+                return fn(*args, **kwargs)
+
+            _active.profiling = True
+            sampler = Sampler(threading.get_ident(), sys._getframe()).start()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples = sampler.stop()
+                _active.profiling = False
+                _store(label, samples, time.perf_counter() - start, args[0] if args else None)
+
+        return wrapper
+
+    return decorator
+
+
+def _should_sample():
+    try:
+        rate = flt(get_settings().get("profile_sample_rate"))
+    except Exception:
+        return False
+    return rate > 0 and random.random() * 100 < rate
+
+
+def collapsed(label, samples):
+    return "\n".join(f"{label};{stack} {count}" for stack, count in samples.items() if stack)
+
+
+def _store(label, samples, elapsed, owner):
+    if not samples:
+        return
+    try:
+        text = collapsed(f"freedompay:{label}", samples)
+        integration_request = getattr(owner, "integration_request", None)
+        output = get_settings().get("profile_output") or OUTPUT_FILE
+
+        if output == OUTPUT_INTEGRATION_REQUEST and getattr(integration_request, "name", None):
+            frappe.get_doc({
+                "doctype": "File",
+                "file_name": f"profile-{label}-{int(time.time() * 1000)}.folded",
+                "attached_to_doctype": "Integration Request",
+                "attached_to_name": integration_request.name,
+                "is_private": 1,
+                "content": text,
+            }).insert(ignore_permissions=True)
+        else:
+            _file_logger().info(text)
+
+        frappe.logger("freedompay").debug(
+            f"Profiled {label}: {elapsed * 1000:.1f} ms, {sum(samples.values())} samples"
+        )
+    except Exception:
+        # Profiling must never break a payment
+        pass
+
+
+def _file_logger():
+    path = frappe.get_site_path("logs", PROFILE_FILE)
+    logger = _file_loggers.get(path)
+    if logger is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger = logging.getLogger(f"freedompay.profiles.{path}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(path, maxBytes=PROFILE_FILE_SIZE, backupCount=PROFILE_FILE_COUNT)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _file_loggers[path] = logger
+    return logger
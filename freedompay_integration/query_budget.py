@@ -0,0 +1,220 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Counting of database and Redis round trips, for query-budget tests.
+
+``count_queries`` wraps ``frappe.db``, ``frappe.cache()``, the document
+loaders (``frappe.get_doc``, ``frappe.get_cached_doc``, ``frappe.get_all``,
+...) and the password and write methods of the documents they return, and logs
+every call made inside the block:
+
+    with query_budget(db=2, writes=1, redis=3):
+        api.check_payment_status("123")
+
+The database is counted in SQL statements: ``sql`` of the database object
+itself is wrapped, so the statements Frappe issues inside ``get_value``, a
+document insert or ``get_password`` are each one round trip. A call that
+issues no statement (a document served from the cache, or a test double)
+counts as one. Redis calls made inside another counted call are not counted.
+Calls are categorised by method and doctype, table or Redis key prefix, and a
+budget that is exceeded fails with the full list, so the extra round trip is
+easy to find.
+"""
+
+import inspect
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import frappe
+
+DB = "db"
+REDIS = "redis"
+
+# Module-level loaders, and what they do
+DB_FUNCTIONS = {
+    "get_doc": "read",
+    "get_cached_doc": "read",
+    "get_all": "read",
+    "get_list": "read",
+    "get_value": "read",
+    "delete_doc": "write",
+}
+DOC_READS = ("get_password", "reload")
+DOC_WRITES = ("insert", "save", "submit", "cancel", "delete", "db_set", "db_insert", "db_update")
+DB_WRITES = frozenset(("set_value", "set_single_value", "delete", "bulk_insert", "insert", "truncate"))
+# Methods that do not talk to the database or Redis
+LOCAL_METHODS = frozenset(("make_key", "escape", "get_system_setting", "sql_ddl", "mogrify"))
+
+_SQL_VERB = re.compile(r"^\s*(\w+)")
+_SQL_TABLE = re.compile(r"`?tab([^`\s]+(?: [^`\s]+)*?)`")
+
+_state = threading.local()
+
+
+class Call:
+    __slots__ = ("kind", "method", "target", "write")
+
+    def __init__(self, kind, method, target, write):
+        self.kind = kind
+        self.method = method
+        self.target = target
+        self.write = write
+
+    @property
+    def category(self) -> str:
+        return f"{self.kind}.{self.method} {self.target}".rstrip()
+
+
+class QueryLog:
+    """Calls made inside a ``count_queries`` block, in order"""
+
+    def __init__(self):
+        self.calls = []
+
+    @property
+    def db(self) -> list:
+        return [call for call in self.calls if call.kind == DB]
+
+    @property
+    def writes(self) -> list:
+        return [call for call in self.calls if call.kind == DB and call.write]
+
+    @property
+    def redis(self) -> list:
+        return [call for call in self.calls if call.kind == REDIS]
+
+    def summary(self) -> Counter:
+        return Counter(call.category for call in self.calls)
+
+    def report(self) -> str:
+        lines = [f"{len(self.db)} DB calls ({len(self.writes)} writes), {len(self.redis)} Redis calls:"]
+        lines.extend(f"  {count} x {category}" for category, count in sorted(self.summary().items()))
+        return "\n".join(lines)
+
+    def check(self, db=None, writes=None, redis=None):
+        """Raise AssertionError if a count is over its budget"""
+        over = [
+            f"{label} {len(calls)} > {budget}"
+            for label, calls, budget in (("DB calls", self.db, db), ("writes", self.writes, writes),
+                                         ("Redis calls", self.redis, redis))
+            if budget is not None and len(calls) > budget
+        ]
+        if over:
+            raise AssertionError(f"Query budget exceeded: {', '.join(over)}\n{self.report()}")
+
+
+def _target(kind, method, args):
+    if not args or not isinstance(args[0], str):
+        return ""
+    first = args[0]
+    if kind == REDIS:
+        # Site prefix and variable part of the key dropped
+        return first.rsplit("|", 1)[-1].split(":", 1)[0]
+    if method == "sql":
+        verb = _SQL_VERB.match(first)
+        table = _SQL_TABLE.search(first)
+        return " ".join(part for part in (verb and verb.group(1).upper(), table and table.group(1)) if part)
+    return first
+
+
+def _call(kind, method, args, write, target):
+    category = target if target is not None else _target(kind, method, args)
+    is_write = write or (method == "sql" and category.split(" ")[0] in ("INSERT", "UPDATE", "DELETE"))
+    return Call(kind, method, category, is_write)
+
+
+def _counted(log, kind, method, fn, write=False, target=None):
+    def call(*args, **kwargs):
+        statements = getattr(_state, "statements", None)
+        if statements is not None:
+            # Inside another counted call: only its SQL statements are round trips of their own
+            if kind == DB and method == "sql":
+                statements.append(_call(kind, method, args, write, target))
+            return fn(*args, **kwargs)
+        _state.statements = statements = []
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            _state.statements = None
+        if method in ("get_doc", "get_cached_doc") and args and isinstance(args[0], dict):
+            # A new document: nothing is read, only its writes count
+            log.calls.extend(statements)
+            _watch_document(log, result)
+            return result
+        log.calls.extend(statements or [_call(kind, method, args, write, target)])
+        if method in ("get_doc", "get_cached_doc") and result is not None:
+            _watch_document(log, result)
+        return result
+
+    return call
+
+
+def _watch_document(log, doc):
+    """Count the password reads and the writes of a document loaded or created inside the block"""
+    doctype = getattr(doc, "doctype", None)
+    target = doctype if isinstance(doctype, str) else ""
+    for method in DOC_READS + DOC_WRITES:
+        fn = getattr(doc, method, None)
+        if callable(fn):
+            setattr(doc, method, _counted(log, DB, f"doc.{method}", fn, write=method in DOC_WRITES, target=target))
+
+
+class _Counting:
+    """Proxy counting the calls made through ``target``"""
+
+    def __init__(self, target, log, kind):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_log", log)
+        object.__setattr__(self, "_kind", kind)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name.startswith("_") or name in LOCAL_METHODS or not callable(value):
+            return value
+        return _counted(self._log, self._kind, name, value, self._kind == DB and name in DB_WRITES)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+@contextmanager
+def count_queries():
+    """Log the DB and Redis calls made inside the block"""
+    log = QueryLog()
+    saved = {name: getattr(frappe, name, None) for name in ("db", "cache", *DB_FUNCTIONS)}
+
+    db = saved["db"]
+    cache = saved["cache"]
+    sql = getattr(db, "sql", None)
+    if sql is not None:
+        # Statements issued by the database object's own methods do not go through the proxy
+        sql_is_method = inspect.ismethod(sql) and "sql" not in vars(db)
+        db.sql = _counted(log, DB, "sql", sql)
+    if db is not None:
+        frappe.db = _Counting(db, log, DB)
+    if cache is not None:
+        frappe.cache = lambda: _Counting(cache(), log, REDIS)
+    for name, effect in DB_FUNCTIONS.items():
+        if saved[name] is not None:
+            setattr(frappe, name, _counted(log, DB, name, saved[name], effect == "write"))
+    try:
+        yield log
+    finally:
+        for name, value in saved.items():
+            if value is not None:
+                setattr(frappe, name, value)
+        if sql is not None:
+            if sql_is_method:
+                del db.sql
+            else:
+                db.sql = sql
+
+
+@contextmanager
+def query_budget(db=None, writes=None, redis=None):
+    """Fail if the block makes more DB calls, writes or Redis calls than allowed"""
+    with count_queries() as log:
+        yield log
+    log.check(db=db, writes=writes, redis=redis)
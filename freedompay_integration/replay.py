@@ -0,0 +1,97 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Replay protection for FreedomPay callbacks.
+
+FreedomPay retries callbacks until it gets an answer, and every copy of a
+callback carries the same ``pg_payment_id``, ``pg_salt`` and ``pg_sig``. The
+request that claims that triple holds a short lease while it processes the
+callback and marks the triple once processing succeeded. Later copies are
+recognised by a small LRU in the worker or, on another worker, by a key in
+Redis that expires after ``NONCE_TTL``; a copy that arrives while the lease is
+held, or after processing failed, is processed again.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+
+NONCE_KEY = "freedompay_nonce:{0}"
+LEASE_KEY = "freedompay_nonce_lease:{0}"
+# FreedomPay stops retrying a callback well within a day
+NONCE_TTL = 24 * 60 * 60
+LOCAL_SIZE = 4096
+# Longer than processing one callback takes
+LEASE_TTL = 60
+
+
+def nonce_key(data: dict) -> str:
+    """Fingerprint of a signed callback"""
+    raw = "|".join(str(data.get(field) or "") for field in ("pg_payment_id", "pg_salt", "pg_sig"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class NonceCache:
+    """Bounded in-worker LRU in front of a shared, expiring Redis store"""
+
+    def __init__(self, size: int = LOCAL_SIZE, ttl: int = NONCE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_key(self, key):
+        return (getattr(frappe.local, "site", None), key)
+
+    def _seen_locally(self, local_key, now):
+        with self._lock:
+            expires_at = self._local.get(local_key)
+            if expires_at is None:
+                return False
+            if expires_at < now:
+                del self._local[local_key]
+                return False
+            self._local.move_to_end(local_key)
+            return True
+
+    def _remember(self, local_key, expires_at):
+        with self._lock:
+            self._local[local_key] = expires_at
+            self._local.move_to_end(local_key)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def seen(self, key: str) -> bool:
+        """Return True if a callback with ``key`` was already processed"""
+        now = time.time()
+        local_key = self._local_key(key)
+        if self._seen_locally(local_key, now):
+            return True
+
+        cache = frappe.cache()
+        if not cache.get(cache.make_key(NONCE_KEY.format(key))):
+            return False
+        self._remember(local_key, now + self.ttl)
+        return True
+
+    def claim(self, key: str) -> bool:
+        """Take the processing lease of ``key``; False while another request holds it"""
+        cache = frappe.cache()
+        return bool(cache.set(cache.make_key(LEASE_KEY.format(key)), 1, nx=True, ex=LEASE_TTL))
+
+    def mark(self, key: str) -> None:
+        """Remember ``key`` as processed, so replays are only acknowledged"""
+        cache = frappe.cache()
+        cache.set(cache.make_key(NONCE_KEY.format(key)), 1, ex=self.ttl)
+        self._remember(self._local_key(key), time.time() + self.ttl)
+
+    def release(self, key: str) -> None:
+        """Drop the processing lease of ``key``"""
+        cache = frappe.cache()
+        cache.delete(cache.make_key(LEASE_KEY.format(key)))
+
+
+callback_nonces = NonceCache()
@@ -1,10 +1,71 @@
-from dataclasses import dataclass
-from typing import Any, Optional
+import json
+from typing import Any
+
+
+def parse_body(body: Any) -> Any:
+    """Parse a gateway response body: JSON first, then form data"""
+    if body is None or isinstance(body, dict):
+        return body
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.loads(body)
+    except ValueError:
+        data = {}
+        for item in body.split('&'):
+            if '=' in item:
+                key, value = item.split('=', 1)
+                data[key] = value
+        return data
 
 
-@dataclass
 class ResponseFeedBack:
-    message: str | None = None
-    data: Any = None
-    status_code: int = None
-    error: str = None
+    """Outcome of a gateway call.
+
+    ``data`` is parsed from the raw ``body`` on first access, so callers that
+    only look at the status code or a typed result never pay for parsing.
+    """
+
+    __slots__ = ("message", "_data", "body", "status_code", "error")
+
+    def __init__(
+        self,
+        message: str | None = None,
+        data: Any = None,
+        status_code: int = None,
+        error: str = None,
+        body: str | bytes | None = None,
+    ):
+        self.message = message
+        self._data = data
+        self.body = body
+        self.status_code = status_code
+        self.error = error
+
+    @property
+    def data(self) -> Any:
+        if self._data is None and self.body is not None:
+            self._data = parse_body(self.body)
+        return self._data
+
+    @data.setter
+    def data(self, value: Any) -> None:
+        self._data = value
+
+    def drop_body(self) -> None:
+        """Release the raw body and anything parsed from it"""
+        self.body = None
+        self._data = None
+
+    def __eq__(self, other):
+        if not isinstance(other, ResponseFeedBack):
+            return NotImplemented
+        return (self.message, self.data, self.status_code, self.error) == (
+            other.message, other.data, other.status_code, other.error
+        )
+
+    def __repr__(self):
+        return (
+            f"ResponseFeedBack(message={self.message!r}, data={self.data!r}, "
+            f"status_code={self.status_code!r}, error={self.error!r})"
+        )
@@ -0,0 +1,152 @@
+"""Compact, immutable results of FreedomPay API calls.
+
+A result keeps the raw response body and parses it, once, when a field is read.
+The fields each endpoint is known to return are exposed as attributes
+(``payment.redirect_url``), and are extracted once and stored in a tuple. With
+``keep_raw=False`` those fields are extracted up front and the body is dropped,
+leaving only a handful of strings per result.
+
+Results are read-only mappings over the ``pg_*`` response fields, so code written
+against the plain dicts returned before keeps working:
+
+    payment.get("pg_redirect_url")
+    payment["pg_payment_id"]
+    payment.pg_status
+"""
+
+from collections.abc import Mapping
+from typing import Any
+
+from .response_feedback import parse_body
+
+_UNSET = object()
+
+
+class GatewayResult(Mapping):
+    __slots__ = ("_body", "_values", "_data")
+
+    # (attribute name, response field) pairs known for the endpoint
+    FIELDS: tuple = ()
+
+    def __init__(self, body: Any, keep_raw: bool = True):
+        object.__setattr__(self, "_body", body)
+        object.__setattr__(self, "_values", None)
+        object.__setattr__(self, "_data", None)
+        if not keep_raw:
+            self._extract()
+            object.__setattr__(self, "_body", None)
+            object.__setattr__(self, "_data", None)
+
+    @classmethod
+    def from_feedback(cls, feedback, keep_raw: bool = True) -> "GatewayResult":
+        """Build a result from the ``ResponseFeedBack`` of a successful call"""
+        body = getattr(feedback, "body", None)
+        if not isinstance(body, (str, bytes)):
+            body = feedback.data
+        return cls(body, keep_raw=keep_raw)
+
+    def _extract(self) -> tuple:
+        values = self._values
+        if values is None:
+            parsed = self._parsed()
+            values = tuple(parsed.get(field) for _, field in self.FIELDS)
+            object.__setattr__(self, "_values", values)
+        return values
+
+    def _known(self, key):
+        for index, (_, field) in enumerate(self.FIELDS):
+            if field == key:
+                return self._extract()[index]
+        return _UNSET
+
+    def _parsed(self) -> dict:
+        if self._body is None:
+            values = self._extract()
+            return {field: value for (_, field), value in zip(self.FIELDS, values) if value is not None}
+        data = self._data
+        if data is None:
+            data = parse_body(self._body)
+            # A JSON list or scalar body has no fields
+            if not isinstance(data, dict):
+                data = {}
+            # Parsed once, on first use
+            object.__setattr__(self, "_data", data)
+        return data
+
+    def __getitem__(self, key):
+        value = self._known(key)
+        if value is None or value is _UNSET:
+            return self._parsed()[key]
+        return value
+
+    def __iter__(self):
+        return iter(self._parsed())
+
+    def __len__(self):
+        return len(self._parsed())
+
+    def __getattr__(self, name):
+        # Attribute access to pg_* fields, as frappe._dict allowed
+        if name.startswith("pg_"):
+            return self.get(name)
+        for index, (attr, _) in enumerate(type(self).FIELDS):
+            if attr == name:
+                return self._extract()[index]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), (self._body if self._body is not None else self._parsed(),))
+
+    def __repr__(self):
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr, _ in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
+
+    @property
+    def succeeded(self) -> bool:
+        return self.get("pg_status") in ("ok", "success")
+
+
+class PaymentResult(GatewayResult):
+    """Response of ``init_payment.php``"""
+
+    __slots__ = ()
+    FIELDS = (
+        ("status", "pg_status"),
+        ("payment_id", "pg_payment_id"),
+        ("redirect_url", "pg_redirect_url"),
+        ("error_code", "pg_error_code"),
+        ("error_description", "pg_error_description"),
+    )
+
+
+class StatusResult(GatewayResult):
+    """Response of ``get_status.php``"""
+
+    __slots__ = ()
+    FIELDS = (
+        ("status", "pg_status"),
+        ("payment_id", "pg_payment_id"),
+        ("transaction_status", "pg_transaction_status"),
+        ("amount", "pg_amount"),
+        ("currency", "pg_currency"),
+        ("error_code", "pg_error_code"),
+        ("error_description", "pg_error_description"),
+    )
+
+
+class PayoutResult(GatewayResult):
+    """Response of ``init_payout.php``"""
+
+    __slots__ = ()
+    FIELDS = (
+        ("status", "pg_status"),
+        ("payment_id", "pg_payment_id"),
+        ("error_code", "pg_error_code"),
+        ("error_description", "pg_error_description"),
+    )
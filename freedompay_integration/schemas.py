@@ -0,0 +1,177 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Request schemas for the FreedomPay endpoints.
+
+Each endpoint declares the ``pg_*`` fields it sends: which key of the caller's
+data the value comes from, how it is normalised, whether it is required and
+its default. A schema is compiled once, at import time, into a tuple of small
+per-field steps, so building a payload is a single pass with no work spent
+reading the declaration.
+
+Both client stacks (``FreedomPayAPI`` here and ``freedompay.api``) build their
+payloads from these schemas, so an invalid payload fails with a
+``frappe.ValidationError`` before anything is signed or sent.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import frappe
+from frappe import _
+
+SUPPORTED_CURRENCIES = ("UZS", "USD", "EUR", "RUB")
+DEFAULT_CURRENCY = "UZS"
+
+_CENTS = Decimal("0.01")
+
+
+class Field:
+    """One ``pg_*`` field of a request"""
+
+    __slots__ = ("name", "source", "normalize", "required", "default")
+
+    def __init__(self, name, source, normalize=None, required=False, default=None):
+        self.name = name
+        self.source = source
+        self.normalize = normalize
+        self.required = required
+        self.default = default
+
+
+def _invalid(field, value):
+    frappe.throw(_("Invalid value for {0}: {1}").format(field.source, value), frappe.ValidationError)
+
+
+def text(value, field):
+    return str(value).strip()
+
+
+def amount(value, field):
+    try:
+        number = Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        _invalid(field, value)
+    if not number.is_finite() or number <= 0:
+        _invalid(field, value)
+    return str(number.quantize(_CENTS, rounding=ROUND_HALF_UP))
+
+
+def integer(value, field):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        _invalid(field, value)
+    if number <= 0:
+        _invalid(field, value)
+    return number
+
+
+def currency(value, field):
+    code = str(value).strip().upper()
+    if code not in SUPPORTED_CURRENCIES:
+        frappe.throw(
+            _("FreedomPay does not support transactions in currency '{0}'").format(value),
+            frappe.ValidationError,
+        )
+    return code
+
+
+def card_number(value, field):
+    digits = "".join(str(value).split()).replace("-", "")
+    if not digits.isdigit() or not 12 <= len(digits) <= 19:
+        # Never echo a card number back in the error
+        frappe.throw(_("Invalid card number"), frappe.ValidationError)
+    return digits
+
+
+def phone(value, field):
+    digits = "".join(char for char in str(value) if char.isdigit())
+    if not digits:
+        _invalid(field, value)
+    return digits
+
+
+def _compile_field(field, script):
+    name = field.name
+    # The pg_* name is accepted too, for callers passing raw gateway fields
+    sources = (field.source, name)
+    normalize = field.normalize
+    required = field.required
+    default = field.default
+
+    def step(data, payload):
+        for source in sources:
+            value = data.get(source)
+            if value is not None and value != "":
+                break
+        else:
+            value = default
+            if value is None:
+                if required:
+                    frappe.throw(
+                        _("{0} is required for FreedomPay {1}").format(field.source, script),
+                        frappe.ValidationError,
+                    )
+                return
+        payload[name] = normalize(value, field) if normalize else value
+
+    return step
+
+
+class RequestSchema:
+    """Fields sent to one gateway script, compiled into a payload builder"""
+
+    def __init__(self, script, fields):
+        self.script = script
+        self.fields = tuple(fields)
+        self.field_names = frozenset(field.name for field in self.fields)
+        self._steps = tuple(_compile_field(field, script) for field in self.fields)
+
+    def build(self, data) -> dict:
+        """Map, normalise and validate ``data`` into the gateway payload.
+
+        ``pg_*`` keys the schema does not declare are passed through unchanged.
+        """
+        payload = {}
+        for step in self._steps:
+            step(data, payload)
+        for key, value in data.items():
+            if key.startswith("pg_") and key not in self.field_names and value is not None:
+                payload[key] = value
+        return payload
+
+    def validate(self, data) -> None:
+        """Raise frappe.ValidationError if ``data`` cannot be sent"""
+        self.build(data)
+
+
+PAYMENT = RequestSchema("init_payment.php", (
+    Field("pg_merchant_id", "merchant_id", text, required=True),
+    Field("pg_amount", "amount", amount, required=True),
+    Field("pg_currency", "currency", currency, default=DEFAULT_CURRENCY),
+    Field("pg_description", "description", text, default=""),
+    Field("pg_order_id", "order_id", text),
+    Field("pg_result_url", "result_url", text, required=True),
+    Field("pg_success_url", "success_url", text),
+    Field("pg_failure_url", "failure_url", text),
+    Field("pg_check_url", "check_url", text),
+    Field("pg_user_id", "user_id", text),
+    Field("pg_user_email", "email", text),
+    Field("pg_user_phone", "phone", phone),
+    Field("pg_lifetime", "lifetime", integer),
+))
+
+STATUS = RequestSchema("get_status.php", (
+    Field("pg_merchant_id", "merchant_id", text, required=True),
+    Field("pg_payment_id", "payment_id", text, required=True),
+))
+
+PAYOUT = RequestSchema("init_payout.php", (
+    Field("pg_merchant_id", "merchant_id", text, required=True),
+    Field("pg_amount", "amount", amount, required=True),
+    Field("pg_currency", "currency", currency, default=DEFAULT_CURRENCY),
+    Field("pg_card_number", "card_number", card_number, required=True),
+    Field("pg_cardholder_name", "cardholder_name", text),
+    Field("pg_post_link", "post_link", text),
+    Field("pg_order_id", "order_id", text),
+))
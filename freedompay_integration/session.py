@@ -0,0 +1,103 @@
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .slow_calls import current
+
+# Keep-alive connections kept per gateway host
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 10
+
+_session = None
+_lock = threading.Lock()
+
+
+class _TimedConnectionMixin:
+    """Records DNS and TCP connect time of new connections for the slow-call log"""
+
+    def _new_conn(self):
+        call = current()
+        if call is None:
+            return super()._new_conn()
+
+        start = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            # Let urllib3 resolve again and raise its usual error
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        call.add("dns", resolved - start)
+
+        host, self._dns_host = self._dns_host, address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+            call.add("connect", time.perf_counter() - resolved)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        call = current()
+        if call is None:
+            return super().connect()
+
+        setup_before = call.phases.get("dns", 0) + call.phases.get("connect", 0)
+        start = time.perf_counter()
+        super().connect()
+        setup = call.phases.get("dns", 0) + call.phases.get("connect", 0) - setup_before
+        call.add("tls", time.perf_counter() - start - setup)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session used for all FreedomPay gateway calls.
+
+    Reusing one session keeps TCP/TLS connections to the gateway alive between
+    calls instead of paying for a new handshake on every request.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = TimedHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def reset_session() -> None:
+    """Close pooled connections and drop the session"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
@@ -0,0 +1,40 @@
+import threading
+
+import frappe
+
+# Decrypted secrets, keyed by site, field and the settings version they were read from
+_secrets = {}
+_lock = threading.Lock()
+
+
+def get_settings():
+    """Return FreedomPay Settings from the document cache"""
+    return frappe.get_cached_doc("FreedomPay Settings")
+
+
+def get_secret(settings, fieldname: str = "secret_key") -> str | None:
+    """Return a decrypted password field of FreedomPay Settings.
+
+    Decryption costs a DB round trip, so the value is kept for the lifetime of
+    the worker. The cache key includes ``settings.modified``: saving the settings
+    changes it, so every worker picks up a rotated key on its next call.
+    """
+    key = (getattr(frappe.local, "site", None), fieldname, str(settings.modified))
+    try:
+        return _secrets[key]
+    except KeyError:
+        pass
+
+    value = settings.get_password(fieldname, raise_exception=False)
+    with _lock:
+        # Drop values read from older versions of the settings
+        for stale in [k for k in _secrets if k[:2] == key[:2]]:
+            del _secrets[stale]
+        _secrets[key] = value
+    return value
+
+
+def clear_cache() -> None:
+    """Forget all cached secrets of this worker"""
+    with _lock:
+        _secrets.clear()
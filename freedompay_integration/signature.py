@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+import random
+import string
+
+
+def script_name_from_url(url: str) -> str:
+    """Script name used in signatures: last path segment of the URL, without query"""
+    return url.split('?')[0].rstrip('/').split('/')[-1]
+
+
+def generate_salt(length: int = 16) -> str:
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def make_signature(script_name: str, data: dict, secret_key: str) -> str:
+    """MD5 signature according to FreedomPay documentation"""
+    # Concatenate: script_name;field1=value1;field2=value2;...;pg_salt=salt_value;secret_key
+    signature_string = script_name + ';'
+    for key in sorted(data.keys()):
+        if key != 'pg_sig':  # Don't include signature in signature calculation
+            signature_string += f"{key}={data[key]};"
+    signature_string += secret_key
+    return hashlib.md5(signature_string.encode('utf-8')).hexdigest()
+
+
+def sign(script_name: str, data: dict, secret_key: str) -> dict:
+    """Add pg_salt and pg_sig to data in place"""
+    data['pg_salt'] = generate_salt()
+    data['pg_sig'] = make_signature(script_name, data, secret_key)
+    return data
+
+
+def verify(script_name: str, data: dict, secret_key: str) -> bool:
+    """Check pg_sig of a request signed by FreedomPay"""
+    received = data.get('pg_sig')
+    if not received or not secret_key:
+        return False
+    return hmac.compare_digest(str(received), make_signature(script_name, data, secret_key))
@@ -0,0 +1,148 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Slow-call log for FreedomPay gateway calls.
+
+Every gateway call made through ``FreedomPayConnection`` or
+``freedompay.api.FreedomPayAPI`` is timed phase by phase:
+
+- ``dns``, ``connect``, ``tls``: only when a new connection was opened
+- ``ttfb``: from sending the request to the response headers
+- ``body``: reading the response body
+- ``parse``: parsing the body (measured for logged calls only, since results
+  parse lazily)
+
+Calls slower than **Slow Call Threshold** are pushed, with the response size
+and the request fields (personal and card data redacted), to a capped list in
+Redis instead of the Error Log. Read the most recent entries with:
+
+    bench --site <site> execute freedompay_integration.slow_calls.get_entries
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint
+
+from .signature import script_name_from_url
+
+LOG_KEY = "freedompay_slow_calls"
+LOG_SIZE = 1000
+DEFAULT_THRESHOLD_MS = 2000
+
+# Fields never written to the log; card numbers keep their last four digits
+REDACTED_FIELDS = ("pg_sig", "pg_user_email", "pg_user_phone", "pg_user_id", "pg_cardholder_name")
+MASKED_FIELDS = ("pg_card_number",)
+
+_current = threading.local()
+
+
+class CallAnatomy:
+    """Phase timings of one gateway call, filled in by the transport"""
+
+    __slots__ = ("started", "phases", "response_size", "status_code", "body")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.response_size = None
+        self.status_code = None
+        self.body = None
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def headers_received(self):
+        """Time to first byte: everything up to the headers not spent opening the connection"""
+        elapsed = time.perf_counter() - self.started
+        setup = sum(self.phases.get(phase, 0) for phase in ("dns", "connect", "tls"))
+        self.phases["ttfb"] = max(elapsed - setup, 0)
+
+    def response_received(self, response):
+        self.status_code = getattr(response, "status_code", None)
+        self.body = response.content
+        self.response_size = len(self.body or b"")
+
+
+def current() -> CallAnatomy | None:
+    """Anatomy of the call running in this thread, if it is being timed"""
+    return getattr(_current, "call", None)
+
+
+@contextmanager
+def track(url, fields=None):
+    """Time the gateway call made inside the block and log it if it was slow"""
+    call = CallAnatomy()
+    _current.call = call
+    try:
+        yield call
+    finally:
+        _current.call = None
+        total = time.perf_counter() - call.started
+        try:
+            if total * 1000 >= _threshold_ms():
+                _log(url, fields, call, total)
+        except Exception:
+            # The log must never break a payment
+            pass
+
+
+def _threshold_ms():
+    from .settings_cache import get_settings
+
+    threshold = get_settings().get("slow_call_threshold")
+    if threshold is None:
+        return DEFAULT_THRESHOLD_MS
+    # 0 turns the log off
+    return cint(threshold) or float("inf")
+
+
+def redact(fields):
+    redacted = {}
+    for key, value in (fields or {}).items():
+        if key in REDACTED_FIELDS:
+            redacted[key] = "***"
+        elif key in MASKED_FIELDS and value:
+            redacted[key] = "*" * max(len(str(value)) - 4, 0) + str(value)[-4:]
+        else:
+            redacted[key] = value
+    return redacted
+
+
+def _log(url, fields, call, total):
+    from .response_feedback import parse_body
+
+    phases = dict(call.phases)
+    if call.body:
+        start = time.perf_counter()
+        parse_body(call.body)
+        phases["parse"] = time.perf_counter() - start
+
+    entry = {
+        "timestamp": time.time(),
+        "endpoint": script_name_from_url(url),
+        "url": url.split("?")[0],
+        "total": round(total, 4),
+        "phases": {phase: round(seconds, 4) for phase, seconds in phases.items()},
+        "response_size": call.response_size,
+        "status_code": call.status_code,
+        "fields": redact(fields),
+    }
+    cache = frappe.cache()
+    key = cache.make_key(LOG_KEY)
+    cache.lpush(key, json.dumps(entry, default=str))
+    cache.ltrim(key, 0, LOG_SIZE - 1)
+
+
+def get_entries(limit: int = 100) -> list[dict]:
+    """Most recent slow calls, newest first"""
+    cache = frappe.cache()
+    return [json.loads(entry) for entry in cache.lrange(cache.make_key(LOG_KEY), 0, cint(limit) - 1)]
+
+
+def clear():
+    cache = frappe.cache()
+    cache.delete(cache.make_key(LOG_KEY))
@@ -1,12 +1,47 @@
 # Test file for FreedomPay Integration
 
+import importlib.util
+import json
+import os
+import tempfile
+import time
 import unittest
+from datetime import datetime
 from unittest.mock import patch, MagicMock
 
-import frappe
+from . import fake_frappe
+
+try:
+    import frappe
+except ImportError:
+    # Outside a bench: run against the in-memory stand-in
+    frappe = fake_frappe.install()
 
 from .freedompay_api import FreedomPayAPI
 from .connection import FreedomPayConnection
+from .settings_cache import get_secret, clear_cache
+from .results import PaymentResult
+from .response_feedback import parse_body
+from .order_index import check_order
+from .signature import sign, verify
+from . import poller
+from .replay import NonceCache, nonce_key
+from . import payout_outbox
+from .profiler import profiled
+from .slow_calls import redact
+from .schemas import PAYMENT, PAYOUT
+from . import bulk_links
+from . import ledger
+from . import aggregates
+from . import authorization_outbox
+from .gateway_errors import ErrorAggregator, error_class
+from . import prefetch
+from . import checkout
+from . import concurrency
+from . import endpoints
+from . import archive
+from .cassette import RecordingTransport, ReplayTransport
+from .query_budget import count_queries, query_budget
 
 
 class TestFreedomPayConnection(unittest.TestCase):
@@ -16,7 +51,7 @@ class TestFreedomPayConnection(unittest.TestCase):
         self.mock_settings.get_password.return_value = "test_secret_key"
         self.mock_settings.base_url = "https://api.freedompay.uz"
 
-    @patch('frappe.get_doc')
+    @patch('frappe.get_cached_doc')
     def test_generate_signature(self, mock_get_doc):
         mock_get_doc.return_value = self.mock_settings
 
@@ -33,6 +68,26 @@ class TestFreedomPayConnection(unittest.TestCase):
         self.assertTrue(signature.isalnum())
 
 
+class TestSettingsCache(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.mock_settings = MagicMock()
+        self.mock_settings.modified = "2026-01-13 15:11:00"
+        self.mock_settings.get_password.return_value = "test_secret_key"
+
+    def test_secret_is_decrypted_once(self):
+        self.assertEqual(get_secret(self.mock_settings, "secret_key"), "test_secret_key")
+        self.assertEqual(get_secret(self.mock_settings, "secret_key"), "test_secret_key")
+        self.mock_settings.get_password.assert_called_once()
+
+    def test_secret_is_reloaded_after_settings_change(self):
+        get_secret(self.mock_settings, "secret_key")
+        self.mock_settings.modified = "2026-02-01 10:00:00"
+        self.mock_settings.get_password.return_value = "rotated_key"
+
+        self.assertEqual(get_secret(self.mock_settings, "secret_key"), "rotated_key")
+
+
 class TestFreedomPayAPI(unittest.TestCase):
     def setUp(self):
         self.mock_settings = MagicMock()
@@ -40,7 +95,7 @@ class TestFreedomPayAPI(unittest.TestCase):
         self.mock_settings.get_password.return_value = "test_secret_key"
         self.mock_settings.base_url = "https://api.freedompay.uz"
 
-    @patch('frappe.get_doc')
+    @patch('frappe.get_cached_doc')
     @patch('freedompay_integration.connection.FreedomPayConnection.post')
     def test_create_payment(self, mock_post, mock_get_doc):
         mock_get_doc.return_value = self.mock_settings
@@ -60,5 +115,853 @@ class TestFreedomPayAPI(unittest.TestCase):
         self.assertEqual(feedback.message, "Payment Created Successfully")
 
 
+class TestResults(unittest.TestCase):
+    body = b'{"pg_status": "ok", "pg_payment_id": "123", "pg_redirect_url": "https://pay", "pg_extra": "x"}'
+
+    def test_result_behaves_like_response_dict(self):
+        payment = PaymentResult(self.body)
+
+        self.assertEqual(payment.redirect_url, "https://pay")
+        self.assertEqual(payment.get("pg_redirect_url"), "https://pay")
+        self.assertEqual(payment["pg_extra"], "x")
+        self.assertEqual(payment.pg_payment_id, "123")
+        self.assertIsNone(payment.get("pg_missing"))
+
+    @patch('freedompay_integration.results.parse_body', wraps=parse_body)
+    def test_body_is_parsed_once(self, mock_parse_body):
+        payment = PaymentResult(self.body)
+
+        self.assertEqual(dict(payment)["pg_extra"], "x")
+        self.assertEqual(len(payment), 4)
+        mock_parse_body.assert_called_once()
+
+    def test_non_object_body_has_no_fields(self):
+        payment = PaymentResult(b'["ok"]')
+
+        self.assertIsNone(payment.get("pg_status"))
+        self.assertEqual(dict(payment), {})
+
+    def test_result_is_immutable(self):
+        payment = PaymentResult(self.body)
+        with self.assertRaises(AttributeError):
+            payment.redirect_url = "https://other"
+        self.assertFalse(hasattr(payment, "__dict__"))
+
+    def test_drop_raw_keeps_declared_fields_only(self):
+        payment = PaymentResult(self.body, keep_raw=False)
+
+        self.assertEqual(payment.payment_id, "123")
+        self.assertIsNone(payment.get("pg_extra"))
+        self.assertEqual(dict(payment), {
+            "pg_status": "ok", "pg_payment_id": "123", "pg_redirect_url": "https://pay"
+        })
+
+
+class TestCheckUrl(unittest.TestCase):
+    @patch('freedompay_integration.order_index.get_order')
+    def test_payable_order_is_accepted(self, mock_get_order):
+        mock_get_order.return_value = ("100.00", "UZS", True, "Payment Request")
+        self.assertEqual(check_order("PR-0001", "100", "UZS"), (True, None))
+
+    @patch('freedompay_integration.order_index.get_order')
+    def test_paid_or_changed_order_is_rejected(self, mock_get_order):
+        mock_get_order.return_value = ("100.00", "UZS", False, "Payment Request")
+        self.assertFalse(check_order("PR-0001", "100", "UZS")[0])
+
+        mock_get_order.return_value = ("100.00", "UZS", True, "Payment Request")
+        self.assertFalse(check_order("PR-0001", "150", "UZS")[0])
+        self.assertFalse(check_order("PR-0001", "100", "USD")[0])
+
+        mock_get_order.return_value = None
+        with patch('freedompay_integration.order_index.load_order', return_value=None):
+            self.assertFalse(check_order("PR-0002", "100", "UZS")[0])
+
+    @patch('freedompay_integration.order_index.index_order')
+    @patch('frappe.db', create=True)
+    @patch('freedompay_integration.order_index.get_order', return_value=None)
+    def test_evicted_order_is_rebuilt_from_the_ledger(self, mock_get_order, mock_db, mock_index_order):
+        mock_db.get_value.return_value = frappe._dict(amount=100, currency="UZS", reference_doctype="Payment Request")
+        mock_db.exists.return_value = None
+
+        self.assertEqual(check_order("PR-0003", "100", "UZS"), (True, None))
+        mock_index_order.assert_called_once_with(
+            "PR-0003", "100.0", "UZS", reference_doctype="Payment Request", payable=True
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec('werkzeug'), 'callbacks answer with werkzeug responses')
+    @patch('freedompay_integration.ledger.update_status')
+    def test_result_for_unknown_order_is_not_acknowledged(self, mock_update_status):
+        from . import callbacks
+
+        with patch.object(callbacks, 'unschedule_payment'), \
+                patch.object(callbacks, 'get_order', return_value=None), \
+                patch.object(callbacks, 'load_order', return_value=None), \
+                patch.object(callbacks, 'authorize') as mock_authorize:
+            with self.assertRaises(frappe.DoesNotExistError):
+                callbacks._process_result({'pg_order_id': 'PR-0009', 'pg_payment_id': 'p9', 'pg_result': '1'})
+        mock_authorize.assert_not_called()
+
+    @unittest.skipUnless(importlib.util.find_spec('werkzeug'), 'callbacks answer with werkzeug responses')
+    @patch('frappe.log_error')
+    @patch('frappe.db', create=True)
+    def test_result_is_not_marked_when_the_commit_fails(self, mock_db, mock_log_error):
+        from . import callbacks
+
+        mock_db.commit.side_effect = Exception('Deadlock found')
+        with patch.object(callbacks, '_callback_data', return_value={'pg_order_id': 'PR-0001'}), \
+                patch.object(callbacks, '_script_name', return_value='result'), \
+                patch.object(callbacks, 'get_settings'), \
+                patch.object(callbacks, 'get_secret', return_value='secret'), \
+                patch.object(callbacks, 'verify', return_value=True), \
+                patch.object(callbacks, '_process_result'), \
+                patch.object(callbacks, '_signed_response', side_effect=lambda script, fields, key: fields), \
+                patch.object(callbacks, 'callback_nonces') as mock_nonces:
+            mock_nonces.seen.return_value = False
+            mock_nonces.claim.return_value = True
+
+            self.assertEqual(callbacks.result()['pg_status'], 'error')
+        mock_nonces.mark.assert_not_called()
+        mock_nonces.release.assert_called_once()
+
+    def test_signature_round_trip(self):
+        data = sign("check", {"pg_order_id": "PR-0001", "pg_amount": "100"}, "test_secret_key")
+
+        self.assertTrue(verify("check", data, "test_secret_key"))
+        data["pg_amount"] = "1"
+        self.assertFalse(verify("check", data, "test_secret_key"))
+
+
+class TestPoller(unittest.TestCase):
+    def test_backoff_grows_to_hourly(self):
+        delays = [poller.next_delay(attempt) for attempt in range(12)]
+
+        self.assertLess(delays[0], 60)
+        self.assertGreater(delays[3], delays[2])
+        self.assertTrue(all(delay <= poller.MAX_DELAY * 1.1 for delay in delays))
+        self.assertGreater(delays[-1], poller.MAX_DELAY * 0.9)
+
+    @patch('freedompay_integration.poller._finish')
+    @patch('freedompay_integration.poller._reschedule')
+    def test_polling_stops_at_terminal_state(self, mock_reschedule, mock_finish):
+        api = MagicMock()
+        api.check_payment_status.return_value = ("SUCCESS", {"pg_transaction_status": "ok"}, MagicMock())
+
+        poller.poll_payment(api, "pay_1")
+        mock_finish.assert_called_once()
+        mock_reschedule.assert_not_called()
+
+        mock_finish.reset_mock()
+        api.check_payment_status.return_value = ("SUCCESS", {"pg_transaction_status": "pending"}, MagicMock())
+        entry = (1, poller.time.time())
+        with patch('freedompay_integration.poller._attempts', return_value=entry):
+            poller.poll_payment(api, "pay_1")
+        mock_finish.assert_not_called()
+        mock_reschedule.assert_called_once_with("pay_1", entry)
+
+    @patch('freedompay_integration.poller._finish')
+    @patch('freedompay_integration.poller._reschedule')
+    @patch('freedompay_integration.poller._attempts', return_value=None)
+    def test_payment_without_schedule_is_abandoned(self, mock_attempts, mock_reschedule, mock_finish):
+        api = MagicMock()
+        api.check_payment_status.return_value = ("SUCCESS", {"pg_transaction_status": "pending"}, MagicMock())
+
+        poller.poll_payment(api, "pay_1")
+        mock_finish.assert_called_once_with("pay_1", "abandoned", {"pg_transaction_status": "pending"})
+        mock_reschedule.assert_not_called()
+
+    @patch('freedompay_integration.poller.schedule_payment')
+    @patch('frappe.cache')
+    def test_opened_link_is_scheduled_once(self, mock_cache, mock_schedule):
+        mock_cache.return_value.hget.return_value = None
+        poller.ensure_scheduled("pay_1")
+        mock_schedule.assert_called_once_with("pay_1")
+
+        mock_cache.return_value.hget.return_value = (2, poller.time.time())
+        poller.ensure_scheduled("pay_1")
+        mock_schedule.assert_called_once()
+
+
+class TestReplayProtection(unittest.TestCase):
+    callback = {"pg_payment_id": "pay_1", "pg_salt": "abc", "pg_sig": "0" * 32}
+
+    @patch('frappe.cache')
+    def test_replayed_callback_is_detected_locally(self, mock_cache):
+        mock_cache.return_value.get.return_value = None
+        nonces = NonceCache(size=2)
+        key = nonce_key(self.callback)
+
+        self.assertFalse(nonces.seen(key))
+        nonces.mark(key)
+        self.assertTrue(nonces.seen(key))
+        mock_cache.return_value.get.assert_called_once()
+
+    @patch('frappe.cache')
+    def test_replay_seen_by_another_worker(self, mock_cache):
+        # The shared store already holds the key
+        mock_cache.return_value.get.return_value = b"1"
+        self.assertTrue(NonceCache().seen(nonce_key(self.callback)))
+
+    @patch('frappe.cache')
+    def test_callback_is_not_marked_until_processed(self, mock_cache):
+        mock_cache.return_value.get.return_value = None
+        mock_cache.return_value.set.return_value = True
+        nonces = NonceCache()
+        key = nonce_key(self.callback)
+
+        self.assertTrue(nonces.claim(key))
+        nonces.release(key)
+        self.assertFalse(nonces.seen(key))
+
+    @patch('frappe.cache')
+    def test_local_cache_is_bounded(self, mock_cache):
+        nonces = NonceCache(size=2)
+        for payment_id in ("pay_1", "pay_2", "pay_3"):
+            nonces.mark(nonce_key(dict(self.callback, pg_payment_id=payment_id)))
+
+        self.assertEqual(len(nonces._local), 2)
+
+
+class TestPayoutOutbox(unittest.TestCase):
+    def setUp(self):
+        self.doc = MagicMock()
+        self.doc.name = "FPO-0000001"
+        self.doc.attempts = 0
+        self.api = MagicMock()
+
+    def test_sent_payout_is_marked_sent(self):
+        self.api.create_payout.return_value = ("SUCCESS", {"pg_status": "ok", "pg_payment_id": "p1"}, MagicMock())
+
+        status, payout = payout_outbox.send(self.doc, self.api)
+
+        self.assertEqual(status, payout_outbox.SENT)
+        self.assertEqual(self.api.create_payout.call_args[0][0]["order_id"], "FPO-0000001")
+        self.assertEqual(self.doc.db_set.call_args[0][0]["payment_id"], "p1")
+
+    @patch('frappe.enqueue')
+    @patch('freedompay_integration.payout_outbox.gateway_is_down', return_value=False)
+    @patch('freedompay_integration.payout_outbox.send')
+    @patch('freedompay_integration.payout_outbox.enqueue_payout')
+    def test_payout_is_sent_after_commit(self, mock_enqueue_payout, mock_send, mock_down, mock_enqueue):
+        self.assertIs(payout_outbox.create_payout({"amount": 10}), mock_enqueue_payout.return_value)
+
+        mock_send.assert_not_called()
+        self.assertEqual(mock_enqueue.call_args[0][0], "freedompay_integration.payout_outbox.drain")
+        self.assertTrue(mock_enqueue.call_args[1]["enqueue_after_commit"])
+
+    @patch('freedompay_integration.payout_outbox.mark_gateway_down')
+    def test_unreachable_gateway_keeps_payout_queued(self, mock_mark_down):
+        self.api.create_payout.return_value = ("ERROR", {}, MagicMock(error="Connection refused"))
+
+        status, payout = payout_outbox.send(self.doc, self.api)
+
+        self.assertEqual(status, payout_outbox.QUEUED)
+        self.assertIsNone(payout)
+        mock_mark_down.assert_called_once()
+        self.assertEqual(self.doc.db_set.call_args[0][0]["status"], payout_outbox.QUEUED)
+
+    @patch('frappe.log_error')
+    def test_rejected_payout_is_not_retried(self, mock_log_error):
+        self.api.create_payout.return_value = ("FAILED", {}, MagicMock(error="Bad card", status_code=400))
+
+        status, payout = payout_outbox.send(self.doc, self.api)
+
+        self.assertEqual(status, payout_outbox.FAILED_STATUS)
+
+
+class TestProfiler(unittest.TestCase):
+    @patch('freedompay_integration.profiler.Sampler')
+    @patch('freedompay_integration.profiler.get_settings')
+    def test_profiler_is_skipped_when_disabled(self, mock_get_settings, mock_sampler):
+        mock_get_settings.return_value.get.return_value = 0
+
+        self.assertEqual(profiled("create_payment")(lambda: "paid")(), "paid")
+        mock_sampler.assert_not_called()
+
+    @patch('freedompay_integration.profiler._store')
+    @patch('freedompay_integration.profiler.get_settings')
+    def test_sampled_call_is_stored(self, mock_get_settings, mock_store):
+        mock_get_settings.return_value.get.return_value = 100
+
+        self.assertEqual(profiled("create_payment")(lambda: "paid")(), "paid")
+        mock_store.assert_called_once()
+        self.assertEqual(mock_store.call_args[0][0], "create_payment")
+
+
+class TestSlowCalls(unittest.TestCase):
+    def test_card_and_personal_data_are_redacted(self):
+        fields = redact({
+            'pg_amount': '100',
+            'pg_card_number': '8600123412341234',
+            'pg_user_phone': '998901234567',
+            'pg_sig': 'abc',
+        })
+
+        self.assertEqual(fields['pg_amount'], '100')
+        self.assertEqual(fields['pg_card_number'], '************1234')
+        self.assertEqual(fields['pg_user_phone'], '***')
+        self.assertEqual(fields['pg_sig'], '***')
+
+
+class TestSchemas(unittest.TestCase):
+    def test_payment_payload_is_normalised(self):
+        payload = PAYMENT.build({
+            'merchant_id': 123,
+            'amount': '1500,5',
+            'currency': 'usd',
+            'result_url': 'https://erp.local/result',
+            'phone': '+998 90 123-45-67',
+            'email': None,
+            'pg_lifetime': 3600,
+        })
+
+        self.assertEqual(payload['pg_merchant_id'], '123')
+        self.assertEqual(payload['pg_amount'], '1500.50')
+        self.assertEqual(payload['pg_currency'], 'USD')
+        self.assertEqual(payload['pg_user_phone'], '998901234567')
+        self.assertEqual(payload['pg_description'], '')
+        self.assertEqual(payload['pg_lifetime'], 3600)
+        self.assertNotIn('pg_user_email', payload)
+
+    def test_invalid_payloads_are_rejected(self):
+        valid = {'merchant_id': '1', 'amount': '10', 'card_number': '8600 1234 1234 1234'}
+
+        self.assertEqual(PAYOUT.build(valid)['pg_card_number'], '8600123412341234')
+        for change in ({'amount': '-5'}, {'currency': 'KZT'}, {'card_number': '1234'}, {'amount': None}):
+            with self.assertRaises(frappe.ValidationError):
+                PAYOUT.build({**valid, **change})
+
+
+class TestBulkLinks(unittest.TestCase):
+    @patch('freedompay_integration.bulk_links._save_outcomes')
+    @patch('freedompay_integration.bulk_links._insert_logs')
+    @patch('freedompay_integration.bulk_links.get_transport')
+    @patch('freedompay_integration.bulk_links.get_secret')
+    @patch('freedompay_integration.bulk_links.FreedomPayAPI')
+    def test_links_are_streamed(self, mock_api, mock_get_secret, mock_get_transport, mock_insert, mock_save):
+        mock_api.return_value.settings.get.return_value = 0
+        mock_api.return_value.urls.create_payment.return_value = "https://api.freedompay.uz/init_payment.php"
+        mock_api.return_value.payment_payload.side_effect = lambda data: PAYMENT.build(
+            {**data, 'merchant_id': '1', 'result_url': 'https://erp.local/result'}
+        )
+        mock_get_secret.return_value = "secret"
+        mock_get_transport.return_value.post.return_value = MagicMock(
+            status_code=200, content=b'{"pg_status": "ok", "pg_payment_id": "p1", "pg_redirect_url": "https://pay"}'
+        )
+
+        links = list(bulk_links.generate_payment_links([
+            {'amount': 100, 'reference_doctype': 'Sales Invoice', 'reference_docname': 'SINV-1'},
+            {'amount': 'abc', 'reference_doctype': 'Sales Invoice', 'reference_docname': 'SINV-2'},
+        ], rate_limit=1000, concurrency=2))
+
+        self.assertEqual([link.reference_docname for link in links], ['SINV-2', 'SINV-1'])
+        self.assertEqual(links[0].status, bulk_links.FAILED)
+        self.assertEqual(links[1].redirect_to, "https://pay")
+        sent = mock_get_transport.return_value.post.call_args[1]['data']
+        self.assertEqual(sent['pg_order_id'], 'SINV-1')
+        self.assertIn('pg_sig', sent)
+        mock_insert.assert_called_once()
+        mock_save.assert_called_once()
+
+
+class TestLedger(unittest.TestCase):
+    payload = {'pg_merchant_id': '1', 'pg_order_id': 'SINV-1', 'pg_amount': '100.00', 'pg_currency': 'UZS'}
+
+    def test_created_payment_is_pending(self):
+        row = ledger.row(ledger.PAYMENT, self.payload, {'pg_status': 'ok', 'pg_payment_id': 'p1'},
+                         reference_doctype='Sales Invoice')
+
+        self.assertEqual(row['status'], ledger.PENDING)
+        self.assertEqual(row['payment_id'], 'p1')
+        self.assertEqual(row['reference_name'], 'SINV-1')
+
+    def test_rejected_payment_keeps_gateway_error(self):
+        row = ledger.row(ledger.PAYMENT, self.payload, {'pg_status': 'error', 'pg_error_description': 'Bad amount'})
+
+        self.assertEqual(row['status'], ledger.FAILED)
+        self.assertEqual(row['error'], 'Bad amount')
+        self.assertEqual(ledger.status_for('Refunded'), ledger.REFUNDED)
+
+
+class TestAggregates(unittest.TestCase):
+    @patch('frappe.enqueue')
+    def test_status_change_moves_counters(self, mock_enqueue):
+        transaction = frappe._dict(
+            status='Pending', amount=100, currency='UZS', merchant_id='1', transaction_type='Payment',
+            creation='2026-10-19 10:00:00', paid_at=None,
+        )
+
+        aggregates.change(transaction, 'Paid', paid_at='2026-10-19 10:03:00')
+
+        # Applied by a job once the caller commits
+        self.assertTrue(mock_enqueue.call_args[1]['enqueue_after_commit'])
+        [(key, values)] = mock_enqueue.call_args[1]['deltas']
+        self.assertEqual(key, ('2026-10-19', '1', 'UZS', 'Payment'))
+        self.assertEqual(values['paid_count'], 1)
+        self.assertEqual(values['paid_amount'], 100)
+        self.assertEqual(values['latency_5m'], 1)
+        self.assertNotIn('created_count', values)
+
+    def test_refund_keeps_payment_counted_as_paid(self):
+        values = aggregates.contribution('Refunded', 50)
+
+        self.assertEqual(values['paid_count'], 1)
+        self.assertEqual(values['refunded_amount'], 50)
+        self.assertNotIn('failed_count', values)
+
+
+class TestAuthorizationOutbox(unittest.TestCase):
+    @patch('freedompay_integration.authorization_outbox._unlock')
+    @patch('freedompay_integration.authorization_outbox._lock', return_value=True)
+    @patch('freedompay_integration.authorization_outbox.run')
+    @patch('frappe.db', create=True)
+    @patch('frappe.get_all', create=True)
+    def test_rows_of_a_document_wait_for_earlier_rows(self, mock_get_all, mock_db, mock_run, mock_lock, mock_unlock):
+        later = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=600)
+        mock_get_all.return_value = [
+            frappe._dict(name='FPA-1', reference_doctype='Sales Invoice', reference_name='SINV-1', next_attempt_at=later),
+            frappe._dict(name='FPA-2', reference_doctype='Sales Invoice', reference_name='SINV-2', next_attempt_at=None),
+            frappe._dict(name='FPA-3', reference_doctype='Sales Invoice', reference_name='SINV-1', next_attempt_at=None),
+        ]
+        mock_db.get_value.return_value = authorization_outbox.QUEUED
+        mock_run.return_value = True
+
+        self.assertEqual(authorization_outbox.drain(), 1)
+        mock_run.assert_called_once_with('FPA-2')
+
+    @patch('freedompay_integration.authorization_outbox.enqueue_authorization')
+    @patch('freedompay_integration.authorization_outbox.get_settings')
+    def test_deferred_authorization_is_queued(self, mock_get_settings, mock_enqueue):
+        mock_get_settings.return_value.get.return_value = 1
+
+        self.assertIsNone(authorization_outbox.authorize('Sales Invoice', 'SINV-1'))
+        mock_enqueue.assert_called_once_with('Sales Invoice', 'SINV-1', 'Completed')
+
+    @patch('frappe.db', create=True)
+    @patch('frappe.get_doc')
+    def test_run_restores_ignore_permissions(self, mock_get_doc, mock_db):
+        mock_get_doc.return_value.payment_status = 'Completed'
+        frappe.flags.ignore_permissions = True
+        try:
+            self.assertTrue(authorization_outbox.run('FPA-1'))
+            self.assertTrue(frappe.flags.ignore_permissions)
+        finally:
+            frappe.flags.ignore_permissions = False
+
+
+class TestGatewayErrors(unittest.TestCase):
+    def test_repeated_failures_are_counted_once_per_window(self):
+        aggregator = ErrorAggregator(window=60, sample_size=2)
+        fingerprint = ('site', 'init_payment.php', error_class('HTTP 502 for order 1234'))
+
+        written = [aggregator.record(fingerprint, 'title', f'sample {i}') for i in range(10)]
+
+        self.assertEqual(written, [True] + [False] * 9)
+        self.assertEqual(aggregator.due('site'), [])
+        started = aggregator._buckets[fingerprint].started
+        [(_, bucket)] = aggregator.due('site', now=started + 60)
+        self.assertEqual(bucket.count, 9)
+        self.assertEqual(bucket.samples, ['sample 1', 'sample 2'])
+
+    def test_error_class_ignores_ids(self):
+        self.assertEqual(error_class('HTTP 502 for order 1234'), error_class('HTTP 502 for order 98765'))
+        self.assertNotEqual(error_class('HTTP 502'), error_class('HTTP 503'))
+        self.assertEqual(error_class(ConnectionError('refused')), 'ConnectionError')
+
+    @patch('freedompay_integration.gateway_errors.flush_due')
+    @patch('frappe.log_error')
+    def test_long_title_is_truncated_not_swapped(self, mock_log_error, mock_flush_due):
+        from .gateway_errors import aggregator, log_gateway_error
+
+        aggregator._buckets.clear()
+        log_gateway_error('Connection refused', 'init_payment.php', title='FreedomPay ' + 'x' * 300)
+
+        kwargs = mock_log_error.call_args[1]
+        self.assertEqual(len(kwargs['title']), 140)
+        self.assertEqual(kwargs['message'], 'Connection refused')
+
+
+@patch('freedompay_integration.prefetch.get_order', return_value=None)
+@patch('freedompay_integration.prefetch._enqueue')
+@patch('freedompay_integration.prefetch.ensure_scheduled')
+@patch('freedompay_integration.prefetch.get_settings')
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        frappe.cache().set_value(
+            prefetch.CACHE_KEY.format('Payment Request', 'PR-1'),
+            ('https://pay/1', 'p1', '100.0', 'UZS', time.time() + 86400),
+        )
+
+    def test_matching_link_is_used(self, mock_get_settings, mock_schedule, mock_enqueue, mock_get_order):
+        mock_get_settings.return_value.get.return_value = 1
+
+        self.assertEqual(prefetch.take_link('Payment Request', 'PR-1', 100, 'UZS'), 'https://pay/1')
+        mock_schedule.assert_called_once_with('p1')
+        mock_enqueue.assert_not_called()
+
+    def test_changed_amount_is_refetched(self, mock_get_settings, mock_schedule, mock_enqueue, mock_get_order):
+        mock_get_settings.return_value.get.return_value = 1
+
+        self.assertIsNone(prefetch.take_link('Payment Request', 'PR-1', 60, 'UZS'))
+        mock_enqueue.assert_called_once_with('Payment Request', 'PR-1')
+        self.assertIsNone(frappe.cache().get_value(prefetch.CACHE_KEY.format('Payment Request', 'PR-1')))
+
+
+class TestAsyncCheckout(unittest.TestCase):
+    @patch('frappe.enqueue')
+    def test_checkout_returns_pending_page(self, mock_enqueue):
+        integration_request = MagicMock()
+        integration_request.name = 'IR-1'
+
+        result = checkout.start(integration_request)
+
+        self.assertEqual(result['status'], 'Queued')
+        self.assertTrue(result['redirect_to'].startswith(checkout.PENDING_PAGE))
+        self.assertTrue(mock_enqueue.call_args[1]['enqueue_after_commit'])
+
+    @patch('frappe.publish_realtime', create=True)
+    def test_result_is_pushed_and_kept(self, mock_publish):
+        checkout.publish('IR-1', {'redirect_to': 'https://pay', 'status': 'Completed', 'extra': 1})
+
+        mock_publish.assert_called_once_with(
+            checkout.EVENT, {'redirect_to': 'https://pay', 'status': 'Completed'}, task_id='IR-1', after_commit=True
+        )
+        self.assertEqual(checkout.get_status('IR-1')['redirect_to'], 'https://pay')
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    @patch('frappe.cache')
+    def test_stale_worker_metrics_are_dropped(self, mock_cache):
+        fresh = {'metrics': {}, 'at': time.time()}
+        mock_cache.return_value.hgetall.return_value = {
+            'web:1': fresh, 'web:2': {'metrics': {}, 'at': time.time() - concurrency.METRICS_TTL - 1},
+        }
+
+        self.assertEqual(concurrency.get_all_metrics(), {'web:1': fresh})
+        mock_cache.return_value.hdel.assert_called_once_with(concurrency.METRICS_CACHE_KEY, 'web:2')
+
+    def test_limit_grows_while_latency_is_flat(self):
+        limiter = concurrency.AdaptiveLimiter(max_limit=10, initial=2)
+
+        for _ in range(20):
+            self.assertTrue(limiter.acquire(timeout=0))
+            self.assertTrue(limiter.acquire(timeout=0))
+            limiter.release(0.1)
+            limiter.release(0.1)
+
+        self.assertGreater(limiter.limit, 2)
+        self.assertLessEqual(limiter.limit, 10)
+
+    def test_limit_backs_off_on_errors_and_slow_calls(self):
+        limiter = concurrency.AdaptiveLimiter(max_limit=10, initial=8)
+        limiter.acquire()
+        limiter.release(0.1)
+
+        limiter.acquire()
+        limiter.release(1.0)
+        self.assertAlmostEqual(limiter.limit, 8 * concurrency.BACKOFF)
+
+        # Within the cooldown a second failure does not cut it again
+        limiter.acquire()
+        limiter.release(0.1, failed=True)
+        self.assertAlmostEqual(limiter.limit, 8 * concurrency.BACKOFF)
+        self.assertEqual(limiter.metrics()['errors'], 1)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = concurrency.AdaptiveLimiter(max_limit=1, initial=1)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0.01))
+
+
+class TestEndpointFailover(unittest.TestCase):
+    def setUp(self):
+        self.router = endpoints.EndpointRouter(['https://a.example', 'https://b.example'])
+
+    def test_status_check_fails_over_to_next_endpoint(self):
+        sent = []
+
+        def send(url):
+            sent.append(url)
+            return MagicMock(status_code=502 if url.startswith('https://a.') else 200)
+
+        response = self.router.send('https://a.example/get_status.php', send)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sent, ['https://a.example/get_status.php', 'https://b.example/get_status.php'])
+
+    def test_payment_is_not_resent_once_it_may_have_arrived(self):
+        send = MagicMock(side_effect=ConnectionError('Read timed out'))
+
+        with self.assertRaises(ConnectionError):
+            self.router.send('https://a.example/init_payment.php', send)
+        send.assert_called_once()
+
+    def test_payment_fails_over_when_connecting_failed(self):
+        send = MagicMock(side_effect=[ConnectionError('NewConnectionError: refused'), MagicMock(status_code=200)])
+
+        self.router.send('https://a.example/init_payment.php', send)
+
+        self.assertEqual(send.call_args[0][0], 'https://b.example/init_payment.php')
+
+    def test_unhealthy_endpoint_is_tried_last(self):
+        first = self.router.endpoints[0]
+        for _ in range(endpoints.FAILURE_THRESHOLD):
+            self.router.record(first, 0.1, failed=True)
+
+        self.assertEqual(self.router.candidates()[0].base_url, 'https://b.example')
+
+
+class TestArchive(unittest.TestCase):
+    @patch('freedompay_integration.archive.BLOCK_SIZE', 2)
+    def test_archived_requests_are_found_by_order_and_payment(self):
+        rows = [
+            {'name': f'IR-{i}', 'status': 'Completed', 'reference_docname': f'SINV-{i}',
+             'data': json.dumps({'order_id': f'SINV-{i}'}), 'output': json.dumps({'pg_payment_id': f'P{i}'})}
+            for i in range(5)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            archive.write_segment(rows, directory)
+
+            self.assertEqual(archive.find('P3', directory)[0]['name'], 'IR-3')
+            self.assertEqual(archive.get_archived_request('IR-4', directory)['reference_docname'], 'SINV-4')
+            self.assertEqual(archive.find('missing', directory), [])
+            self.assertFalse([name for name in os.listdir(directory) if name.endswith('.tmp')])
+
+
+class TestCassette(unittest.TestCase):
+    def test_recorded_traffic_is_redacted_and_replayed(self):
+        inner = MagicMock()
+        inner.post.return_value = MagicMock(
+            status_code=200, headers={'Content-Type': 'application/json'},
+            text='{"pg_status": "ok", "pg_payment_id": "p1", "pg_card_pan": "8600123412341234"}',
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cassette.json')
+            recorder = RecordingTransport(path, inner)
+            recorder.post('https://api.freedompay.uz/init_payout.php', data={
+                'pg_card_number': '8600123412341234', 'pg_sig': 'abc', 'pg_amount': '10.00',
+            })
+            recorder.save()
+
+            with open(path) as cassette:
+                recorded = cassette.read()
+            self.assertNotIn('8600123412341234', recorded)
+            self.assertNotIn('"abc"', recorded)
+
+            replay = ReplayTransport(path, speed=0)
+            response = replay.post('https://other.host/init_payout.php', data={})
+            self.assertEqual(response.json()['pg_payment_id'], 'p1')
+            # Loops over the recorded calls of the endpoint, keeping payment ids distinct
+            self.assertEqual(replay.post('https://other.host/init_payout.php').json()['pg_payment_id'], 'p1-1')
+
+
+class _Settings(frappe._dict):
+    def get_password(self, fieldname, raise_exception=True):
+        return "test_secret_key"
+
+
+class _Doc:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def get(self, key, default=None):
+        return self.__dict__.get(key, default)
+
+    def insert(self, **kwargs):
+        return self
+
+
+class TestQueryBudgets(unittest.TestCase):
+    """Round trips of the payment hot paths with warm settings and secrets"""
+
+    def setUp(self):
+        clear_cache()
+        self.settings = _Settings(
+            merchant_id='545000', base_url='https://api.freedompay.uz', modified='2026-01-01',
+            result_url='https://erp.local/result', check_url='https://erp.local/check',
+            poll_pending_payments=1,
+        )
+        self.transaction = frappe._dict(
+            name='T1', status='Pending', paid_at=None, creation=datetime(2026, 1, 1), amount=100,
+            currency='UZS', merchant_id='545000', transaction_type='Payment',
+        )
+
+    def _api(self, body):
+        transport = MagicMock()
+        transport.post.return_value = MagicMock(status_code=200, content=body)
+        return FreedomPayAPI(transport=transport)
+
+    @patch('frappe.get_doc', side_effect=_Doc)
+    @patch('frappe.db', create=True)
+    @patch('frappe.get_cached_doc')
+    def test_checkout_payment(self, mock_get_cached_doc, mock_db, mock_get_doc):
+        mock_get_cached_doc.return_value = self.settings
+        mock_db.exists.return_value = True
+        api = self._api(b'{"pg_status": "ok", "pg_payment_id": "p1", "pg_redirect_url": "https://pay"}')
+
+        # The first call of a worker also records its timing
+        api.create_payment({'amount': '100', 'order_id': 'SINV-1'})
+
+        with query_budget(db=3, writes=2, redis=3):
+            code, payment, feedback = api.create_payment({'amount': '100', 'order_id': 'SINV-1'})
+        self.assertEqual(code, 'SUCCESS')
+
+    def test_statements_are_counted_at_every_depth(self):
+        class Database:
+            def sql(self, query, values=()):
+                return []
+
+            def get_value(self, doctype, name, fieldname):
+                self.sql(f"select `{fieldname}` from `tab{doctype}` where name=%s", (name,))
+                return self.sql(f"select `{fieldname}` from `tab{doctype}` where name=%s", (name,))
+
+        with patch('frappe.db', Database(), create=True):
+            with count_queries() as log:
+                frappe.db.get_value('FreedomPay Transaction', 'T1', 'status')
+                frappe.db.sql("update `tabFreedomPay Transaction` set status='Paid'")
+            self.assertNotIn('sql', vars(frappe.db))
+
+        self.assertEqual([call.category for call in log.calls], [
+            'db.sql SELECT FreedomPay Transaction', 'db.sql SELECT FreedomPay Transaction',
+            'db.sql UPDATE FreedomPay Transaction',
+        ])
+        self.assertEqual(len(log.writes), 1)
+
+    @patch('frappe.db', create=True)
+    @patch('frappe.get_cached_doc')
+    def test_status_check(self, mock_get_cached_doc, mock_db):
+        mock_get_cached_doc.return_value = self.settings
+        mock_db.get_value.return_value = self.transaction
+        mock_db.exists.return_value = True
+        api = self._api(b'{"pg_status": "ok", "pg_payment_id": "p1", "pg_transaction_status": "ok"}')
+
+        api.check_payment_status('p1')
+
+        with query_budget(db=4, writes=2, redis=0):
+            api.check_payment_status('p1')
+
+    @unittest.skipUnless(importlib.util.find_spec('werkzeug'), 'callbacks answer with werkzeug responses')
+    @patch('frappe.get_doc', side_effect=_Doc)
+    @patch('frappe.enqueue')
+    @patch('frappe.db', create=True)
+    @patch('frappe.get_cached_doc')
+    def test_result_callback(self, mock_get_cached_doc, mock_db, mock_enqueue, mock_get_doc):
+        from .callbacks import _process_result
+
+        mock_get_cached_doc.return_value = _Settings(self.settings, defer_payment_authorized=1)
+        mock_db.get_value.return_value = self.transaction
+        mock_db.exists.return_value = True
+        frappe.cache().set_value('freedompay_order:SINV-1', ('100', 'UZS', True, 'Sales Invoice'))
+
+        with query_budget(db=5, writes=3, redis=4):
+            _process_result({'pg_order_id': 'SINV-1', 'pg_payment_id': 'p1', 'pg_result': '1'})
+
+
+@unittest.skipUnless(fake_frappe.is_installed(), 'runs against the in-memory Frappe stand-in only')
+class TestWithFakeFrappe(unittest.TestCase):
+    """End to end against the in-memory Frappe and the local gateway stand-in, no mocks"""
+
+    @classmethod
+    def setUpClass(cls):
+        from benchmarks.gateway_standin import StandInGateway
+
+        cls.gateway = StandInGateway(latency=0).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        fake_frappe.reset()
+        clear_cache()
+        frappe.get_doc({
+            'doctype': 'FreedomPay Settings', 'merchant_id': '545000', 'base_url': self.gateway.url,
+            'result_url': 'https://erp.local/result', 'poll_pending_payments': 0, 'bulk_rate_limit': 1000,
+        }).db_insert()
+        fake_frappe.set_password('FreedomPay Settings', 'FreedomPay Settings', 'secret_key', 'test_secret_key')
+
+    def test_documents(self):
+        settings = frappe.get_doc('FreedomPay Settings')
+        self.assertEqual(settings.get_password('secret_key'), 'test_secret_key')
+
+        from frappe.integrations.utils import create_request_log
+
+        request = create_request_log({'amount': 100}, service_name='FreedomPay')
+        request.db_set('status', 'Completed', update_modified=False)
+        self.assertEqual(frappe.db.get_value('Integration Request', request.name, 'status'), 'Completed')
+        self.assertEqual(frappe.get_all('Integration Request', filters={'status': ['in', ['Completed']]}, pluck='name'),
+                         [request.name])
+        with self.assertRaises(frappe.ValidationError):
+            frappe.throw('Invalid')
+
+    def test_payment_round_trip(self):
+        api = FreedomPayAPI()
+        code, payment, feedback = api.create_payment({'amount': '100', 'currency': 'UZS', 'order_id': 'SINV-1'})
+        self.assertEqual(code, 'SUCCESS', feedback.error)
+
+        code, status, feedback = api.check_payment_status(payment.get('pg_payment_id'))
+        self.assertEqual(code, 'SUCCESS', feedback.error)
+        self.assertEqual(status.get('pg_transaction_status'), 'ok')
+        self.assertEqual(frappe.get_all(ledger.DOCTYPE, pluck='payment_id'), [payment.get('pg_payment_id')])
+
+    def test_checkout_query_budget(self):
+        from .doctype.freedompay_settings.freedompay_settings import FreedomPaySettings
+
+        def checkout(number):
+            return frappe.get_doc('FreedomPay Settings').create_request({
+                'amount': 100, 'currency': 'UZS', 'reference_doctype': 'Sales Invoice',
+                'reference_docname': f'SINV-{number}', 'payer_email': 'customer@example.com',
+            })
+
+        with patch.dict(fake_frappe.controllers, {'FreedomPay Settings': FreedomPaySettings}):
+            # The first checkout of a worker also reads the secret key
+            with query_budget(db=15, writes=3, redis=1):
+                self.assertEqual(checkout(1)['status'], 'Completed')
+            # Settings lookups, the Integration Request insert and commit, the ledger row and the status update
+            with query_budget(db=14, writes=3, redis=0):
+                self.assertEqual(checkout(2)['status'], 'Completed')
+
+    def test_archived_requests_take_their_files(self):
+        old = datetime(2026, 1, 1)
+        for name in ('IR-1', 'IR-2'):
+            frappe.get_doc({
+                'doctype': 'Integration Request', 'name': name, 'integration_request_service': 'FreedomPay',
+                'status': 'Completed', 'creation': old, 'modified': old,
+            }).db_insert()
+            frappe.get_doc({
+                'doctype': 'File', 'file_name': f'profile-{name}.folded',
+                'attached_to_doctype': 'Integration Request', 'attached_to_name': name,
+            }).db_insert()
+        frappe.get_doc({'doctype': 'File', 'file_name': 'logo.png'}).db_insert()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('freedompay_integration.archive.archive_dir', return_value=directory):
+            self.assertEqual(archive.archive_integration_requests(days=30), 2)
+
+        self.assertEqual(frappe.get_all('File', pluck='file_name'), ['logo.png'])
+
+    def test_bulk_links(self):
+        links = list(bulk_links.generate_payment_links([
+            {'amount': 100, 'reference_doctype': 'Sales Invoice', 'reference_docname': f'SINV-{number}'}
+            for number in range(40)
+        ], concurrency=8, chunk_size=16))
+
+        self.assertEqual({link.status for link in links}, {bulk_links.COMPLETED})
+        self.assertEqual(frappe.db.count('Integration Request', {'status': bulk_links.COMPLETED}), 40)
+        self.assertEqual(frappe.db.count(ledger.DOCTYPE), 40)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_hook_modules_do_not_load_the_http_stack(self):
+        from benchmarks.import_time import heavy_imports, hook_modules
+
+        # Loaded by every worker on boot, with or without FreedomPay set up
+        self.assertEqual(heavy_imports(hook_modules()), [])
+
+    def test_legacy_client_loads_the_transport_on_first_call(self):
+        from benchmarks.import_time import heavy_imports
+
+        self.assertEqual(heavy_imports(['freedompay.api']), [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,186 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""HTTP transports for FreedomPay gateway calls.
+
+``FreedomPayConnection`` and ``freedompay.api.FreedomPayAPI`` send requests
+through a transport picked by the **Transport** field of FreedomPay Settings:
+
+- ``requests`` (default): pooled HTTP/1.1 keep-alive connections.
+- ``HTTP/2``: ``httpx`` client multiplexing concurrent calls over a few
+  connections. Needs ``pip install "httpx[http2]"``; without it the
+  ``requests`` transport is used.
+
+Both return response objects with ``status_code``, ``content``, ``text`` and
+``json()``, and raise subclasses of ``RequestException`` on network errors, so
+callers do not care which one is in use.
+"""
+
+import threading
+import time
+
+import frappe
+import requests
+
+from .session import get_session
+from .slow_calls import current
+
+REQUESTS = "requests"
+HTTP2 = "HTTP/2"
+
+HTTP2_MAX_CONNECTIONS = 4
+
+_transports = {}
+_lock = threading.Lock()
+
+
+# Base of the network errors every transport raises
+RequestException = requests.exceptions.RequestException
+
+
+class TransportError(RequestException):
+    """Network error raised by a non-requests transport"""
+
+
+class RequestsTransport:
+    name = REQUESTS
+
+    def _send(self, method, url, **kwargs):
+        call = current()
+        if call is None:
+            return get_session().request(method, url, **kwargs)
+
+        # Stream so that waiting for the headers and reading the body are timed apart
+        response = get_session().request(method, url, stream=True, **kwargs)
+        call.headers_received()
+        start = time.perf_counter()
+        response.content
+        call.add("body", time.perf_counter() - start)
+        call.response_received(response)
+        return response
+
+    def post(self, url, data=None, json=None, headers=None, timeout=30):
+        return self._send("POST", url, data=data, json=json, headers=headers, timeout=timeout)
+
+    def get(self, url, params=None, headers=None, timeout=30):
+        return self._send("GET", url, params=params, headers=headers, timeout=timeout)
+
+    def head(self, url, timeout=30):
+        return get_session().head(url, timeout=timeout, allow_redirects=False)
+
+    def close(self):
+        pass
+
+
+class HTTP2Transport:
+    """Multiplexes concurrent calls over up to ``max_connections`` HTTP/2 connections"""
+
+    name = HTTP2
+
+    def __init__(self, max_connections=HTTP2_MAX_CONNECTIONS, prior_knowledge=False):
+        import httpx
+
+        self._httpx = httpx
+        # prior_knowledge speaks HTTP/2 over plain http://, used against local stand-ins
+        self.client = httpx.Client(
+            http1=not prior_knowledge,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+
+    def _send(self, method, url, **kwargs):
+        call = current()
+        if call is not None:
+            kwargs["extensions"] = {"trace": _Trace(call)}
+        try:
+            response = self.client.request(method, url, **kwargs)
+        except self._httpx.HTTPError as e:
+            raise TransportError(str(e)) from e
+        if call is not None:
+            call.response_received(response)
+        return response
+
+    def post(self, url, data=None, json=None, headers=None, timeout=30):
+        return self._send("POST", url, data=data, json=json, headers=headers, timeout=timeout)
+
+    def get(self, url, params=None, headers=None, timeout=30):
+        return self._send("GET", url, params=params, headers=headers, timeout=timeout)
+
+    def head(self, url, timeout=30):
+        return self._send("HEAD", url, timeout=timeout)
+
+    def close(self):
+        self.client.close()
+
+
+class _Trace:
+    """httpcore trace callback feeding the slow-call log"""
+
+    PHASES = {
+        "connection.connect_tcp": "connect",
+        "connection.start_tls": "tls",
+        "receive_response_body": "body",
+    }
+
+    def __init__(self, call):
+        self.call = call
+        self.started = {}
+
+    def __call__(self, event_name, info):
+        name, _, stage = event_name.rpartition(".")
+        if stage == "started":
+            self.started[name] = time.perf_counter()
+        elif stage == "complete":
+            if name.endswith("receive_response_headers"):
+                self.call.headers_received()
+                return
+            phase = self.PHASES.get(name) or self.PHASES.get(name.split(".", 1)[-1])
+            if phase and name in self.started:
+                self.call.add(phase, time.perf_counter() - self.started[name])
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_transport(name: str | None = None):
+    """Return the shared transport selected in FreedomPay Settings"""
+    if name is None:
+        from .settings_cache import get_settings
+
+        name = get_settings().get("transport")
+
+    if name != HTTP2:
+        name = REQUESTS
+    elif not http2_available():
+        if HTTP2 not in _transports:
+            frappe.logger("freedompay").warning(
+                "FreedomPay HTTP/2 transport needs httpx[http2]; using requests"
+            )
+            _transports[HTTP2] = None
+        name = REQUESTS
+
+    transport = _transports.get(name)
+    if transport is None:
+        with _lock:
+            transport = _transports.get(name)
+            if transport is None:
+                transport = HTTP2Transport() if name == HTTP2 else RequestsTransport()
+                _transports[name] = transport
+    return transport
+
+
+def reset_transports():
+    """Close all transports, e.g. after a worker fork"""
+    with _lock:
+        for transport in _transports.values():
+            if transport is not None:
+                transport.close()
+        _transports.clear()
@@ -1,6 +1,9 @@
+from .settings_cache import get_settings
+
+
 class FreedomPayUrls:
     def __init__(self):
-        self.settings = frappe.get_doc("FreedomPay Settings")
+        self.settings = get_settings()
 
     def create_payment(self):
         return f"{self.settings.base_url}/init_payment.php"
@@ -0,0 +1,168 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+"""Worker warm-up for FreedomPay.
+
+The first gateway call after a worker restart pays for loading the settings,
+decrypting the secret, resolving the gateway host and the TLS handshake.
+``ensure_warm`` is registered as a ``before_request`` / ``before_job`` hook and
+does that work once per worker and site, so the first checkout does not.
+
+The duration of the first gateway call of every worker is stored in the cache,
+tagged with whether warm-up had finished by then. Compare the two with:
+
+    bench --site <site> execute freedompay_integration.warmup.get_report
+"""
+
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import frappe
+
+from .settings_cache import get_settings, get_secret
+
+DEFAULT_WARMUP_CONNECTIONS = 3
+WARMUP_TIMEOUT = 5
+FIRST_REQUEST_CACHE_KEY = "freedompay_first_request"
+
+_reports = {}
+_lock = threading.Lock()
+
+
+def _site():
+    return getattr(frappe.local, "site", None)
+
+
+def ensure_warm():
+    """Hook: warm the worker up once per site"""
+    site = _site()
+    if site in _reports:
+        return
+    with _lock:
+        if site in _reports:
+            return
+        _reports[site] = {"warmup": None, "first_request": None}
+
+    try:
+        warm_up()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "FreedomPay warm-up failed")
+
+
+def warm_up(connections: int | None = None, background: bool = True) -> dict | None:
+    """Preload settings and secrets, resolve the gateway host and open idle connections.
+
+    Settings and secrets need the site context and are loaded inline. DNS lookup
+    and connection set-up only touch the network, so by default they run in a
+    daemon thread and do not delay the request that triggered the warm-up.
+    """
+    site = _site()
+    report = {"started_at": time.time(), "phases": {}, "completed": False}
+    with _lock:
+        _reports.setdefault(site, {"warmup": None, "first_request": None})["warmup"] = report
+
+    start = time.perf_counter()
+    settings = get_settings()
+    if not settings.merchant_id or not settings.get("warmup_on_start", 1):
+        report["skipped"] = True
+        return report
+    report["phases"]["settings"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_secret(settings, "secret_key")
+    get_secret(settings, "secret_key_payout")
+    report["phases"]["secrets"] = time.perf_counter() - start
+
+    base_url = settings.base_url or "https://api.freedompay.uz"
+    connections = connections or settings.get("warmup_connections") or DEFAULT_WARMUP_CONNECTIONS
+
+    if background:
+        threading.Thread(
+            target=_warm_network, args=(report, base_url, connections), daemon=True
+        ).start()
+    else:
+        _warm_network(report, base_url, connections)
+    return report
+
+
+def _warm_network(report, base_url, connections):
+    # Imported here: the hook runs on every worker, the HTTP stack is only needed with FreedomPay set up
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        parts = urlsplit(base_url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+
+        start = time.perf_counter()
+        socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        report["phases"]["dns"] = time.perf_counter() - start
+
+        # Requests are issued concurrently so each one takes its own pooled
+        # connection; sequential calls would keep reusing a single socket.
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            opened = sum(pool.map(lambda _: _open_connection(base_url), range(connections)))
+        report["phases"]["connections"] = time.perf_counter() - start
+        report["connections"] = opened
+        report["completed"] = True
+    except Exception as e:
+        report["error"] = str(e)
+
+
+def _open_connection(base_url):
+    from .transport import get_transport
+
+    try:
+        response = get_transport().head(base_url, timeout=WARMUP_TIMEOUT)
+        response.close()
+        return 1
+    except Exception:
+        return 0
+
+
+def record_gateway_call(url: str, elapsed: float) -> None:
+    """Remember the duration of the first gateway call made by this worker"""
+    with _lock:
+        state = _reports.setdefault(_site(), {"warmup": None, "first_request": None})
+        if state["first_request"] is not None:
+            return
+        warmup = state["warmup"]
+        state["first_request"] = {
+            "url": url,
+            "elapsed": elapsed,
+            "warmed_up": bool(warmup and warmup.get("completed")),
+            "recorded_at": time.time(),
+        }
+
+    try:
+        frappe.cache().hset(
+            FIRST_REQUEST_CACHE_KEY, f"{socket.gethostname()}:{os.getpid()}", state["first_request"]
+        )
+    except Exception:
+        # Reporting must never break a payment
+        pass
+
+
+def get_report() -> dict:
+    """Summarise first-request timings of all workers, with and without warm-up"""
+    entries = list((frappe.cache().hgetall(FIRST_REQUEST_CACHE_KEY) or {}).values())
+
+    def summarise(values):
+        if not values:
+            return {"count": 0}
+        values = sorted(values)
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "median": values[len(values) // 2],
+            "max": values[-1],
+        }
+
+    return {
+        "with_warmup": summarise([e["elapsed"] for e in entries if e.get("warmed_up")]),
+        "without_warmup": summarise([e["elapsed"] for e in entries if not e.get("warmed_up")]),
+        "this_worker": _reports.get(_site()),
+    }
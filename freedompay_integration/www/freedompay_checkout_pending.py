@@ -0,0 +1,19 @@
+# Copyright (c) 2026, Viktor Krasnikov and contributors
+# For license information, please see license.txt
+
+import frappe
+
+from freedompay_integration.checkout import EVENT, get_result
+
+no_cache = 1
+
+
+def get_context(context):
+    context.request = frappe.form_dict.request
+    context.event = EVENT
+    # The job may be done before the page loads
+    context.result = get_result(context.request) if context.request else None
+    if context.result and context.result.get("redirect_to"):
+        frappe.local.flags.redirect_location = context.result["redirect_to"]
+        raise frappe.Redirect
+    return context
@@ -17,4 +17,7 @@ setup(
     zip_safe=False,
     include_package_data=True,
     install_requires=install_requires,
+    extras_require={
+        "http2": ["httpx[http2]"],
+    },
 )